@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+import os
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -25,6 +26,53 @@ SECRET_KEY = 'django-insecure-d8zo*wp27-a*wfsso2trug+f!lcfd_*^(wr-2)1ibp*4_sbq_$
 
 N8N_WEBHOOK_URL = 'http://143.198.113.171:5678/webhook/workout-agent'  # Change if needed
 
+# Workout agent job queue (logger/agent_jobs.py, run with `manage.py run_agent_workers`)
+AGENT_JOB_WORKERS = 2            # worker processes; each handles one n8n call at a time
+AGENT_JOB_MAX_ATTEMPTS = 5       # then the job is dead-lettered (status 'dead')
+AGENT_JOB_BACKOFF_BASE = 2       # seconds before the first retry, doubling each attempt
+AGENT_JOB_BACKOFF_MAX = 300      # longest wait between retries, in seconds
+AGENT_JOB_TIMEOUT = 10           # n8n request timeout, in seconds
+AGENT_JOB_POLL_INTERVAL = 1.0    # how often idle workers check for new jobs, in seconds
+AGENT_JOB_STALE_AFTER = 120      # requeue 'running' jobs whose worker went quiet this long ago
+
+# Shared outbound HTTP client (logger/http_client.py), limits are per host
+OUTBOUND_HTTP_POOL_MAXSIZE = 10        # keep-alive connections kept open
+OUTBOUND_HTTP_MAX_CONCURRENCY = 10     # requests in flight at once
+OUTBOUND_HTTP_TIMEOUT = 10             # default request timeout, in seconds
+OUTBOUND_HTTP_BREAKER_FAILURES = 5     # consecutive failures (errors, timeouts, 5xx) that open the circuit
+OUTBOUND_HTTP_BREAKER_RESET = 30       # seconds before a trial request is let through
+
+# NLP engine LRU caches (entries): parsed messages, and exercise-name -> catalog matches
+NLP_PARSE_CACHE_SIZE = 1024
+NLP_MATCH_CACHE_SIZE = 4096
+# Most messages api/process-workout-inputs/ takes in one request
+NLP_MAX_BATCH_SIZE = 500
+
+# Decide what is a workout with the trained intent model (logger/nlp_engine/model) instead of keywords
+NLP_INTENT_CLASSIFIER = False
+# 'distilled' (NumPy student, <1 ms) or one of the BERT backends: 'quantized', 'onnx', 'torch'
+NLP_INTENT_BACKEND = 'distilled'
+# Attach per-stage timings/query counts to NLP results and aggregate them (api/debug/nlp-stage-timings/)
+NLP_INSTRUMENTATION = False
+
+# Serve workout/daily log API payloads from compiled row-to-dict functions + orjson (logger/fast_json.py)
+API_FAST_JSON = False
+
+# How long a user's home dashboard data stays cached, in seconds (dropped on any write to it anyway;
+# only cached with a shared cache backend, see CACHES)
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# How long an exercise catalog snapshot (logger/catalog.py) is kept in the cache, in seconds;
+# catalog changes replace it straight away
+CATALOG_CACHE_TIMEOUT = 24 * 60 * 60
+
+# How often each process re-reads the catalog version for its in-memory exercise index
+# (logger/exercise_index.py), in seconds: the most another process's catalog change can lag behind
+EXERCISE_INDEX_RECHECK_SECONDS = 30
+
+# Estimated one-rep max in exercise progress (logger/progress.py): 'epley' or 'brzycki'
+PROGRESS_1RM_FORMULA = 'epley'
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -89,6 +137,23 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/ref/settings/#caches
+# Redis is shared by every worker process (needs the `redis` package). Without REDIS_URL each
+# process has its own in-memory cache, so the home dashboard (logger/dashboard.py) isn't cached:
+# a write handled by one worker couldn't drop another worker's copy.
+
+REDIS_URL = os.environ.get('REDIS_URL')  # e.g. redis://127.0.0.1:6379/1
+if REDIS_URL:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}
+    }
+else:
+    CACHES = {
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
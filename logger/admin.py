@@ -1,7 +1,8 @@
 from django.contrib import admin
 from .models import (
     MuscleGroup, Equipment, Exercise, Workout, WorkoutExercise, 
-    MealEntry, DailyLog, BaseExercise, SavedWorkout
+    MealEntry, DailyLog, BaseExercise, SavedWorkout, AgentJob, ExerciseProgress,
+    PersonalRecord
 )
 
 @admin.register(MuscleGroup)
@@ -84,3 +85,27 @@ class DailyLogAdmin(admin.ModelAdmin):
     search_fields = ("user__username",)
     list_filter = ("date", "user")
     ordering = ("-date",)
+
+
+@admin.register(AgentJob)
+class AgentJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "user", "status", "attempts", "run_after", "created_at", "finished_at")
+    search_fields = ("user__username", "last_error")
+    list_filter = ("status",)
+    ordering = ("-created_at",)
+
+
+@admin.register(ExerciseProgress)
+class ExerciseProgressAdmin(admin.ModelAdmin):
+    list_display = ("user", "exercise", "date", "total_sets", "volume", "best_weight", "estimated_1rm")
+    search_fields = ("user__username", "exercise__name")
+    list_filter = ("date",)
+    ordering = ("-date",)
+
+
+@admin.register(PersonalRecord)
+class PersonalRecordAdmin(admin.ModelAdmin):
+    list_display = ("user", "exercise", "kind", "value", "previous", "weight", "date")
+    search_fields = ("user__username", "exercise__name")
+    list_filter = ("kind", "date")
+    ordering = ("-date",)
@@ -0,0 +1,198 @@
+import random
+import time
+from datetime import timedelta
+from typing import Dict, Optional
+import logging
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .http_client import CircuitOpenError, get_http_client
+from .models import AgentJob
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_agent_job(payload: Dict, user=None) -> AgentJob:
+    """
+    Queue a workout agent call; a worker posts it to n8n (see run_agent_workers)
+    """
+    job = AgentJob.objects.create(
+        user=user,
+        payload=payload,
+        max_attempts=_setting('AGENT_JOB_MAX_ATTEMPTS', 5),
+        run_after=timezone.now(),
+    )
+    logger.info(f"Queued agent job {job.id}")
+    return job
+
+
+def backoff_delay(attempts: int) -> float:
+    """
+    Seconds before retry number `attempts`: exponential from AGENT_JOB_BACKOFF_BASE,
+    capped at AGENT_JOB_BACKOFF_MAX, with up to 10% jitter so retries don't line up
+    """
+    base = _setting('AGENT_JOB_BACKOFF_BASE', 2)
+    cap = _setting('AGENT_JOB_BACKOFF_MAX', 300)
+    delay = min(cap, base * 2 ** (attempts - 1))
+    return delay * random.uniform(1.0, 1.1)
+
+
+def claim_next_job() -> Optional[AgentJob]:
+    """
+    Take the oldest due job and mark it running, or return None when nothing is due.
+    Safe with several workers: rows locked by another worker are skipped, and the
+    status check in the UPDATE stops two workers claiming the same job where row
+    locks aren't available (SQLite).
+    """
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            due = AgentJob.objects.filter(status=AgentJob.QUEUED, run_after__lte=now).order_by('run_after', 'id')
+            if connection.features.has_select_for_update_skip_locked:
+                due = due.select_for_update(skip_locked=True)
+            job = due.first()
+            if job is None:
+                return None
+            if job.attempts >= job.max_attempts:
+                # Out of attempts (e.g. requeued by hand without resetting them): dead-letter, don't run
+                AgentJob.objects.filter(id=job.id, status=AgentJob.QUEUED).update(
+                    status=AgentJob.DEAD, finished_at=now, updated_at=now
+                )
+                logger.error(f"Agent job {job.id} dead-lettered at claim after {job.attempts} attempts")
+                continue
+            claimed = AgentJob.objects.filter(id=job.id, status=AgentJob.QUEUED).update(
+                status=AgentJob.RUNNING, attempts=job.attempts + 1, updated_at=now
+            )
+        if not claimed:
+            return None
+        job.status = AgentJob.RUNNING
+        job.attempts += 1
+        return job
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Put back jobs left 'running' by a worker that died mid-call, or dead-letter them if that
+    was their last attempt (a job that kills its worker every time must not run forever)
+    """
+    now = timezone.now()
+    stale = AgentJob.objects.filter(status=AgentJob.RUNNING, updated_at__lt=now - timedelta(
+        seconds=_setting('AGENT_JOB_STALE_AFTER', 120)))
+    dead = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=AgentJob.DEAD, last_error='Worker stopped while running the job', finished_at=now, updated_at=now
+    )
+    count = stale.filter(attempts__lt=F('max_attempts')).update(
+        status=AgentJob.QUEUED, run_after=now, updated_at=now
+    )
+    if dead:
+        logger.error(f"Dead-lettered {dead} stale agent jobs that were out of attempts")
+    if count:
+        logger.warning(f"Requeued {count} stale agent jobs")
+    return count
+
+
+def requeue_dead_jobs() -> int:
+    """
+    Give dead-lettered jobs a fresh set of attempts
+    """
+    return AgentJob.objects.filter(status=AgentJob.DEAD).update(
+        status=AgentJob.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None, updated_at=timezone.now()
+    )
+
+
+def run_job(job: AgentJob) -> AgentJob:
+    """
+    Post the job's payload to n8n and record the outcome. Connection errors, timeouts,
+    429 and 5xx responses are retried with backoff; other 4xx responses and running out
+    of attempts move the job to the dead letter status.
+    """
+    retryable = True
+    try:
+        response = get_http_client().post(
+            settings.N8N_WEBHOOK_URL, json=job.payload, timeout=_setting('AGENT_JOB_TIMEOUT', 10)
+        )
+        if response.status_code < 400:
+            job.status = AgentJob.SUCCEEDED
+            job.result = {'n8n_status': response.status_code, 'n8n_response': response.text[:500]}
+            job.last_error = ''
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'result', 'last_error', 'finished_at', 'updated_at'])
+            logger.info(f"Agent job {job.id} succeeded (attempt {job.attempts})")
+            return job
+        retryable = response.status_code == 429 or response.status_code >= 500
+        error = f"n8n returned {response.status_code}: {response.text[:200]}"
+    except CircuitOpenError as e:
+        error = str(e)
+    except requests.exceptions.ConnectTimeout:
+        error = 'Connection timeout to n8n'
+    except requests.exceptions.ConnectionError as e:
+        error = f'Connection error to n8n: {str(e)}'
+    except requests.exceptions.RequestException as e:
+        error = f'Request error: {str(e)}'
+    return fail_job(job, error, retryable)
+
+
+def fail_job(job: AgentJob, error: str, retryable: bool = True) -> AgentJob:
+    """
+    Record a failed attempt: back to the queue with backoff, or to the dead letter status
+    when the error isn't retryable or the job is out of attempts
+    """
+    job.last_error = error
+    if retryable and job.attempts < job.max_attempts:
+        delay = backoff_delay(job.attempts)
+        job.status = AgentJob.QUEUED
+        job.run_after = timezone.now() + timedelta(seconds=delay)
+        logger.warning(f"Agent job {job.id} attempt {job.attempts} failed, retrying in {delay:.0f}s: {error}")
+    else:
+        job.status = AgentJob.DEAD
+        job.finished_at = timezone.now()
+        logger.error(f"Agent job {job.id} dead-lettered after {job.attempts} attempts: {error}")
+    job.save(update_fields=['status', 'run_after', 'last_error', 'finished_at', 'updated_at'])
+    return job
+
+
+def work(poll_interval: Optional[float] = None, stop=None, max_jobs: Optional[int] = None) -> int:
+    """
+    Worker loop: claim and run jobs until `stop` (a threading/multiprocessing Event) is set,
+    sleeping `poll_interval` seconds whenever the queue is empty. Returns the number of jobs run.
+    """
+    poll_interval = _setting('AGENT_JOB_POLL_INTERVAL', 1.0) if poll_interval is None else poll_interval
+    done = 0
+    last_stale_check = 0.0
+    while not (stop and stop.is_set()) and (max_jobs is None or done < max_jobs):
+        try:
+            if time.monotonic() - last_stale_check > _setting('AGENT_JOB_STALE_AFTER', 120) / 2:
+                requeue_stale_jobs()
+                last_stale_check = time.monotonic()
+            job = claim_next_job()
+        except DatabaseError as e:
+            logger.error(f"Agent worker could not poll the job queue: {str(e)}")
+            job = None
+        if job is None:
+            if max_jobs is not None:
+                break
+            if stop:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        try:
+            run_job(job)
+        except Exception as e:
+            # Never let one job take the worker down; count it as a failed attempt
+            logger.error(f"Agent job {job.id} crashed the worker loop: {str(e)}")
+            try:
+                fail_job(job, f'Worker error: {str(e)}')
+            except DatabaseError as db_error:
+                # Left 'running': the stale check requeues or dead-letters it
+                logger.error(f"Agent job {job.id} could not be marked failed: {str(db_error)}")
+        done += 1
+    return done
@@ -0,0 +1,153 @@
+"""
+Read-only snapshot of the exercise catalog (muscle groups, equipment, base exercises, exercises)
+for the catalog pages, kept in the Django cache under a version number.
+
+The version lives in the database (CatalogVersion) and is bumped by the catalog signals
+(signals.catalog_changed) in the same transaction as the change, so every worker process sees it
+together with the change. A snapshot is rebuilt once per catalog change and every page in between
+is filtered in memory, at the cost of reading the one version row.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from .models import BaseExercise, CatalogVersion, Equipment, Exercise, MuscleGroup
+
+# Primary key of the single CatalogVersion row
+VERSION_ID = 1
+
+
+class CatalogMuscleGroup(NamedTuple):
+    id: int
+    name: str
+
+
+class CatalogEquipment(NamedTuple):
+    id: int
+    name: str
+
+
+class CatalogBaseExercise(NamedTuple):
+    id: int
+    name: str
+    primary_muscle_group_id: int
+
+
+class CatalogExercise(NamedTuple):
+    id: int
+    name: str
+    base_exercise_id: int
+    equipment_id: int
+    equipment: str
+    primary_muscle_group_id: int
+
+
+class CatalogSnapshot:
+    """
+    The whole catalog as tuples in id order, with in-memory filtering and grouping
+    """
+
+    def __init__(self, version: int, updated_at: datetime, muscle_groups: List[CatalogMuscleGroup],
+                 equipment: List[CatalogEquipment], base_exercises: List[CatalogBaseExercise],
+                 exercises: List[CatalogExercise]):
+        self.version = version
+        # Last-Modified for pages rendered from this snapshot, the same in every process
+        self.updated_at = updated_at.replace(microsecond=0)
+        self.muscle_groups = muscle_groups
+        self.equipment = equipment
+        self.base_exercises = base_exercises
+        self.exercises = exercises
+        self.base_exercises_by_id = {base.id: base for base in base_exercises}
+
+    @classmethod
+    def build(cls, version: int, updated_at: datetime) -> 'CatalogSnapshot':
+        """Four queries, one per catalog table"""
+        return cls(
+            version,
+            updated_at,
+            [CatalogMuscleGroup(*row) for row in MuscleGroup.objects.order_by('id').values_list('id', 'name')],
+            [CatalogEquipment(*row) for row in Equipment.objects.order_by('id').values_list('id', 'name')],
+            [CatalogBaseExercise(*row) for row in BaseExercise.objects.order_by('id').values_list(
+                'id', 'name', 'primary_muscle_group_id')],
+            [CatalogExercise(*row) for row in Exercise.objects.order_by('id').values_list(
+                'id', 'name', 'base_exercise_id', 'equipment_id', 'equipment__name',
+                'base_exercise__primary_muscle_group_id')],
+        )
+
+    def filter_exercises(self, muscle_group_ids: Iterable[int] = (), equipment_ids: Iterable[int] = (),
+                         exclude_ids: Iterable[int] = ()) -> List[CatalogExercise]:
+        """Exercises for any of the primary muscle groups and any of the equipment (empty = all)"""
+        muscle_group_ids, equipment_ids, exclude_ids = set(muscle_group_ids), set(equipment_ids), set(exclude_ids)
+        return [
+            ex for ex in self.exercises
+            if (not muscle_group_ids or ex.primary_muscle_group_id in muscle_group_ids)
+            and (not equipment_ids or ex.equipment_id in equipment_ids)
+            and ex.id not in exclude_ids
+        ]
+
+    def group_by_base_exercise(self, exercises: Iterable[CatalogExercise]) -> Dict[CatalogBaseExercise, List[CatalogExercise]]:
+        grouped = defaultdict(list)
+        for ex in exercises:
+            grouped[self.base_exercises_by_id[ex.base_exercise_id]].append(ex)
+        return dict(grouped)
+
+    def by_muscle_group(self) -> Dict[CatalogMuscleGroup, Dict[CatalogBaseExercise, List[CatalogExercise]]]:
+        """Every muscle group -> its base exercises that have exercises -> those exercises"""
+        grouped = self.group_by_base_exercise(self.exercises)
+        by_muscle = {muscle: {} for muscle in self.muscle_groups}
+        muscles_by_id = {muscle.id: muscle for muscle in self.muscle_groups}
+        for base in self.base_exercises:
+            if base in grouped:
+                by_muscle[muscles_by_id[base.primary_muscle_group_id]][base] = grouped[base]
+        return by_muscle
+
+
+def catalog_version() -> CatalogVersion:
+    """The catalog's version row (created on first use)"""
+    current = CatalogVersion.objects.filter(pk=VERSION_ID).first()
+    if current is None:
+        # Start from the clock rather than 1 so a recreated database can't bring back a cached snapshot's version
+        current, _ = CatalogVersion.objects.get_or_create(
+            pk=VERSION_ID, defaults={'version': time.time_ns(), 'updated_at': timezone.now()}
+        )
+    return current
+
+
+def bump_catalog_version():
+    """
+    Make every process rebuild its snapshot on next use. Call it inside the transaction that changes
+    the catalog, so the new version commits (or rolls back) with the change.
+    """
+    bumped = CatalogVersion.objects.filter(pk=VERSION_ID).update(version=F('version') + 1, updated_at=timezone.now())
+    if not bumped:
+        catalog_version()
+
+
+# The last snapshot this process used, so a steady-state request is one query for the version
+_local: Optional[Tuple[int, CatalogSnapshot]] = None
+
+
+def get_catalog() -> CatalogSnapshot:
+    """
+    The current catalog snapshot: from this process, else the cache, else built from the database
+    """
+    global _local
+    current = catalog_version()
+    version = current.version
+    local = _local
+    if local is not None and local[0] == version:
+        return local[1]
+
+    key = f'catalog:snapshot:{version}'
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = CatalogSnapshot.build(version, current.updated_at)
+        cache.set(key, snapshot, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 24 * 60 * 60))
+    _local = (version, snapshot)
+    return snapshot
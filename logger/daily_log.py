@@ -0,0 +1,95 @@
+from datetime import date
+from typing import Dict, Iterable, Tuple
+
+from django.db.models import F, QuerySet, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+from .dashboard import invalidate_dashboard
+from .models import DailyLog, MealEntry, Workout
+
+# MealEntry fields summed into DailyLog.total_<macro>
+MACROS = ('calories', 'protein', 'carbs', 'fats')
+
+
+def upsert_daily_logs(keys: Iterable[Tuple[int, date]]) -> Dict[Tuple[int, date], DailyLog]:
+    """
+    Get or create the daily logs for (user_id, date) pairs in a single INSERT ... ON CONFLICT query
+    """
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    # The no-op update on conflict makes the database hand back the existing rows' ids
+    daily_logs = DailyLog.objects.bulk_create(
+        [DailyLog(user_id=user_id, date=day) for user_id, day in keys],
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=['date'],
+    )
+    return {(log.user_id, log.date): log for log in daily_logs}
+
+
+def upsert_daily_log(user, day: date) -> DailyLog:
+    """
+    Get or create the user's log for `day` in a single INSERT ... ON CONFLICT query
+    """
+    return upsert_daily_logs([(user.id, day)])[(user.id, day)]
+
+
+def add_workouts_to_daily_log(daily_log: DailyLog, workouts: Iterable[Workout]):
+    """
+    Link workouts to a daily log with one INSERT (already linked workouts are skipped)
+    """
+    workouts = list(workouts)
+    through = DailyLog.workouts.through
+    through.objects.bulk_create(
+        [through(dailylog_id=daily_log.id, workout_id=workout.id) for workout in workouts],
+        ignore_conflicts=True,
+    )
+    # bulk_create sends no signals
+    invalidate_dashboard([daily_log.user_id])
+
+
+def add_workouts_to_daily_logs(workouts: Iterable[Workout]):
+    """
+    Add each workout to its user's log for the workout's date: one upsert for the logs
+    and one INSERT for the links, however many users and days the workouts span
+    """
+    workouts = list(workouts)
+    daily_logs = upsert_daily_logs((workout.user_id, workout.date) for workout in workouts)
+    through = DailyLog.workouts.through
+    through.objects.bulk_create(
+        [
+            through(dailylog_id=daily_logs[(workout.user_id, workout.date)].id, workout_id=workout.id)
+            for workout in workouts
+        ],
+        ignore_conflicts=True,
+    )
+    invalidate_dashboard(workout.user_id for workout in workouts)
+
+
+def sum_meal_macros(meals) -> Dict[str, int]:
+    """Macro totals of a MealEntry queryset, in one aggregate query"""
+    return meals.aggregate(**{macro: Coalesce(Sum(macro), 0) for macro in MACROS})
+
+
+def adjust_daily_log_totals(daily_log_ids: Iterable[int], deltas: Dict[str, int]):
+    """
+    Add `deltas` (macro -> amount, negative to subtract) to the logs' totals with one UPDATE.
+    The database does the arithmetic (total = total + delta), so concurrent meal changes
+    can't overwrite each other the way a read-modify-save in Python would.
+    """
+    updates = {
+        f'total_{macro}': Greatest(F(f'total_{macro}') + amount, 0)
+        for macro, amount in deltas.items() if amount
+    }
+    # A queryset of ids becomes a subquery of the UPDATE rather than a separate SELECT
+    if not isinstance(daily_log_ids, QuerySet):
+        daily_log_ids = list(daily_log_ids)
+        if not daily_log_ids:
+            return
+    if updates:
+        DailyLog.objects.filter(id__in=daily_log_ids).update(**updates)
+
+
+def meal_macros(meal: MealEntry, sign: int = 1) -> Dict[str, int]:
+    return {macro: sign * (getattr(meal, macro) or 0) for macro in MACROS}
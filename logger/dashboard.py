@@ -0,0 +1,77 @@
+"""
+Data for the home dashboard: today's totals, workouts, meals and PRs in four queries, cached per user.
+
+The cached copy is dropped whenever the user's workouts, meals or daily logs change (signals.py,
+plus the bulk helpers in daily_log.py that bypass signals). That only reaches every worker when
+the cache is shared between processes (Redis, see CACHES in settings), so with a per-process
+cache the dashboard is always read from the database.
+"""
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import DailyLog, MealEntry, PersonalRecord, Workout
+
+TOTALS = ('total_calories', 'total_protein', 'total_carbs', 'total_fats')
+
+
+def _cache_key(user_id: int) -> str:
+    return f'dashboard:{user_id}'
+
+
+def cache_enabled() -> bool:
+    """Whether the default cache is shared between processes, so invalidation reaches them all"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def load_dashboard(user, day: Optional[date] = None) -> Dict:
+    """
+    The user's daily log totals, workouts (with exercise counts), meals and personal records for `day`
+    (today by default), as plain dicts for the template. Four queries on a cache miss, one cache read on a hit.
+    """
+    day = day or date.today()
+    key = _cache_key(user.id)
+    use_cache = cache_enabled()
+    data = cache.get(key) if use_cache else None
+    if data is not None and data['date'] == day:
+        return data
+
+    totals = DailyLog.objects.filter(user=user, date=day).values(*TOTALS).first() or dict.fromkeys(TOTALS, 0)
+    workouts = list(
+        Workout.objects.filter(daily_logs__user=user, daily_logs__date=day)
+        .annotate(exercise_count=Count('workoutexercise'))
+        .order_by('-created_at')
+        .values('id', 'name', 'created_at', 'exercise_count')
+    )
+    meals = list(
+        MealEntry.objects.filter(daily_logs__user=user, daily_logs__date=day)
+        .order_by('-created_at')
+        .values('id', 'name', 'calories', 'protein', 'carbs', 'fats')
+    )
+
+    kinds = dict(PersonalRecord.KIND_CHOICES)
+    personal_records = [
+        {**record, 'kind_display': kinds[record['kind']]}
+        for record in PersonalRecord.objects.filter(user=user, date=day).values(
+            'kind', 'value', 'previous', 'weight', exercise_name=F('exercise__name')
+        )
+    ]
+
+    data = {'date': day, 'workouts': workouts, 'meals': meals, 'personal_records': personal_records, **totals}
+    if use_cache:
+        cache.set(key, data, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+    return data
+
+
+def invalidate_dashboard(user_ids: Iterable[int]):
+    """Forget the users' cached dashboards once the current transaction commits"""
+    keys = [_cache_key(user_id) for user_id in set(user_ids)]
+    if keys and cache_enabled():
+        # After commit, so a concurrent request can't re-cache the pre-commit data
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,236 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+import logging
+
+from django.conf import settings
+
+from .catalog import catalog_version
+from .models import Exercise, BaseExercise
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lowercase a name and collapse punctuation/whitespace so "T-Bar  Row" == "t bar row"
+    """
+    return re.sub(r'[^a-z0-9]+', ' ', name.lower()).strip()
+
+
+def trigrams(name: str) -> Set[str]:
+    """
+    Character trigrams of each word, padded like pg_trgm ("row" -> "  r", " ro", "row", "ow ")
+    """
+    grams = set()
+    for word in normalize_name(name).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: Set[str], b: Set[str]) -> float:
+    """
+    Share of trigrams two names have in common, as pg_trgm's similarity() (1.0 = same trigrams)
+    """
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class ExerciseIndex:
+    """
+    In-memory lookup table over the exercise catalog (Exercise + BaseExercise names and aliases).
+
+    Built with two queries and then answers exact and substring lookups without
+    touching the database. lookup() follows the old query chain in NLPEngine:
+    exact name -> substring -> base exercise, always preferring the lowest id.
+    A trigram inverted index over the same names ranks fuzzy suggestions.
+    """
+
+    _versions = itertools.count(1)
+
+    def __init__(self, exercises: List[Exercise], base_exercises: List[BaseExercise],
+                 aliases: Optional[Dict[str, str]] = None):
+        # Changes every time the index is rebuilt, so results derived from it can be keyed on it
+        self.version = next(self._versions)
+
+        # Exercises in id order so "first match" means the same thing as .first() did
+        self.exercises = sorted(exercises, key=lambda ex: ex.id)
+        self.names = [normalize_name(ex.name) for ex in self.exercises]
+
+        self.by_name: Dict[str, Exercise] = {}
+        for name, exercise in zip(self.names, self.exercises):
+            self.by_name.setdefault(name, exercise)
+
+        # Base exercise -> its first variant, skipping bases with no variants
+        first_variant: Dict[int, Exercise] = {}
+        for exercise in self.exercises:
+            first_variant.setdefault(exercise.base_exercise_id, exercise)
+        self.base_entries: List[Tuple[str, Exercise]] = [
+            (normalize_name(base.name), first_variant[base.id])
+            for base in sorted(base_exercises, key=lambda b: b.id)
+            if base.id in first_variant
+        ]
+        self.by_base_name: Dict[str, Exercise] = {}
+        for name, exercise in self.base_entries:
+            self.by_base_name.setdefault(name, exercise)
+
+        self.aliases = {normalize_name(k): normalize_name(v) for k, v in (aliases or {}).items()}
+
+        # Trigram inverted index over exercise, base exercise and alias names
+        documents = list(zip(self.names, self.exercises)) + self.base_entries
+        for alias, target in self.aliases.items():
+            exercise = self.by_name.get(target) or self.by_base_name.get(target)
+            if exercise:
+                documents.append((alias, exercise))
+        self.documents: List[Tuple[Set[str], Exercise]] = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for name, exercise in documents:
+            grams = trigrams(name)
+            for gram in grams:
+                self.postings[gram].append(len(self.documents))
+            self.documents.append((grams, exercise))
+
+    @classmethod
+    def build(cls, aliases: Optional[Dict[str, str]] = None) -> 'ExerciseIndex':
+        """
+        Load the whole catalog (2 queries) and index it
+        """
+        exercises = list(Exercise.objects.only('id', 'name', 'base_exercise_id', 'equipment_id'))
+        base_exercises = list(BaseExercise.objects.only('id', 'name'))
+        logger.info(f"Built exercise index: {len(exercises)} exercises, {len(base_exercises)} base exercises")
+        return cls(exercises, base_exercises, aliases)
+
+    def __len__(self):
+        return len(self.exercises)
+
+    def exact(self, name: str) -> Optional[Exercise]:
+        """
+        Exact (case/punctuation-insensitive) match on exercise, base exercise or alias name
+        """
+        key = normalize_name(name)
+        key = self.aliases.get(key, key)
+        return self.by_name.get(key) or self.by_base_name.get(key)
+
+    def containing(self, name: str, limit: Optional[int] = None) -> List[Exercise]:
+        """
+        Exercises (in id order) whose name contains `name`
+        """
+        key = normalize_name(name)
+        if not key:
+            return []
+        matches = []
+        for candidate, exercise in zip(self.names, self.exercises):
+            if key in candidate:
+                matches.append(exercise)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+    def substring(self, name: str) -> Optional[Exercise]:
+        """
+        First exercise whose name contains `name`
+        """
+        matches = self.containing(name, limit=1)
+        return matches[0] if matches else None
+
+    def base_substring(self, name: str) -> Optional[Exercise]:
+        """
+        First variant of the first base exercise whose name contains `name`
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        for candidate, exercise in self.base_entries:
+            if key in candidate:
+                return exercise
+        return None
+
+    def similar(self, name: str, limit: int = 3, min_score: float = 0.15) -> List[Tuple[Exercise, float]]:
+        """
+        Top `limit` exercises by trigram similarity to `name`, best first, as (exercise, score)
+        """
+        query = trigrams(name)
+        shared: Dict[int, int] = defaultdict(int)
+        for gram in query:
+            for doc in self.postings.get(gram, ()):
+                shared[doc] += 1
+
+        best: Dict[int, Tuple[float, Exercise]] = {}
+        for doc, count in shared.items():
+            grams, exercise = self.documents[doc]
+            score = count / (len(query) + len(grams) - count)
+            if score >= min_score and score > best.get(exercise.id, (0.0, None))[0]:
+                best[exercise.id] = (score, exercise)
+
+        ranked = heapq.nlargest(limit, best.values(), key=lambda item: (item[0], -item[1].id))
+        return [(exercise, score) for score, exercise in ranked]
+
+    def lookup(self, name: str) -> Tuple[Optional[Exercise], Optional[str]]:
+        """
+        Resolve a parsed exercise name to a catalog exercise.
+        Returns (exercise, match_type) where match_type is 'exact', 'substring', 'base' or None
+        """
+        exercise = self.exact(name)
+        if exercise:
+            return exercise, 'exact'
+        exercise = self.substring(name)
+        if exercise:
+            return exercise, 'substring'
+        exercise = self.base_substring(name)
+        if exercise:
+            return exercise, 'base'
+        return None, None
+
+
+# Process-local index, the catalog version and alias map it was built from, and when the version
+# was last read (time.monotonic()). The version (catalog.CatalogVersion) is re-read at most every
+# EXERCISE_INDEX_RECHECK_SECONDS, so a catalog change made by another process shows up here within
+# that many seconds; the signals in signals.py drop the index straight away in the process that
+# made the change.
+class _CachedIndex(NamedTuple):
+    version: int
+    aliases: Dict[str, str]
+    index: ExerciseIndex
+    checked_at: float
+
+
+_index: Optional[_CachedIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_exercise_index(aliases: Optional[Dict[str, str]] = None) -> ExerciseIndex:
+    """
+    Return the shared exercise index, building it on first use, after the catalog changes and
+    when asked for a different alias map (no queries between version checks)
+    """
+    global _index
+    aliases = dict(aliases or {})
+    recheck = getattr(settings, 'EXERCISE_INDEX_RECHECK_SECONDS', 30)
+    current = _index
+    if current is not None and current.aliases == aliases and time.monotonic() - current.checked_at < recheck:
+        return current.index
+
+    with _index_lock:
+        version = catalog_version().version
+        now = time.monotonic()
+        if _index is not None and _index.version == version and _index.aliases == aliases:
+            _index = _index._replace(checked_at=now)
+        else:
+            _index = _CachedIndex(version, aliases, ExerciseIndex.build(aliases), now)
+        return _index.index
+
+
+def invalidate_exercise_index():
+    """
+    Drop the cached index so the next lookup rebuilds it from the database
+    """
+    global _index
+    with _index_lock:
+        _index = None
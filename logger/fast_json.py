@@ -0,0 +1,221 @@
+"""
+Opt-in fast path for the read-only workout and daily log API payloads (API_FAST_JSON setting).
+
+Instead of instantiating DRF fields for every row, the payloads are built from
+values_list() rows by small row-to-dict functions compiled once per shape, and rendered
+with orjson when it's installed. Output is byte-for-byte what WorkoutSerializer /
+DailyLogSerializer + DRF's JSONRenderer produce (see `manage.py benchmark_api_json`).
+"""
+import re
+from collections import defaultdict
+import decimal
+from decimal import Decimal
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import Workout, WorkoutExercise, MealEntry, DailyLog
+
+try:
+    import orjson
+except ImportError:  # optional, FastJSONRenderer falls back to DRF's encoder
+    orjson = None
+
+
+def fast_json_enabled() -> bool:
+    return getattr(settings, 'API_FAST_JSON', False)
+
+
+# --- Field conversions, matching DRF's to_representation ---
+
+def _date(value):
+    return value.isoformat() if value is not None else None
+
+
+def _datetime(value):
+    if value is None:
+        return None
+    if settings.USE_TZ and timezone.is_aware(value):
+        value = value.astimezone(timezone.get_current_timezone())
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def _decimal(max_digits: int, decimal_places: int) -> Callable:
+    """DecimalField(max_digits, decimal_places) with COERCE_DECIMAL_TO_STRING"""
+    context = decimal.getcontext().copy()
+    context.prec = max_digits
+    exponent = Decimal('.1') ** decimal_places
+
+    def convert(value):
+        if value is None:
+            return None
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(exponent, context=context))
+    return convert
+
+
+_weight = _decimal(6, 2)
+
+
+def compile_row_to_dict(name: str, fields: Sequence[Tuple[str, Optional[int], Optional[Callable]]]) -> Callable:
+    """
+    Build `name(row) -> dict` from (key, row index, converter) triples as straight-line code,
+    e.g. {'id': row[0], 'date': c2(row[2])}. A None index makes a placeholder key (filled
+    in later by the caller) so keys stay in serializer order.
+    """
+    namespace = {}
+    items = []
+    for key, index, convert in fields:
+        if index is None:
+            value = 'None'
+        elif convert is None:
+            value = f'row[{index}]'
+        else:
+            namespace[f'c{index}'] = convert
+            value = f'c{index}(row[{index}])'
+        items.append(f'{key!r}: {value}')
+    source = f"def {name}(row):\n    return {{{', '.join(items)}}}\n"
+    exec(compile(source, f'<fast_json.{name}>', 'exec'), namespace)
+    return namespace[name]
+
+
+# --- Workouts (WorkoutSerializer / WorkoutExerciseSerializer shape) ---
+
+WORKOUT_COLUMNS = ('id', 'name', 'date', 'notes', 'created_at')
+_workout_row = compile_row_to_dict('workout_row', [
+    ('id', 0, None), ('name', 1, None), ('date', 2, _date), ('notes', 3, None), ('created_at', 4, _datetime),
+])
+
+WORKOUT_EXERCISE_COLUMNS = (
+    'workout_id', 'id', 'exercise_id', 'exercise__name', 'exercise__base_exercise__primary_muscle_group__name',
+    'exercise__equipment__name', 'sets', 'reps', 'weight', 'notes', 'order',
+)
+_workout_exercise_row = compile_row_to_dict('workout_exercise_row', [
+    ('id', 1, None), ('exercise', 2, None), ('exercise_name', 3, None), ('primary_muscle_group', 4, None),
+    ('equipment', 5, None), ('sets', 6, None), ('reps', 7, None), ('weight', 8, _weight),
+    ('notes', 9, None), ('order', 10, None),
+])
+
+
+def _workout_rows(workouts) -> List[tuple]:
+    """
+    values_list rows for a Workout queryset (kept in its order) or a list of instances (kept in
+    list order, skipping any deleted since they were loaded)
+    """
+    if isinstance(workouts, QuerySet):
+        return list(workouts.values_list(*WORKOUT_COLUMNS))
+    ids = [workout.id for workout in workouts]
+    rows = {row[0]: row for row in Workout.objects.filter(id__in=ids).values_list(*WORKOUT_COLUMNS)}
+    return [rows[workout_id] for workout_id in ids if workout_id in rows]
+
+
+def serialize_workouts(workouts) -> List[Dict]:
+    """
+    Same data as WorkoutSerializer(workouts, many=True).data, in two queries
+    """
+    workouts = _workout_rows(workouts)
+    exercises = defaultdict(list)
+    rows = WorkoutExercise.objects.filter(
+        workout_id__in=[row[0] for row in workouts]
+    ).order_by('order', 'id').values_list(*WORKOUT_EXERCISE_COLUMNS)
+    for row in rows:
+        exercises[row[0]].append(_workout_exercise_row(row))
+
+    data = []
+    for row in workouts:
+        workout = _workout_row(row)
+        workout['workout_exercises'] = exercises.get(row[0], [])
+        workout['exercise_count'] = len(workout['workout_exercises'])
+        data.append(workout)
+    return data
+
+
+# --- Daily logs (DailyLogSerializer shape) ---
+
+DAILY_LOG_COLUMNS = ('id', 'date', 'total_calories', 'total_protein', 'total_carbs', 'total_fats')
+_daily_log_row = compile_row_to_dict('daily_log_row', [
+    ('id', 0, None), ('date', 1, _date), ('workouts', None, None), ('meals', None, None),
+    ('total_calories', 2, None), ('total_protein', 3, None), ('total_carbs', 4, None), ('total_fats', 5, None),
+])
+
+MEAL_COLUMNS = ('id', 'name', 'calories', 'protein', 'carbs', 'fats', 'date', 'created_at')
+_meal_row = compile_row_to_dict('meal_row', [
+    ('id', 0, None), ('name', 1, None), ('calories', 2, None), ('protein', 3, None), ('carbs', 4, None),
+    ('fats', 5, None), ('date', 6, _date), ('created_at', 7, _datetime),
+])
+
+
+def _group_links(through, log_ids: Iterable[int], target: str) -> Dict[int, List[int]]:
+    """daily log id -> ids of linked workouts/meals"""
+    links = defaultdict(list)
+    for log_id, target_id in through.objects.filter(dailylog_id__in=log_ids).values_list('dailylog_id', target):
+        links[log_id].append(target_id)
+    return links
+
+
+def serialize_daily_logs(daily_logs: QuerySet) -> List[Dict]:
+    """
+    Same data as DailyLogSerializer(daily_logs, many=True).data, in six queries
+    """
+    logs = list(daily_logs.values_list(*DAILY_LOG_COLUMNS))
+    log_ids = [row[0] for row in logs]
+    workout_links = _group_links(DailyLog.workouts.through, log_ids, 'workout_id')
+    meal_links = _group_links(DailyLog.meals.through, log_ids, 'mealentry_id')
+
+    # Workouts and meals come back in their model ordering, as the prefetch does
+    workout_ids = {workout_id for ids in workout_links.values() for workout_id in ids}
+    workouts = serialize_workouts(Workout.objects.filter(id__in=workout_ids)) if workout_ids else []
+    meal_ids = {meal_id for ids in meal_links.values() for meal_id in ids}
+    meals = [_meal_row(row) for row in MealEntry.objects.filter(id__in=meal_ids).values_list(*MEAL_COLUMNS)] if meal_ids else []
+
+    workout_position = {workout['id']: i for i, workout in enumerate(workouts)}
+    meal_position = {meal['id']: i for i, meal in enumerate(meals)}
+
+    # Links to rows deleted between the queries are skipped
+    data = []
+    for row in logs:
+        log = _daily_log_row(row)
+        log['workouts'] = [workouts[i] for i in sorted(
+            workout_position[w] for w in workout_links.get(row[0], ()) if w in workout_position)]
+        log['meals'] = [meals[i] for i in sorted(
+            meal_position[m] for m in meal_links.get(row[0], ()) if m in meal_position)]
+        data.append(log)
+    return data
+
+
+# --- Renderer ---
+
+# Python writes 1e+16 / 1e-05 where orjson writes 1e16 / 0.00001; anything that looks like an
+# exponent (rare: no float fields in these payloads) goes through the stdlib encoder instead
+_EXPONENT = re.compile(rb'\d[eE][+-]?\d')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    DRF's JSONRenderer, encoding with orjson when API_FAST_JSON is on and orjson is installed.
+    Same bytes as the compact stdlib output; falls back to it for indented output and
+    anything orjson can't encode the same way.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or not fast_json_enabled() \
+                or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Dates, datetimes and Decimals go through DRF's encoder so they format identically
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # DRF escapes the JavaScript line terminators
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
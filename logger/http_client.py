@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of calling a host whose circuit breaker is open
+    """
+
+
+class ConcurrencyLimitError(requests.exceptions.ConnectionError):
+    """
+    Raised when no request slot for the host frees up within the acquire timeout
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calling a host after `failure_threshold` consecutive failures. After
+    `reset_timeout` seconds one trial request is let through (half-open): success
+    closes the circuit again, failure re-opens it for another `reset_timeout`.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half-open with the trial request still in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class HTTPClient:
+    """
+    Shared outbound HTTP client: one keep-alive connection pool per host, a cap on
+    concurrent requests per host, a default timeout and a circuit breaker per host.
+    Exceptions (connection errors, timeouts, anything else raised while calling) and 5xx
+    responses count as failures for the breaker.
+    """
+
+    def __init__(self, pool_maxsize: int = 10, max_concurrency: int = 10, timeout: float = 10,
+                 acquire_timeout: float = 5, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.acquire_timeout = acquire_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._hosts_lock = threading.Lock()
+        self._slots: Dict[str, threading.BoundedSemaphore] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def _host(self, host: str):
+        with self._hosts_lock:
+            if host not in self.breakers:
+                self._slots[host] = threading.BoundedSemaphore(self.max_concurrency)
+                self.breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return self._slots[host], self.breakers[host]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        host = urlsplit(url).netloc
+        slots, breaker = self._host(host)
+        if not slots.acquire(timeout=self.acquire_timeout):
+            raise ConcurrencyLimitError(f"All {self.max_concurrency} request slots for {host} are busy")
+        if not breaker.allow():
+            slots.release()
+            raise CircuitOpenError(f"Circuit open for {host}, not calling {url}")
+
+        kwargs.setdefault('timeout', self.timeout)
+        # Any exception counts as a failure, so a half-open trial always settles the breaker
+        failed = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            failed = response.status_code >= 500
+        finally:
+            slots.release()
+            if failed:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client: Optional[HTTPClient] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """
+    The process-wide client, configured from the OUTBOUND_HTTP_* settings. Forked
+    processes (agent workers) get their own so they never share sockets.
+    """
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = HTTPClient(
+                    pool_maxsize=getattr(settings, 'OUTBOUND_HTTP_POOL_MAXSIZE', 10),
+                    max_concurrency=getattr(settings, 'OUTBOUND_HTTP_MAX_CONCURRENCY', 10),
+                    timeout=getattr(settings, 'OUTBOUND_HTTP_TIMEOUT', 10),
+                    failure_threshold=getattr(settings, 'OUTBOUND_HTTP_BREAKER_FAILURES', 5),
+                    reset_timeout=getattr(settings, 'OUTBOUND_HTTP_BREAKER_RESET', 30),
+                )
+                _client_pid = os.getpid()
+    return _client
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, List
+
+# Inflections accepted after a keyword: curls, presses, lifted, curled, lifter(s), and with the final
+# consonant doubled: running, squatting, squatted
+SUFFIX = r'(?:e?s|[a-z]?(?:ing|ed|ers?)|d)?'
+
+# Irregular forms the suffix can't produce, matched as the keyword itself
+IRREGULAR = {
+    'run': ['ran'],
+}
+
+
+def _trie_pattern(words: List[str]) -> str:
+    """
+    Render keywords as a prefix-factored alternation ("pull|push|pushup" -> "pu(?:ll|sh(?:up)?)")
+    so the regex engine walks each character once, like the goto table of an Aho-Corasick automaton
+    """
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def render(node: Dict) -> str:
+        optional = '' in node
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + render(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if optional:
+            body = (body if len(branches) > 1 else '(?:' + body + ')') + '?'
+        return body
+
+    return render(trie)
+
+
+def _forms(keywords: List[str]) -> List[str]:
+    """Lowercased keywords plus their irregular forms"""
+    forms = []
+    for keyword in keywords:
+        keyword = keyword.lower()
+        forms += [keyword, *IRREGULAR.get(keyword, [])]
+    return forms
+
+
+class KeywordMatcher:
+    """
+    Counts whole-word keyword hits per category in one pass over the text.
+
+    All categories are compiled into a single regex with one named group each, so
+    "row" matches "rows" and "rowing" but not "tomorrow", and "run" does not match "brunch".
+    """
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        self.categories = list(categories)
+        groups = [
+            f'(?P<{category}>{_trie_pattern(_forms(keywords))})'
+            for category, keywords in categories.items() if keywords
+        ]
+        self.pattern = re.compile(r'\b(?:' + '|'.join(groups) + ')' + SUFFIX + r'\b')
+
+    def counts(self, text: str) -> Dict[str, int]:
+        """
+        Number of keyword hits in `text` for every category
+        """
+        hits = dict.fromkeys(self.categories, 0)
+        for match in self.pattern.finditer(text.lower()):
+            hits[match.lastgroup] += 1
+        return hits
+
+    def matches(self, text: str) -> bool:
+        """
+        True as soon as any keyword appears
+        """
+        return self.pattern.search(text.lower()) is not None
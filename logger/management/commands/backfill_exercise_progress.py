@@ -0,0 +1,132 @@
+import time
+from collections import defaultdict
+from datetime import date
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from logger.models import ExerciseProgress, PersonalBest, WorkoutExercise
+from logger.progress import one_rep_max_formula, reps_key, to_cents
+
+
+def estimate_1rm_array(weight: np.ndarray, reps: np.ndarray, formula: str) -> np.ndarray:
+    """progress.estimate_1rm over whole columns (NaN where there is no estimate)"""
+    reps_f = reps.astype(np.float64)
+    if formula == 'brzycki':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            estimate = np.where(reps < 37, weight * 36 / (37 - reps_f), np.nan)
+    else:
+        estimate = weight * (1 + reps_f / 30)
+    return np.where(reps <= 1, weight, estimate)
+
+
+def runs(*keys: np.ndarray):
+    """Sort order grouping rows by the key columns, and where each run of equal keys starts in it"""
+    order = np.lexsort(keys[::-1])
+    new_key = np.zeros(len(order), dtype=bool)
+    new_key[0] = True
+    for key in keys:
+        new_key[1:] |= np.diff(key[order]) != 0
+    return order, np.flatnonzero(new_key)
+
+
+class Command(BaseCommand):
+    help = ('Rebuild ExerciseProgress and PersonalBest from all WorkoutExercise rows, grouped and aggregated '
+            'with NumPy (after imports that bypass signals, deleted workouts, or changing PROGRESS_1RM_FORMULA).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user-id', type=int, help='Only rebuild this user\'s progress')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        rows = WorkoutExercise.objects.all()
+        progress = ExerciseProgress.objects.all()
+        bests = PersonalBest.objects.all()
+        if options['user_id']:
+            rows = rows.filter(user_id=options['user_id'])
+            progress = progress.filter(user_id=options['user_id'])
+            bests = bests.filter(user_id=options['user_id'])
+
+        columns = list(zip(*rows.values_list(
+            'user_id', 'exercise_id', 'workout_id', 'workout__date', 'sets', 'reps', 'weight'
+        )))
+        if columns:
+            user_ids, exercise_ids, workout_ids, days, sets, reps, weights = columns
+            self.user = np.array(user_ids, dtype=np.int64)
+            self.exercise = np.array(exercise_ids, dtype=np.int64)
+            self.workout = np.array(workout_ids, dtype=np.int64)
+            self.day = np.array([d.toordinal() for d in days], dtype=np.int64)
+            self.sets = np.array(sets, dtype=np.int64)
+            self.reps = np.array(reps, dtype=np.int64)
+            self.weight = np.array([np.nan if w is None else float(w) for w in weights], dtype=np.float64)
+            self.estimate = estimate_1rm_array(self.weight, self.reps, one_rep_max_formula())
+            # sets x reps x weight, 0 for unweighted sets
+            self.volume = np.nan_to_num(self.sets * self.reps * self.weight)
+            new_progress, new_bests = self.progress_rows(), self.best_rows(weights)
+        else:
+            new_progress, new_bests = [], []
+
+        with transaction.atomic():
+            deleted, _ = progress.delete()
+            bests.delete()
+            ExerciseProgress.objects.bulk_create(new_progress, batch_size=options['batch_size'])
+            PersonalBest.objects.bulk_create(new_bests, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(new_progress)} progress rows (replaced {deleted}) and {len(new_bests)} personal bests '
+            f'from {len(columns[0]) if columns else 0} workout exercises in {time.perf_counter() - start:.2f}s'
+        ))
+
+    def progress_rows(self):
+        """One ExerciseProgress per (user, exercise, day)"""
+        order, starts = runs(self.user, self.exercise, self.day)
+        total_sets = np.add.reduceat(self.sets[order], starts)
+        total_reps = np.add.reduceat((self.sets * self.reps)[order], starts)
+        volume = np.add.reduceat(self.volume[order], starts)
+        # fmax skips NaN (unweighted sets); all-NaN groups stay NaN -> NULL
+        best_weight = np.fmax.reduceat(self.weight[order], starts)
+        estimated_1rm = np.fmax.reduceat(self.estimate[order], starts)
+
+        first = order[starts]
+        return [
+            ExerciseProgress(
+                user_id=int(self.user[i]), exercise_id=int(self.exercise[i]), date=date.fromordinal(int(self.day[i])),
+                total_sets=int(total_sets[g]), total_reps=int(total_reps[g]), volume=to_cents(volume[g]),
+                best_weight=to_cents(best_weight[g]), estimated_1rm=to_cents(estimated_1rm[g]),
+            )
+            for g, i in enumerate(first)
+        ]
+
+    def best_rows(self, weights):
+        """One PersonalBest per (user, exercise), as progress.detect_personal_records would have left it"""
+        # Most volume in a single workout: sum per workout, then max per exercise
+        order, starts = runs(self.user, self.exercise, self.workout)
+        workout_volume = np.add.reduceat(self.volume[order], starts)
+        workout_user, workout_exercise = self.user[order[starts]], self.exercise[order[starts]]
+        volume_order, volume_starts = runs(workout_user, workout_exercise)
+        best_volume = dict(zip(
+            zip(workout_user[volume_order[volume_starts]].tolist(), workout_exercise[volume_order[volume_starts]].tolist()),
+            np.maximum.reduceat(workout_volume[volume_order], volume_starts).tolist(),
+        ))
+
+        reps_at_weight = defaultdict(dict)
+        for user_id, exercise_id, weight, reps in zip(self.user.tolist(), self.exercise.tolist(), weights,
+                                                      self.reps.tolist()):
+            marks = reps_at_weight[(user_id, exercise_id)]
+            key = reps_key(weight)
+            marks[key] = max(marks.get(key, 0), reps)
+
+        order, starts = runs(self.user, self.exercise)
+        best_weight = np.fmax.reduceat(self.weight[order], starts)
+        estimated_1rm = np.fmax.reduceat(self.estimate[order], starts)
+        bests = []
+        for g, i in enumerate(order[starts]):
+            key = (int(self.user[i]), int(self.exercise[i]))
+            bests.append(PersonalBest(
+                user_id=key[0], exercise_id=key[1], weight=to_cents(best_weight[g]),
+                estimated_1rm=to_cents(estimated_1rm[g]), volume=to_cents(best_volume[key]),
+                reps_at_weight=reps_at_weight[key],
+            ))
+        return bests
@@ -0,0 +1,91 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from logger.daily_log import add_workouts_to_daily_logs
+from logger.fast_json import FastJSONRenderer, orjson, serialize_daily_logs, serialize_workouts
+from logger.models import DailyLog, Exercise, MealEntry, Workout, WorkoutExercise
+from logger.serializers import DailyLogSerializer, WorkoutSerializer
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the compiled workout/daily log serializers + orjson renderer against '
+            'WorkoutSerializer/DailyLogSerializer + DRF JSONRenderer, on seeded data that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workouts', type=int, default=1000)
+        parser.add_argument('--exercises', type=int, default=6, help='Exercises per workout')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if not Exercise.objects.exists():
+            raise CommandError('Seed the exercise catalog first (logger/seed_data.py)')
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed, the renderer falls back to the stdlib encoder'))
+        try:
+            with transaction.atomic():
+                user = self.seed(options['workouts'], options['exercises'])
+                self.compare('workouts', options['repeat'],
+                             lambda: WorkoutSerializer(Workout.objects.filter(user=user), many=True).data,
+                             lambda: serialize_workouts(Workout.objects.filter(user=user)))
+                self.compare('daily logs', options['repeat'],
+                             lambda: DailyLogSerializer(DailyLog.objects.filter(user=user).order_by('-date'), many=True).data,
+                             lambda: serialize_daily_logs(DailyLog.objects.filter(user=user).order_by('-date')))
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count, per_workout):
+        rng = random.Random(0)
+        user = User.objects.create_user(f'benchmark-{time.time_ns()}')
+        exercises = list(Exercise.objects.all())
+        workouts = Workout.objects.bulk_create([
+            Workout(user=user, name=f'Workout {i}', date=date(2024, 1, 1) + timedelta(days=i // 2), notes='Felt strong ✨')
+            for i in range(count)
+        ])
+        WorkoutExercise.objects.bulk_create([
+            WorkoutExercise(user=user, workout=workout, exercise=exercise, name=exercise.name, order=order,
+                            sets=rng.randint(1, 5), reps=rng.randint(5, 12),
+                            weight=rng.choice([None, rng.randint(20, 400) * 2.5]))
+            for workout in workouts
+            for order, exercise in enumerate(rng.sample(exercises, per_workout))
+        ])
+        add_workouts_to_daily_logs(workouts)
+        meals = MealEntry.objects.bulk_create([
+            MealEntry(user=user, name='Chicken & rice', calories=650, protein=45, carbs=70, fats=12, date=workout.date)
+            for workout in workouts[::2]
+        ])
+        through = DailyLog.meals.through
+        logs = {log.date: log.id for log in DailyLog.objects.filter(user=user)}
+        through.objects.bulk_create([through(dailylog_id=logs[meal.date], mealentry_id=meal.id) for meal in meals])
+        return user
+
+    def compare(self, label, repeat, slow, fast):
+        def best(build, renderer):
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                body = renderer.render(build())
+                times.append(time.perf_counter() - start)
+            return min(times), body
+
+        with override_settings(API_FAST_JSON=True):
+            slow_time, slow_body = best(slow, JSONRenderer())
+            fast_time, fast_body = best(fast, FastJSONRenderer())
+
+        identical = 'identical' if slow_body == fast_body else self.style.ERROR('DIFFERENT')
+        self.stdout.write(
+            f"{label:<12} serializer+JSONRenderer {slow_time * 1000:8.1f} ms   "
+            f"compiled+orjson {fast_time * 1000:8.1f} ms   {slow_time / fast_time:5.1f}x   "
+            f"{len(fast_body) / 1024:.0f} KB {identical}"
+        )
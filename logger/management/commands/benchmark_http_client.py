@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.core.management.base import BaseCommand
+from logger.http_client import HTTPClient
+
+
+class StubWebhookHandler(BaseHTTPRequestHandler):
+    """Stands in for the n8n webhook: reads the JSON body and answers 200, keeping the connection open"""
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without TCP_NODELAY a kept-alive
+    # connection stalls ~40 ms per response on delayed ACKs (n8n/Node sets it too)
+    disable_nagle_algorithm = True
+    delay = 0.0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.delay:
+            time.sleep(self.delay)
+        body = b'{"message": "Workflow was started"}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = ('Benchmark outbound webhook calls against a local stub: a bare requests.post per call '
+            '(new TCP connection each time) vs the pooled keep-alive client in logger/http_client.py.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Calls per run')
+        parser.add_argument('--concurrency', type=int, default=8, help='Caller threads for the concurrent runs')
+        parser.add_argument('--delay-ms', type=float, default=0.0, help='Time the stub takes per request')
+
+    def handle(self, *args, **options):
+        StubWebhookHandler.delay = options['delay_ms'] / 1000
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhookHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}/webhook/workout-agent'
+        payload = {'input': 'I did 3 sets of 10 reps bench press', 'user_id': 1, 'callback_url': url}
+
+        client = HTTPClient(pool_maxsize=options['concurrency'], max_concurrency=options['concurrency'])
+        callers = [
+            ('requests.post', lambda: requests.post(url, json=payload, timeout=10)),
+            ('pooled client', lambda: client.post(url, json=payload)),
+        ]
+
+        self.stdout.write(f"{'caller':<16}{'threads':>8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+        try:
+            for threads in sorted({1, options['concurrency']}):
+                for label, call in callers:
+                    call()  # warm up (and open the pooled connection)
+                    self.report(label, threads, call, options['requests'])
+        finally:
+            client.close()
+            server.shutdown()
+
+    def report(self, label, threads, call, count):
+        def timed(_):
+            start = time.perf_counter()
+            call().raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            latencies = sorted(pool.map(timed, range(count)))
+        elapsed = time.perf_counter() - start
+
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        self.stdout.write(f"{label:<16}{threads:>8}{p50:>10.2f}{p99:>10.2f}{count / elapsed:>10.0f}")
@@ -0,0 +1,100 @@
+import ast
+import re
+import timeit
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from logger.workout_scanner import parse_exercises
+
+# The six uncompiled patterns NLPEngine._parse_exercises used before the scanner,
+# with the role of each capture group, kept here as the benchmark baseline.
+LEGACY_PATTERNS = {
+    'sets_reps_exercise': (r'(\d+)\s*(?:x|sets?)\s*(?:of\s+)?(\d+)\s*(?:reps?|times?)\s*(?:of\s+)?([^,\n.]+)', ('sets', 'reps', 'name')),
+    'reps_exercise': (r'(\d+)\s*(?:reps?|times?)\s*(?:of\s+)?([^,\n.]+)', ('reps', 'name')),
+    'exercise_sets_reps': (r'([^,\n.]+?)\s*(\d+)\s*x\s*(\d+)', ('name', 'sets', 'reps')),
+    'exercise_weight': (r'([^,\n.]+?)\s*(?:at|with|@)\s*(\d+)\s*(?:lbs?|kg|pounds?)', ('name', 'weight')),
+    'duration_exercise': (r'(\d+)\s*(?:minutes?|mins?|hours?|hrs?)\s*(?:of\s+)?([^,\n.]+)', ('duration', 'name')),
+    'simple_exercise': (r'(?:did|performed|completed)\s+([^,\n.]+?)(?:\s*,|\s*and|\s*$)', ('name',)),
+}
+
+EXTRA_PHRASES = [
+    "I did 3 sets of 10 reps bench press and 5 sets of 5 deadlifts",
+    "30 minutes of running followed by 20 pushups",
+    "Upper body workout: 4x12 bicep curls, 3x10 shoulder press",
+    "I completed bench press at 135 lbs and did some squats",
+    "Did pullups and pushups today",
+    "chest day 3x10 bench, 3x12 incline",
+]
+
+
+def legacy_parse(text):
+    """Old behaviour: one re.finditer per pattern, first pattern to produce a name wins"""
+    exercises = []
+    text_lower = text.lower()
+    for pattern, roles in LEGACY_PATTERNS.values():
+        for match in re.finditer(pattern, text_lower):
+            data = {'name': None, 'sets': 1, 'reps': None, 'weight': None, 'duration': None}
+            for role, value in zip(roles, match.groups()):
+                data[role] = value.strip() if role == 'name' else int(value)
+            exercises.append(data)
+
+    unique_exercises = []
+    seen_names = set()
+    for exercise in exercises:
+        if exercise['name'] not in seen_names:
+            unique_exercises.append(exercise)
+            seen_names.add(exercise['name'])
+    return unique_exercises
+
+
+def load_phrases(path):
+    """Collect the workout phrases used as inputs in improved_nlp_test_script.py"""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+
+    phrases = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Dict):
+            for key, value in zip(node.keys, node.values):
+                if not isinstance(key, ast.Constant):
+                    continue
+                if key.value == 'input' and isinstance(value, ast.Constant):
+                    phrases.append(value.value)
+                elif key.value == 'steps' and isinstance(value, ast.List):
+                    phrases.extend(elt.value for elt in value.elts if isinstance(elt, ast.Constant))
+        elif isinstance(node, ast.List):
+            for elt in node.elts:
+                if isinstance(elt, ast.Tuple) and elt.elts and isinstance(elt.elts[0], ast.Constant) \
+                        and isinstance(elt.elts[0].value, str) and ' ' in elt.elts[0].value:
+                    phrases.append(elt.elts[0].value)
+    return list(dict.fromkeys(p for p in phrases if isinstance(p, str) and p.strip()))
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the single-pass workout scanner against the old six-pattern parser.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Passes over the phrase list per implementation')
+        parser.add_argument('--show', action='store_true', help='Print what each parser extracted per phrase')
+
+    def handle(self, *args, **options):
+        phrases = load_phrases(settings.BASE_DIR / 'improved_nlp_test_script.py') + EXTRA_PHRASES
+        iterations = options['iterations']
+
+        results = {}
+        for label, parse in (('legacy (6 patterns)', legacy_parse), ('scanner', parse_exercises)):
+            seconds = min(timeit.repeat(lambda: [parse(p) for p in phrases], number=iterations, repeat=3))
+            parsed = [parse(p) for p in phrases]
+            results[label] = parsed
+            per_phrase_us = seconds / (iterations * len(phrases)) * 1e6
+            self.stdout.write(
+                f"{label:<20} {per_phrase_us:8.2f} us/phrase   "
+                f"{sum(len(r) for r in parsed):4d} exercises, "
+                f"{sum(1 for r in parsed if r)}/{len(phrases)} phrases with a match"
+            )
+
+        if options['show']:
+            for i, phrase in enumerate(phrases):
+                self.stdout.write(f"\n{phrase}")
+                for label, parsed in results.items():
+                    summary = [(ex['name'], ex['sets'], ex['reps'], ex['weight'], ex['duration']) for ex in parsed[i]]
+                    self.stdout.write(f"  {label:<20} {summary}")
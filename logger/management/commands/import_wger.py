@@ -1,6 +1,6 @@
-import requests
 import json
 from django.core.management.base import BaseCommand
+from logger.http_client import get_http_client
 from logger.models import Exercise, Equipment, Muscle, MovementType
 
 class Command(BaseCommand):
@@ -24,8 +24,9 @@ class Command(BaseCommand):
         # Helper to handle paginated endpoints
         def fetch_all(url):
             results = []
+            client = get_http_client()  # one keep-alive connection for every page
             while url:
-                response = requests.get(url)
+                response = client.get(url)
                 data = response.json()
                 results.extend(data['results'])
                 url = data.get('next')
@@ -0,0 +1,63 @@
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from logger.http_client import get_http_client
+from logger.nlp_engine import NLPEngine
+from logger.nlp_cache import parse_cache, match_cache
+from logger.nlp_metrics import stage_metrics
+from .benchmark_nlp_parse import EXTRA_PHRASES, load_phrases
+
+
+class Command(BaseCommand):
+    help = ('Show where NLP processing time goes, per stage: run the test phrases through the engine '
+            'with instrumentation on, or read the histograms of a running server with --url.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='nlp-stage-timings debug endpoint of a running server to read instead')
+        parser.add_argument('--rounds', type=int, default=5, help='Passes over the phrase list')
+        parser.add_argument('--cold', action='store_true', help='Clear the parse/match caches before every pass')
+        parser.add_argument('--user-id', type=int, default=None, help='User to process phrases as (default: first user)')
+
+    def handle(self, *args, **options):
+        if options['url']:
+            try:
+                response = get_http_client().get(options['url'])
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                raise CommandError(f"Could not read {options['url']}: {e}")
+            data = response.json()
+            if not data.get('instrumentation'):
+                self.stdout.write(self.style.WARNING('NLP_INSTRUMENTATION is off on that server, nothing is recorded'))
+            self.print_table(data['stages'])
+            return
+
+        user = User.objects.filter(id=options['user_id']).first() if options['user_id'] else User.objects.first()
+        if user is None:
+            raise CommandError('No user to process phrases as')
+
+        phrases = load_phrases(settings.BASE_DIR / 'improved_nlp_test_script.py') + EXTRA_PHRASES
+        engine = NLPEngine()
+        engine.instrument = True
+        stage_metrics.reset()
+
+        for _ in range(options['rounds']):
+            if options['cold']:
+                parse_cache.clear()
+                match_cache.clear()
+            for phrase in phrases:
+                engine.process_workout_input(phrase, user)
+
+        self.stdout.write(f"{len(phrases)} phrases x {options['rounds']} rounds "
+                          f"({'cold' if options['cold'] else 'warm'} caches)\n")
+        self.print_table(stage_metrics.snapshot())
+
+    def print_table(self, stages):
+        self.stdout.write(f"{'stage':<16}{'calls':>8}{'mean ms':>10}{'p50':>10}{'p90':>10}"
+                          f"{'p99':>10}{'max':>10}{'queries/call':>14}")
+        for stage, summary in stages.items():
+            self.stdout.write(
+                f"{stage:<16}{summary['count']:>8}{summary['mean']:>10.3f}{summary['p50']:>10.3f}"
+                f"{summary['p90']:>10.3f}{summary['p99']:>10.3f}{summary['max']:>10.3f}"
+                f"{summary['queries_per_call']:>14.2f}"
+            )
@@ -0,0 +1,54 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from logger.daily_log import MACROS
+from logger.dashboard import invalidate_dashboard
+from logger.models import DailyLog
+
+
+def _meal_sum(macro):
+    """Sum of `macro` over the outer daily log's meals, as a correlated subquery"""
+    meals = DailyLog.meals.through.objects.filter(dailylog_id=OuterRef('pk')).values('dailylog_id')
+    return Coalesce(Subquery(meals.annotate(total=Sum(f'mealentry__{macro}')).values('total')), 0,
+                    output_field=IntegerField())
+
+
+class Command(BaseCommand):
+    help = ("Recompute DailyLog.total_* from the logs' meals, for every user, where they have drifted "
+            "(e.g. after bulk imports that bypass the meal signals).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted logs without fixing them')
+
+    def handle(self, *args, **options):
+        # One aggregate query finds every log whose totals differ from the sum of its meals
+        expected = {f'expected_{macro}': Coalesce(Sum(f'meals__{macro}'), 0) for macro in MACROS}
+        drifted = DailyLog.objects.annotate(**expected).filter(
+            reduce(or_, (~Q(**{f'total_{macro}': F(f'expected_{macro}')}) for macro in MACROS))
+        ).order_by('user_id', 'date')
+        rows = list(drifted.values('id', 'user_id', 'user__username', 'date', *(f'total_{m}' for m in MACROS), *expected))
+
+        for row in rows:
+            changes = ', '.join(
+                f"{macro} {row[f'total_{macro}']} -> {row[f'expected_{macro}']}"
+                for macro in MACROS if row[f'total_{macro}'] != row[f'expected_{macro}']
+            )
+            self.stdout.write(f"{row['user__username']} {row['date']}: {changes}")
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('All daily log totals match their meals'))
+            return
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{len(rows)} daily logs have drifted (dry run, nothing changed)'))
+            return
+
+        # Recomputed inside the UPDATE, so meals logged since the check above are counted too
+        fixed = DailyLog.objects.filter(id__in=[row['id'] for row in rows]).update(
+            **{f'total_{macro}': _meal_sum(macro) for macro in MACROS}
+        )
+        invalidate_dashboard(row['user_id'] for row in rows)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} daily logs'))
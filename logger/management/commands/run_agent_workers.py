@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+def worker_main(stop, poll_interval):
+    """
+    Entry point of each worker process (importable, so it also works with the spawn start method)
+    """
+    import django
+    django.setup()
+    from logger.agent_jobs import work
+
+    # The parent handles Ctrl-C/SIGTERM and tells workers to finish their current job
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    work(poll_interval=poll_interval, stop=stop)
+
+
+class Command(BaseCommand):
+    help = 'Run a pool of worker processes posting queued workout agent jobs to n8n.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'AGENT_JOB_WORKERS', 2),
+                            help='Worker processes (default AGENT_JOB_WORKERS)')
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'AGENT_JOB_POLL_INTERVAL', 1.0),
+                            help='Seconds an idle worker waits before polling again')
+        parser.add_argument('--once', action='store_true', help='Run every due job in this process and exit')
+        parser.add_argument('--requeue-dead', action='store_true', help='Retry dead-lettered jobs, then exit')
+
+    def handle(self, *args, **options):
+        from logger.agent_jobs import requeue_dead_jobs, work
+
+        if options['requeue_dead']:
+            self.stdout.write(f"Requeued {requeue_dead_jobs()} dead jobs")
+            return
+
+        if options['once']:
+            self.stdout.write(f"Ran {work(poll_interval=0, max_jobs=10 ** 9)} jobs")
+            return
+
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE)
+        stop = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(target=worker_main, args=(stop, options['poll_interval']),
+                                    name=f'agent-worker-{i}', daemon=True)
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} agent workers (Ctrl-C to stop)")
+
+        # Treat SIGTERM like Ctrl-C (setting the event from a signal handler can deadlock on its lock)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        try:
+            while not stop.is_set():
+                for i, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        self.stderr.write(f"{worker.name} exited ({worker.exitcode}), restarting it")
+                        workers[i] = multiprocessing.Process(target=worker_main, args=(stop, options['poll_interval']),
+                                                             name=worker.name, daemon=True)
+                        workers[i].start()
+                stop.wait(5)
+        except KeyboardInterrupt:
+            stop.set()
+
+        self.stdout.write("Stopping, waiting for running jobs to finish")
+        for worker in workers:
+            worker.join()
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0005_workout_history_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mealentry',
+            index=models.Index(fields=['user', '-date', '-created_at'], name='mealentry_user_date'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutexercise',
+            index=models.Index(fields=['workout', 'order'], name='workoutexercise_workout_order'),
+        ),
+        migrations.AddIndex(
+            model_name='workoutexercise',
+            index=models.Index(fields=['user', 'exercise'], name='workoutexercise_user_exercise'),
+        ),
+    ]
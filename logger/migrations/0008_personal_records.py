@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logger', '0007_exerciseprogress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalBest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('estimated_1rm', models.DecimalField(blank=True, decimal_places=2, max_digits=7, null=True)),
+                ('volume', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('reps_at_weight', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='logger.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'exercise'), name='personalbest_unique_exercise')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('weight', 'Heaviest weight'), ('reps', 'Most reps at a weight'), ('volume', 'Most volume in a workout'), ('estimated_1rm', 'Best estimated 1RM')], max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('previous', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('weight', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='logger.exercise')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('workout', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='personal_records', to='logger.workout')),
+            ],
+            options={
+                'ordering': ['-date', '-created_at'],
+                'indexes': [models.Index(fields=['user', '-date'], name='personalrecord_user_date')],
+            },
+        ),
+    ]
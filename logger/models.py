@@ -43,11 +43,25 @@ class Workout(models.Model):
     exercises = models.ManyToManyField(Exercise, through='WorkoutExercise')
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Client-supplied key (n8n callbacks) so a retried request doesn't create the workout twice
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
 
     def __str__(self):
         return f"{self.name} - {self.date}"
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # Workout history pages: keyset pagination on (date, created_at, id) per user
+            models.Index(fields=['user', '-date', '-created_at', '-id'], name='workout_user_history'),
+        ]
+        constraints = [
+            # Per user: the key only has to be unique among one client's requests
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='workout_unique_idempotency_key',
+            ),
+        ]
 
 class WorkoutExercise(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -60,6 +74,14 @@ class WorkoutExercise(models.Model):
     notes = models.TextField(blank=True)
     order = models.PositiveIntegerField(default=0)
 
+    class Meta:
+        indexes = [
+            # A workout's exercises in order, without a sort
+            models.Index(fields=['workout', 'order'], name='workoutexercise_workout_order'),
+            # A user's history for one exercise (progress, PRs)
+            models.Index(fields=['user', 'exercise'], name='workoutexercise_user_exercise'),
+        ]
+
 class SavedWorkout(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     name = models.CharField(max_length=200)
@@ -86,6 +108,10 @@ class MealEntry(models.Model):
         return f"{self.name} - {self.calories} cal ({self.date})"
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            # A user's meals for a date range, newest first
+            models.Index(fields=['user', '-date', '-created_at'], name='mealentry_user_date'),
+        ]
 
 class DailyLogPicture(models.Model):
     image = models.ImageField(
@@ -114,8 +140,141 @@ class DailyLog(models.Model):
     )
 
     class Meta:
+        # Also the index for a user's logs by date range (scanned backwards for -date)
         unique_together = ['user', 'date']
 
     def __str__(self):
         return f"{self.user.username} - {self.date}"
 
+
+class AgentJob(models.Model):
+    """
+    A queued call to the n8n workout agent, run by `manage.py run_agent_workers`
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    DEAD = 'dead'  # out of retries (or rejected by n8n), kept as the dead letter queue
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (DEAD, 'Dead'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers poll for the oldest due job in a status
+            models.Index(fields=['status', 'run_after'], name='agentjob_status_run_after'),
+        ]
+
+    def __str__(self):
+        return f"Agent job {self.id} ({self.status})"
+
+
+class ExerciseProgress(models.Model):
+    """
+    A user's totals for one exercise on one day, derived from their WorkoutExercise rows
+    (kept up to date by logger/progress.py, rebuilt by `manage.py backfill_exercise_progress`)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    date = models.DateField()
+    total_sets = models.PositiveIntegerField(default=0)
+    total_reps = models.PositiveIntegerField(default=0)
+    volume = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # sum of sets x reps x weight
+    best_weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    estimated_1rm = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        constraints = [
+            # Also the index for a user's history of one exercise by date range
+            models.UniqueConstraint(fields=['user', 'exercise', 'date'], name='exerciseprogress_unique_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name} ({self.date})"
+
+
+class PersonalBest(models.Model):
+    """
+    A user's best-so-far marks on one exercise, so new sets are checked for PRs without
+    reading their history (logger/progress.py)
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    estimated_1rm = models.DecimalField(max_digits=7, decimal_places=2, null=True, blank=True)
+    volume = models.DecimalField(max_digits=12, decimal_places=2, default=0)  # most in one workout
+    reps_at_weight = models.JSONField(default=dict, blank=True)  # "225.00" (or "bodyweight") -> most reps
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'exercise'], name='personalbest_unique_exercise'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name}"
+
+
+class PersonalRecord(models.Model):
+    """
+    A PR set in a workout: the new mark and the one it beat
+    """
+    WEIGHT = 'weight'
+    REPS = 'reps'
+    VOLUME = 'volume'
+    ESTIMATED_1RM = 'estimated_1rm'
+    KIND_CHOICES = [
+        (WEIGHT, 'Heaviest weight'),
+        (REPS, 'Most reps at a weight'),
+        (VOLUME, 'Most volume in a workout'),
+        (ESTIMATED_1RM, 'Best estimated 1RM'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    exercise = models.ForeignKey(Exercise, on_delete=models.CASCADE)
+    workout = models.ForeignKey(Workout, on_delete=models.CASCADE, related_name='personal_records')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.DecimalField(max_digits=12, decimal_places=2)
+    previous = models.DecimalField(max_digits=12, decimal_places=2)
+    weight = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)  # the weight a reps PR was at
+    date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', '-date'], name='personalrecord_user_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.exercise.name} {self.kind} {self.value} ({self.date})"
+
+
+class CatalogVersion(models.Model):
+    """
+    A single row counting changes to the exercise catalog, so every worker process agrees on
+    which catalog snapshot is current (logger/catalog.py)
+    """
+    version = models.BigIntegerField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Catalog version {self.version}"
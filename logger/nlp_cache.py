@@ -0,0 +1,75 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable
+from django.conf import settings
+
+MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Cache key for a chat message: lowercased, trimmed, runs of spaces collapsed.
+    Newlines are kept because the scanner treats them as sentence breaks.
+    """
+    return re.sub(r'[ \t]+', ' ', text.strip().lower())
+
+
+class LRUCache:
+    """
+    Small thread-safe LRU cache with hit/miss counters
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=MISSING):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+# Classification + parse output, keyed on normalize_text() and the engine's intent settings
+# (NLPEngine._parse_key). Does not depend on the catalog.
+parse_cache = LRUCache(getattr(settings, 'NLP_PARSE_CACHE_SIZE', 1024))
+
+# Catalog matches, keyed on (index version, exercise name) so a rebuilt index never
+# sees answers from the old one. Also cleared by the catalog signals in signals.py.
+match_cache = LRUCache(getattr(settings, 'NLP_MATCH_CACHE_SIZE', 4096))
@@ -1,17 +1,48 @@
 import re
 import json
+import sys
+import importlib.util
+from pathlib import Path
 from typing import Dict, List, Tuple, Optional, Union
 from datetime import date
+from django.conf import settings
 from django.db import transaction
 from .models import (
-    Exercise, Muscle, Equipment, Workout, DailyLog, 
-    WorkoutExerciseItem, BaseExercise
+    Exercise, Equipment, Workout, WorkoutExercise
 )
-from django.contrib.contenttypes.models import ContentType
+from .daily_log import upsert_daily_log, add_workouts_to_daily_log
+from .progress import personal_record_data, track_workout_exercises
+from .exercise_index import get_exercise_index, similarity, trigrams
+from .workout_scanner import parse_exercises
+from .keyword_matcher import KeywordMatcher
+from .nlp_cache import MISSING, normalize_text, parse_cache, match_cache
+from .nlp_metrics import NULL_TIMER, StageTimer, stage_metrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Intents from nlp_engine/intents.json that mean "log this workout"
+WORKOUT_INTENTS = {'create_workout', 'create_workout_and_workout_template'}
+
+
+def _intent_classification():
+    """
+    Load nlp_engine/intent_classification.py. It lives next to the model it serves, but this
+    module shadows the nlp_engine/ directory as a package, so it is loaded by path.
+    """
+    name = 'logger.intent_classification'
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            name, Path(__file__).resolve().parent / 'nlp_engine' / 'intent_classification.py'
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules[name] = module
+    return sys.modules[name]
+
+# Set once loading the intent model has failed, so later messages go straight to keywords
+_intent_model_missing = False
+
 class NLPEngine:
     """
     Enhanced NLP Engine for workout and meal logging with structured workflow
@@ -19,28 +50,26 @@ class NLPEngine:
     
     def __init__(self):
         
-        # Workout patterns for parsing, kind of like templates to help identify exercises
-        self.workout_patterns = {
-            # "3 sets of 10 reps bench press"
-            'sets_reps_exercise': r'(\d+)\s*(?:x|sets?)\s*(?:of\s+)?(\d+)\s*(?:reps?|times?)\s*(?:of\s+)?([^,\n.]+)',
-            # "10 reps bench press"
-            'reps_exercise': r'(\d+)\s*(?:reps?|times?)\s*(?:of\s+)?([^,\n.]+)',
-            # "bench press 3x10"
-            'exercise_sets_reps': r'([^,\n.]+?)\s*(\d+)\s*x\s*(\d+)',
-            # "bench press at 135 lbs"
-            'exercise_weight': r'([^,\n.]+?)\s*(?:at|with|@)\s*(\d+)\s*(?:lbs?|kg|pounds?)',
-            # "30 minutes running"
-            'duration_exercise': r'(\d+)\s*(?:minutes?|mins?|hours?|hrs?)\s*(?:of\s+)?([^,\n.]+)',
-            # Simple exercise mention
-            'simple_exercise': r'(?:did|performed|completed)\s+([^,\n.]+?)(?:\s*,|\s*and|\s*$)',
+        # Workout keywords for classification, grouped by what they tell us
+        self.workout_keywords = {
+            'general': ['workout', 'exercise', 'training', 'gym', 'cardio', 'duration'],
+            'movement': [
+                'lift', 'run', 'pushup', 'pullup', 'squat', 'bench', 'deadlift', 'curl', 'press', 'row', 'extension'
+            ],
+            'volume': ['sets', 'reps', 'weight'],
+            'split': ['push', 'pull', 'legs', 'upper body', 'lower body', 'core'],
         }
+        self.keyword_matcher = KeywordMatcher(self.workout_keywords)
         
-        # Workout keywords for classification
-        self.workout_keywords = [
-            'workout', 'exercise', 'training', 'gym', 'lift', 'run', 'pushup', 
-            'pullup', 'squat', 'bench', 'deadlift', 'curl', 'press', 'row', 'extension','sets', 'reps', 'weight',
-              'duration', 'cardio', 'push', 'pull', 'legs', 'upper body', 'lower body', 'core'
-        ]
+        # Use the trained intent model instead of keywords to decide what is a workout
+        self.use_intent_model = getattr(settings, 'NLP_INTENT_CLASSIFIER', False)
+        self.intent_backend = getattr(settings, 'NLP_INTENT_BACKEND', None)  # None: the classifier's default
+        
+        # Per-stage timers and query counts on every result (see nlp_metrics.py)
+        self.instrument = getattr(settings, 'NLP_INSTRUMENTATION', False)
+        
+        # Trigram similarity needed to accept the top suggestion as the match
+        self.similar_match_threshold = 0.65
         
         # Common exercise name mappings
         self.exercise_mappings = {
@@ -66,40 +95,176 @@ class NLPEngine:
         Main method to process workout input and return structured data
         """
         logger.info(f"Processing workout input: {text}")
+        timer = self._timer()
+        
+        with timer.stage('total'):
+            # Steps 1 and 2: Classify if this is a workout and parse exercises from text
+            parsed = self._parse_text(text, timer=timer)
+            if parsed is None:
+                return self._not_workout_result(timer)
+            keyword_hits, exercises = parsed
+            
+            # Step 3: Match exercises to database
+            with timer.stage('match'):
+                matched_exercises = self._match_exercises_to_db(exercises, user)
+            
+            # Steps 4 and 5: Workout name and confidence
+            return self._build_result(text, keyword_hits, exercises, matched_exercises, timer)
+    
+    def process_workout_inputs(self, texts: List[str], user) -> List[Dict]:
+        """
+        Process many workout messages in one call (chat backfills, n8n log replays).
+        Each distinct text missing from the parse cache is classified (one batched intent model
+        call) and parsed once, every distinct exercise name is resolved once in a single bulk
+        lookup, and results come back in input order.
+        With instrumentation on, the batched intent model call and the bulk lookup are
+        timed once for the whole batch under 'classify_batch' and 'match'.
+        """
+        logger.info(f"Processing {len(texts)} workout inputs")
+        batch_timer = self._timer()
+        
+        # Steps 1 and 2 for every distinct message, running the intent model only on cache misses
+        distinct = list(dict.fromkeys(texts))
+        cached = {text: parse_cache.get(self._parse_key(text)) for text in distinct}
+        uncached = [text for text in distinct if cached[text] is MISSING]
+        with batch_timer.stage('classify_batch'):
+            if self.use_intent_model and uncached:
+                intents = self._classify_intents(uncached)
+            else:
+                intents = [None] * len(uncached)
+        timers = {text: self._timer() for text in distinct}
+        for text, intent in zip(uncached, intents):
+            cached[text] = self._classify_and_parse(text, intent, timers[text])
+        parsed = {text: self._copy_parsed(cached[text]) for text in distinct}
+        
+        # Step 3 once for every distinct exercise name
+        with batch_timer.stage('match'):
+            names = {exercise['name'] for entry in parsed.values() if entry for exercise in entry[1]}
+            matches = self._resolve_exercise_names(names)
+        
+        results = []
+        for text in texts:
+            entry = parsed[text]
+            timer = timers[text]
+            if timer.enabled:
+                # Own copy per result, with the shared batch stages alongside this text's stages
+                timer = StageTimer()
+                timer.timings = {**batch_timer.timings, **timers[text].timings}
+            if entry is None:
+                results.append(self._not_workout_result(timer))
+                continue
+            keyword_hits, exercises = entry
+            matched_exercises = []
+            for exercise in exercises:
+                match = matches[exercise['name']]
+                matched_exercises.append({
+                    **exercise, **match, 'suggested_exercises': list(match['suggested_exercises'])
+                })
+            results.append(self._build_result(text, keyword_hits, exercises, matched_exercises, timer))
+        
+        return results
+    
+    def _parse_text(self, text: str, intent: Optional[Dict] = None,
+                    timer=NULL_TIMER) -> Optional[Tuple[Dict[str, int], List[Dict]]]:
+        """
+        Classify and parse a message, returning (keyword_hits, exercises) or None if it
+        isn't workout-related. Cached by normalized text and intent settings (see _parse_key)
+        since it doesn't depend on the catalog.
+        """
+        cached = parse_cache.get(self._parse_key(text))
+        if cached is MISSING:
+            cached = self._classify_and_parse(text, intent, timer)
+        return self._copy_parsed(cached)
+    
+    def _classify_and_parse(self, text: str, intent: Optional[Dict] = None,
+                            timer=NULL_TIMER) -> Optional[Tuple[Dict[str, int], List[Dict]]]:
+        """
+        Steps 1 and 2 for a message that isn't in the parse cache; caches and returns the outcome
+        """
+        # Step 1: Classify if this is a workout (one pass, hits per keyword category)
+        with timer.stage('classify'):
+            keyword_hits = self._keyword_hits(text)
+            if self.use_intent_model:
+                intent = intent or self._classify_intents([text])[0]
+            if intent is not None:
+                is_workout = intent['label'] in WORKOUT_INTENTS
+            else:
+                is_workout = sum(keyword_hits.values()) >= 1
+        parsed = None
+        if is_workout:
+            # Step 2: Parse exercises from text
+            with timer.stage('parse'):
+                parsed = (keyword_hits, self._parse_exercises(text))
+        parse_cache.set(self._parse_key(text), parsed)
+        return parsed
+    
+    def _parse_key(self, text: str) -> Tuple[str, bool, Optional[str]]:
+        """
+        Parse cache key: the same message classifies differently by keyword and by each intent backend
+        """
+        return normalize_text(text), self.use_intent_model, self.intent_backend
+    
+    @staticmethod
+    def _copy_parsed(parsed) -> Optional[Tuple[Dict[str, int], List[Dict]]]:
+        """Callers add match info to the cached dicts, so hand out copies"""
+        if parsed is None:
+            return None
+        keyword_hits, exercises = parsed
+        return dict(keyword_hits), [dict(exercise) for exercise in exercises]
+    
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Hit/miss counters for the parse and catalog-match caches
+        """
+        return {'parse': parse_cache.stats(), 'match': match_cache.stats()}
+    
+    def stage_stats(self) -> Dict[str, Dict]:
+        """
+        Latency histograms (ms) and query counts per pipeline stage, aggregated in this process
+        """
+        return stage_metrics.snapshot()
+    
+    def _timer(self):
+        return StageTimer() if self.instrument else NULL_TIMER
+    
+    def _not_workout_result(self, timer=NULL_TIMER) -> Dict:
+        result = {
+            'success': False,
+            'message': 'Input does not appear to be workout-related',
+            'confidence': 0.1
+        }
+        if timer.enabled:
+            result['timings'] = timer.timings
+        return result
+    
+    def _build_result(self, text: str, keyword_hits: Dict[str, int], exercises: List[Dict],
+                      matched_exercises: List[Dict], timer=NULL_TIMER) -> Dict:
+        """
+        Generate the workout name and confidence and assemble the result dict
+        """
+        with timer.stage('name'):
+            workout_name = self._generate_workout_name(text, matched_exercises)
+        with timer.stage('confidence'):
+            confidence = self._calculate_confidence(exercises, matched_exercises)
         
-        # Step 1: Classify if this is a workout
-        is_workout = self._classify_as_workout(text)
-        if not is_workout:
-            return {
-                'success': False,
-                'message': 'Input does not appear to be workout-related',
-                'confidence': 0.1
-            }
-        
-        # Step 2: Parse exercises from text
-        exercises = self._parse_exercises(text)
-        
-        # Step 3: Match exercises to database
-        matched_exercises = self._match_exercises_to_db(exercises, user)
-        
-        # Step 4: Generate workout name
-        workout_name = self._generate_workout_name(text, matched_exercises)
-        
-        # Step 5: Calculate confidence
-        confidence = self._calculate_confidence(exercises, matched_exercises)
-        
-        return {
+        result = {
             'success': True,
             'workout_name': workout_name,
             'exercises': matched_exercises,
             'confidence': confidence,
             'raw_text': text,
-            'parsed_exercises': exercises
+            'parsed_exercises': exercises,
+            'keyword_hits': keyword_hits
         }
+        if timer.enabled:
+            # Same dict the timer keeps filling, so an enclosing 'total' stage still shows up
+            result['timings'] = timer.timings
+        return result
     
     def create_workout_from_nlp(self, nlp_result: Dict, user) -> Dict:
         """
-        Create a workout from NLP parsing results
+        Create a workout from NLP parsing results.
+        Runs a fixed number of queries however many exercises the workout has.
         """
         if not nlp_result.get('success'):
             return {
@@ -109,37 +274,47 @@ class NLPEngine:
         
         try:
             with transaction.atomic(): # Wraps everything in a transaction
+                today = date.today()
+                
                 # Create the workout
                 workout = Workout.objects.create(
                     user=user,
-                    name=nlp_result['workout_name']
+                    name=nlp_result['workout_name'],
+                    date=today
                 )
                 
-                # Add exercises to workout
-                order = 0
+                # Add all matched exercises to the workout in one INSERT
+                workout_exercises = []
                 for exercise_data in nlp_result['exercises']:
-                    if exercise_data['db_match']:
-                        exercise = exercise_data['db_match']
-                        WorkoutExerciseItem.objects.create(
-                            workout=workout,
-                            content_type=ContentType.objects.get_for_model(Exercise),
-                            object_id=exercise.id,
-                            order=order
-                        )
-                        order += 1
+                    if not exercise_data.get('db_match'):
+                        continue
+                    item = WorkoutExercise(
+                        user=user,
+                        workout=workout,
+                        exercise=exercise_data['db_match'],
+                        name=exercise_data['name'],
+                        sets=exercise_data.get('sets') or 1,
+                        weight=exercise_data.get('weight'),
+                        notes=f"{exercise_data['duration']} minutes" if exercise_data.get('duration') else '',
+                        order=len(workout_exercises)
+                    )
+                    if exercise_data.get('reps'):
+                        item.reps = exercise_data['reps']
+                    workout_exercises.append(item)
+                WorkoutExercise.objects.bulk_create(workout_exercises)
+                personal_records = track_workout_exercises(workout_exercises)
                 
-                # Add to today's daily log
-                daily_log, created = DailyLog.objects.get_or_create(
-                    user=user,
-                    date=date.today() 
-                )
-                daily_log.workouts.add(workout)
+                # Add to today's daily log (one upsert + one link insert)
+                daily_log = upsert_daily_log(user, today)
+                add_workouts_to_daily_log(daily_log, [workout])
                 
+                order = len(workout_exercises)
                 logger.info(f"Created workout: {workout.name} with {order} exercises")
                 
                 return {
                     'success': True,
                     'workout': workout,
+                    'personal_records': personal_record_data(personal_records),
                     'message': f'Successfully created workout "{workout.name}" with {order} exercises'
                 }
         
@@ -154,30 +329,39 @@ class NLPEngine:
         """
         Classify if the input text is workout-related
         """
-        text_lower = text.lower()
-        workout_score = sum(1 for keyword in self.workout_keywords if keyword in text_lower)
-        return workout_score >= 1
+        return self.keyword_matcher.matches(text)
+    
+    def _classify_intents(self, texts: List[str]) -> List[Dict]:
+        """
+        Intent label + score per text from the trained model (see nlp_engine/intent_classification.py),
+        or None per text when no trained model is available, so callers fall back to keywords
+        """
+        global _intent_model_missing
+        if not _intent_model_missing:
+            try:
+                return _intent_classification().classify(texts, backend=self.intent_backend)
+            except (FileNotFoundError, ImportError) as e:
+                logger.warning(f"Intent model unavailable, classifying workouts by keyword instead: {e}")
+                _intent_model_missing = True
+        return [None] * len(texts)
+    
+    def _keyword_hits(self, text: str) -> Dict[str, int]:
+        """
+        Whole-word workout keyword hits per category
+        """
+        return self.keyword_matcher.counts(text)
     
     def _parse_exercises(self, text: str) -> List[Dict]:
         """
-        Parse exercises from text using regex patterns
+        Parse exercises from text with the single-pass scanner (see workout_scanner.py)
         """
-        exercises = []
-        text_lower = text.lower()
-        
-        # Try each pattern
-        for pattern_name, pattern in self.workout_patterns.items():
-            matches = re.finditer(pattern, text_lower)
-            
-            for match in matches:
-                exercise_data = self._extract_exercise_data(match, pattern_name)
-                if exercise_data:
-                    exercises.append(exercise_data)
+        exercises = parse_exercises(text)
         
         # Remove duplicates based on exercise name
         unique_exercises = []
         seen_names = set()
         for exercise in exercises:
+            exercise['name'] = self._normalize_exercise_name(exercise['name'])
             name = exercise['name'].strip()
             if name not in seen_names:
                 unique_exercises.append(exercise)
@@ -185,90 +369,6 @@ class NLPEngine:
         
         return unique_exercises
     
-    def _extract_exercise_data(self, match, pattern_name: str) -> Optional[Dict]:
-        """
-        Extract exercise data from regex match based on pattern type
-        """
-        try:
-            if pattern_name == 'sets_reps_exercise':
-                # "3 sets of 10 reps bench press"
-                sets = int(match.group(1))
-                reps = int(match.group(2))
-                name = match.group(3).strip()
-                return {
-                    'name': self._normalize_exercise_name(name),
-                    'sets': sets,
-                    'reps': reps,
-                    'weight': None,
-                    'duration': None
-                }
-            
-            elif pattern_name == 'reps_exercise':
-                # "10 reps bench press"
-                reps = int(match.group(1))
-                name = match.group(2).strip()
-                return {
-                    'name': self._normalize_exercise_name(name),
-                    'sets': 1,  # Default
-                    'reps': reps,
-                    'weight': None,
-                    'duration': None
-                }
-            
-            elif pattern_name == 'exercise_sets_reps':
-                # "bench press 3x10"
-                name = match.group(1).strip()
-                sets = int(match.group(2))
-                reps = int(match.group(3))
-                return {
-                    'name': self._normalize_exercise_name(name),
-                    'sets': sets,
-                    'reps': reps,
-                    'weight': None,
-                    'duration': None
-                }
-            
-            elif pattern_name == 'exercise_weight':
-                # "bench press at 135 lbs"
-                name = match.group(1).strip()
-                weight = int(match.group(2))
-                return {
-                    'name': self._normalize_exercise_name(name),
-                    'sets': 1,  # Default
-                    'reps': None,
-                    'weight': weight,
-                    'duration': None
-                }
-            
-            elif pattern_name == 'duration_exercise':
-                # "30 minutes running"
-                duration = int(match.group(1))
-                name = match.group(2).strip()
-                return {
-                    'name': self._normalize_exercise_name(name),
-                    'sets': 1,
-                    'reps': None,
-                    'weight': None,
-                    'duration': duration
-                }
-            
-            elif pattern_name == 'simple_exercise':
-                # "did bench press"
-                name = match.group(1).strip()
-                return {
-                    'name': self._normalize_exercise_name(name),
-                    'sets': 1,  # Default
-                    'reps': None,
-                    'weight': None,
-                    'duration': None
-                }
-        
-        except (ValueError, IndexError) as e:
-            logger.warning(f"Error extracting exercise data: {e}")
-            return None
-        
-        return None
-    
     def _normalize_exercise_name(self, name: str) -> str:
         """
         Normalize exercise name using mappings
@@ -289,55 +389,63 @@ class NLPEngine:
     
     def _match_exercises_to_db(self, exercises: List[Dict], user) -> List[Dict]:
         """
-        Match parsed exercises to database exercises
+        Match parsed exercises to database exercises using the in-memory catalog index
         """
+        matches = self._resolve_exercise_names({exercise['name'] for exercise in exercises})
         matched_exercises = []
         
         for exercise_data in exercises:
-            exercise_name = exercise_data['name']
-            
-            # Try exact match first
-            db_exercise = Exercise.objects.filter(
-                name__iexact=exercise_name
-            ).first()
-            
-            if not db_exercise:
-                # Try partial match
-                db_exercise = Exercise.objects.filter(
-                    name__icontains=exercise_name
-                ).first()
-            
-            if not db_exercise:
-                # Try base exercise match
-                base_exercise = BaseExercise.objects.filter(
-                    name__icontains=exercise_name
-                ).first()
-                
-                if base_exercise:
-                    # Get first exercise instance of this base exercise
-                    db_exercise = Exercise.objects.filter(
-                        base_exercise=base_exercise
-                    ).first()
-            
             # Add match info to exercise data
-            exercise_data['db_match'] = db_exercise
-            exercise_data['match_confidence'] = 1.0 if db_exercise else 0.0
-            exercise_data['suggested_exercises'] = self._get_exercise_suggestions(exercise_name)
-            
+            exercise_data.update(matches[exercise_data['name']])
             matched_exercises.append(exercise_data)
         
         return matched_exercises
     
+    def _resolve_exercise_names(self, names) -> Dict[str, Dict]:
+        """
+        Bulk-resolve exercise names against the catalog index (no queries once it is built, see get_exercise_index)
+        """
+        index = get_exercise_index(self.exercise_mappings)
+        matches = {}
+        
+        for exercise_name in names:
+            match = match_cache.get((index.version, exercise_name))
+            if match is MISSING:
+                # Exact -> partial -> base exercise match
+                db_exercise, match_type = index.lookup(exercise_name)
+                suggestions = index.similar(exercise_name, limit=3)
+                
+                if db_exercise and match_type == 'exact':
+                    match_confidence = 1.0
+                elif db_exercise:
+                    # Looser matches are only as good as the names are alike
+                    match_confidence = max(similarity(trigrams(exercise_name), trigrams(db_exercise.name)), 0.5)
+                elif suggestions and suggestions[0][1] >= self.similar_match_threshold:
+                    # Close enough to a catalog name ("incline db press") to take the best suggestion
+                    db_exercise, match_confidence = suggestions[0]
+                    match_type = 'similar'
+                else:
+                    match_confidence = 0.0
+                
+                match = {
+                    'db_match': db_exercise,
+                    'match_type': match_type,
+                    'match_confidence': round(match_confidence, 3),
+                    'suggested_exercises': [exercise for exercise, _ in suggestions],
+                    'suggestion_scores': [round(score, 3) for _, score in suggestions],
+                }
+                match_cache.set((index.version, exercise_name), match)
+            matches[exercise_name] = {**match, 'suggested_exercises': list(match['suggested_exercises'])}
+        
+        return matches
+    
     def _get_exercise_suggestions(self, exercise_name: str) -> List[Exercise]:
         """
-        Get exercise suggestions for unmatched exercises
+        Get exercise suggestions for unmatched exercises, ranked by trigram similarity
         """
         # Get top 3 similar exercises
-        suggestions = Exercise.objects.filter(
-            name__icontains=exercise_name.split()[0]  # Match first word
-        )[:3]
-        
-        return list(suggestions)
+        index = get_exercise_index(self.exercise_mappings)
+        return [exercise for exercise, _ in index.similar(exercise_name, limit=3)]
     
     def _generate_workout_name(self, text: str, exercises: List[Dict]) -> str:
         """
@@ -378,8 +486,11 @@ class NLPEngine:
         # Base confidence for parsing exercises
         parsing_confidence = min(0.4, len(parsed_exercises) * 0.1)
         
-        # Confidence for database matches
-        total_matches = sum(1 for ex in matched_exercises if ex.get('db_match'))
+        # Confidence for database matches, weighted by how good each match is
+        total_matches = sum(
+            ex.get('match_confidence', 1.0) if ex.get('db_match') else 0.0
+            for ex in matched_exercises
+        )
         match_confidence = (total_matches / len(matched_exercises)) * 0.6
         
         return min(0.95, parsing_confidence + match_confidence)
@@ -0,0 +1,355 @@
+"""
+CPU inference for the intent classifier trained by train_intent_classifier.py.
+
+The model is loaded lazily, once per process, and optionally made cheaper for CPU:
+  - "quantized": dynamic int8 quantization of the Linear layers
+  - "onnx":      exported once to model/model.onnx and run with onnxruntime
+  - "torch":     the fp32 model as trained
+  - "distilled": the hashed n-gram linear student in model/student.npz
+                 (train_intent_classifier.py --mode distill), NumPy only, well under 1 ms (default)
+
+The distiller only saves a student that is within --max-accuracy-drop of the teacher and above
+--min-accuracy on sentences held out of its training set.
+
+The trained artifacts in model/ are not committed. Without student.npz the distilled backend
+falls back to the quantized BERT model; without either, load() raises FileNotFoundError.
+
+Concurrent classify() calls are collected by a background thread into micro-batches
+(up to MAX_BATCH_SIZE texts, waiting at most MAX_WAIT_MS for more) so a burst of
+chat messages costs a few forward passes instead of one per message.
+
+Benchmark from the logger/ directory:
+    python nlp_engine/intent_classification.py --backend quantized --requests 500 --concurrency 8
+"""
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = Path(__file__).resolve().parent / "model"
+INTENTS_PATH = Path(__file__).resolve().parent / "intents.json"
+STUDENT_FILE = "student.npz"
+
+BACKENDS = ("quantized", "onnx", "torch", "distilled")
+DEFAULT_BACKEND = "distilled"
+MAX_BATCH_SIZE = 16
+MAX_WAIT_MS = 5
+MAX_LENGTH = 64
+N_BUCKETS = 2 ** 14
+
+
+def hashed_features(text: str, n_buckets: int = N_BUCKETS):
+    """
+    Word unigrams, word bigrams and character trigrams hashed into `n_buckets`
+    (crc32, so buckets are stable across processes). Returns (buckets, weights) with
+    the weights L2-normalized.
+    """
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    features = [f"w:{w}" for w in words]
+    features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+
+    counts: Dict[int, float] = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode()) % n_buckets
+        counts[bucket] = counts.get(bucket, 0.0) + 1.0
+    buckets = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+    if len(weights):
+        weights /= np.sqrt((weights ** 2).sum())
+    return buckets, weights
+
+
+class DistilledIntentModel:
+    """
+    Linear softmax over hashed n-gram features, distilled from the BERT classifier
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: List[str]):
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+        self.n_buckets = weights.shape[0]
+
+    @classmethod
+    def load(cls, path: Path) -> "DistilledIntentModel":
+        with np.load(path) as data:
+            return cls(data["weights"], data["bias"], [str(label) for label in data["labels"]])
+
+    def save(self, path: Path):
+        # float16 weights keep the file small; they are widened again on load
+        np.savez_compressed(path, weights=self.weights.astype(np.float16), bias=self.bias,
+                            labels=np.array(self.labels))
+
+    def logits(self, texts: List[str]) -> np.ndarray:
+        out = np.tile(self.bias, (len(texts), 1))
+        for row, text in enumerate(texts):
+            buckets, weights = hashed_features(text, self.n_buckets)
+            out[row] += weights @ self.weights[buckets]
+        return out
+
+
+class IntentClassifier:
+    """
+    Lazily loaded, micro-batching wrapper around the fine-tuned BERT model
+    """
+
+    def __init__(self, model_dir: Path = MODEL_DIR, backend: str = DEFAULT_BACKEND,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS,
+                 num_threads: Optional[int] = None):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+        self.model_dir = Path(model_dir)
+        self.requested_backend = backend
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.num_threads = num_threads
+
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    # --- loading ---
+
+    def load(self):
+        """
+        Load tokenizer and model (once). Safe to call from several threads.
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            if self.backend == "distilled":
+                student_path = self.model_dir / STUDENT_FILE
+                if student_path.exists():
+                    self.student = DistilledIntentModel.load(student_path)
+                    self.id2label = dict(enumerate(self.student.labels))
+                    self._loaded = True
+                    return
+                logger.warning(f"{student_path} not found, falling back to the quantized BERT model")
+                self.backend = "quantized"
+            if not (self.model_dir / "config.json").exists():
+                raise FileNotFoundError(f"No trained intent model in {self.model_dir} "
+                                        f"(run train_intent_classifier.py)")
+            try:
+                import torch
+                from transformers import BertTokenizerFast, BertForSequenceClassification
+            except ImportError as e:
+                raise ImportError("Intent classification needs torch and transformers installed") from e
+
+            if self.num_threads:
+                torch.set_num_threads(self.num_threads)
+
+            self.tokenizer = BertTokenizerFast.from_pretrained(self.model_dir)
+            model = BertForSequenceClassification.from_pretrained(self.model_dir)
+            model.eval()
+            self.id2label = {int(i): label for i, label in model.config.id2label.items()}
+
+            if self.backend == "quantized":
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+            elif self.backend == "onnx":
+                self.session = self._onnx_session(model)
+            self.model = model
+            self._loaded = True
+
+    def _onnx_session(self, model):
+        """
+        Export to ONNX on first use and open a CPU inference session
+        """
+        import torch
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The onnx backend needs onnxruntime installed") from e
+
+        onnx_path = self.model_dir / "model.onnx"
+        if not onnx_path.exists():
+            sample = self.tokenizer(["export"], return_tensors="pt")
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                onnx_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=14,
+            )
+
+        options = onnxruntime.SessionOptions()
+        if self.num_threads:
+            options.intra_op_num_threads = self.num_threads
+        return onnxruntime.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+
+    # --- inference ---
+
+    def predict_logits(self, texts: List[str]) -> np.ndarray:
+        """
+        Raw logits for `texts` from one forward pass, shape (len(texts), n_labels)
+        """
+        self.load()
+        if self.backend == "distilled":
+            return self.student.logits(texts)
+        if self.backend == "onnx":
+            encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="np")
+            logits = self.session.run(["logits"], {
+                "input_ids": encoded["input_ids"].astype(np.int64),
+                "attention_mask": encoded["attention_mask"].astype(np.int64),
+            })[0]
+        else:
+            import torch
+            encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=MAX_LENGTH, return_tensors="pt")
+            with torch.inference_mode():
+                logits = self.model(
+                    input_ids=encoded["input_ids"], attention_mask=encoded["attention_mask"]
+                ).logits.numpy()
+        return logits
+
+    def predict_batch(self, texts: List[str]) -> List[Dict]:
+        """
+        One forward pass over `texts`, without micro-batching
+        """
+        logits = self.predict_logits(texts)
+        logits = logits - logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [
+            {"label": self.id2label[int(i)], "score": float(probs[row, i])}
+            for row, i in enumerate(best)
+        ]
+
+    def classify(self, texts: List[str]) -> List[Dict]:
+        """
+        Classify texts, returning [{"label": ..., "score": ...}] in input order.
+        Calls from concurrent threads are merged into shared micro-batches.
+        """
+        if not texts:
+            return []
+        self.load()
+        if self.backend == "distilled":
+            # Microseconds per text, nothing to gain from waiting for a batch
+            return self.predict_batch(texts)
+        self._ensure_worker()
+
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._load_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._batch_loop, name="intent-batcher", daemon=True)
+                    self._worker.start()
+
+    def _batch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                results = self.predict_batch([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier(backend: Optional[str] = None) -> IntentClassifier:
+    """
+    Shared per-process classifier. Backend defaults to $INTENT_BACKEND or DEFAULT_BACKEND.
+    """
+    global _classifier
+    backend = backend or os.environ.get("INTENT_BACKEND", DEFAULT_BACKEND)
+    # Compare with the backend asked for, not the one a missing artifact made it fall back to
+    if _classifier is None or _classifier.requested_backend != backend:
+        with _classifier_lock:
+            if _classifier is None or _classifier.requested_backend != backend:
+                _classifier = IntentClassifier(backend=backend)
+    return _classifier
+
+
+def classify(texts: List[str], backend: Optional[str] = None) -> List[Dict]:
+    """
+    Intent label and confidence for each text
+    """
+    return get_classifier(backend).classify(texts)
+
+
+def benchmark(backend: str, requests: int, concurrency: int, num_threads: Optional[int] = None):
+    """
+    Fire `requests` single-text classify() calls from `concurrency` threads and
+    print p50/p99 latency and throughput
+    """
+    with open(INTENTS_PATH) as f:
+        texts = [item["text"] for item in json.load(f)]
+
+    classifier = IntentClassifier(backend=backend, num_threads=num_threads)
+    start = time.perf_counter()
+    classifier.load()
+    print(f"backend={backend} load: {time.perf_counter() - start:.2f}s")
+    classifier.classify(texts[:MAX_BATCH_SIZE])  # warm up
+
+    def one(i):
+        t0 = time.perf_counter()
+        classifier.classify([texts[i % len(texts)]])
+        return time.perf_counter() - t0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"requests={requests} concurrency={concurrency}")
+    print(f"p50 {p50:.1f} ms   p99 {p99:.1f} ms   throughput {requests / elapsed:.1f} texts/s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark intent classifier inference on CPU")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=None, help="torch/onnxruntime intra-op threads")
+    args = parser.parse_args()
+    benchmark(args.backend, args.requests, args.concurrency, args.threads)
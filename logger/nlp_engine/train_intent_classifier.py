@@ -1,48 +1,267 @@
-from transformers import BertTokenizer, BertForSequenceClassification, Trainer, TrainingArguments
-from datasets import load_dataset, Dataset
-import torch
+"""
+Train the intent classifier on intents.json.
+
+    python nlp_engine/train_intent_classifier.py                  # fine-tune bert-base-uncased into nlp_engine/model
+    python nlp_engine/train_intent_classifier.py --mode distill   # distill it into nlp_engine/model/student.npz
+"""
+import argparse
 import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE))
+
+from intent_classification import (  # noqa: E402
+    MODEL_DIR, INTENTS_PATH, STUDENT_FILE, N_BUCKETS,
+    DistilledIntentModel, IntentClassifier, hashed_features,
+)
 
-with open("nlp_engine/intents.json") as f:
+with open(INTENTS_PATH) as f:
     data = json.load(f)
 
 texts = [item['text'] for item in data]
-labels = list(set(item["label"] for item in data))
+labels = sorted(set(item["label"] for item in data))
 label2id = {label: idx for idx, label in enumerate(labels)}
 id2label = {idx: label for label, idx in label2id.items()}
 
 encoded_labels = [label2id[item["label"]] for item in data]
 
-# Tokenize
-tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-encodings = tokenizer(texts, truncation=True, padding=True)
-
-# Create Hugging Face Dataset
-dataset = Dataset.from_dict({
-    "input_ids": encodings['input_ids'],
-    "attention_mask": encodings['attention_mask'],
-    "labels": encoded_labels
-})
-
-# Model
-model = BertForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=len(labels))
-
-# Training
-training_args = TrainingArguments(
-    output_dir="nlp_engine/model",
-    per_device_train_batch_size=8,
-    per_device_eval_batch_size=8,
-    num_train_epochs=5,
-    logging_dir="./logs",
-    evaluation_strategy="no",
-)
 
-trainer = Trainer(
-    model=model,
-    args=training_args,
-    train_dataset=dataset,
-)
+def train_bert():
+    from transformers import BertTokenizer, BertForSequenceClassification, Trainer, TrainingArguments
+    from datasets import Dataset
+
+    # Tokenize
+    tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
+    encodings = tokenizer(texts, truncation=True, padding=True)
+
+    # Create Hugging Face Dataset
+    dataset = Dataset.from_dict({
+        "input_ids": encodings['input_ids'],
+        "attention_mask": encodings['attention_mask'],
+        "labels": encoded_labels
+    })
+
+    # Model
+    # Label names go in the config so intent_classification.py can map logits back to intents
+    model = BertForSequenceClassification.from_pretrained(
+        'bert-base-uncased', num_labels=len(labels), id2label=id2label, label2id=label2id
+    )
+
+    # Training
+    training_args = TrainingArguments(
+        output_dir=str(MODEL_DIR),
+        per_device_train_batch_size=8,
+        per_device_eval_batch_size=8,
+        num_train_epochs=5,
+        logging_dir="./logs",
+        evaluation_strategy="no",
+    )
+
+    trainer = Trainer(
+        model=model,
+        args=training_args,
+        train_dataset=dataset,
+    )
+
+    trainer.train()
+    model.save_pretrained(MODEL_DIR)
+    tokenizer.save_pretrained(MODEL_DIR)
+
+
+# --- Distillation ---
+
+def augment(text, rng, copies):
+    """
+    Cheap variants of a training sentence (dropped words, swapped neighbours) so the
+    student sees more of the teacher's behaviour than the 100 labelled examples
+    """
+    words = text.split()
+    variants = [text]
+    for _ in range(copies):
+        variant = [w for w in words if rng.random() > 0.15] or words
+        if len(variant) > 2 and rng.random() < 0.3:
+            i = rng.randrange(len(variant) - 1)
+            variant[i], variant[i + 1] = variant[i + 1], variant[i]
+        variants.append(' '.join(variant))
+    return variants
+
+
+def softmax(logits, temperature=1.0):
+    z = logits / temperature
+    z = z - z.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=1, keepdims=True)
+
+
+def featurize(batch):
+    """
+    Sparse feature matrix as (rows, buckets, weights) arrays
+    """
+    rows, buckets, weights = [], [], []
+    for row, text in enumerate(batch):
+        b, w = hashed_features(text, N_BUCKETS)
+        rows.append(np.full(len(b), row))
+        buckets.append(b)
+        weights.append(w)
+    return np.concatenate(rows), np.concatenate(buckets), np.concatenate(weights)
+
+
+def train_student(batch, targets, epochs, lr, l2):
+    """
+    Softmax regression on hashed features against soft targets (full-batch Adam)
+    """
+    rows, buckets, weights = featurize(batch)
+    W = np.zeros((N_BUCKETS, targets.shape[1]), dtype=np.float32)
+    b = np.zeros(targets.shape[1], dtype=np.float32)
+    m = [np.zeros_like(W), np.zeros_like(b)]
+    v = [np.zeros_like(W), np.zeros_like(b)]
+
+    for step in range(1, epochs + 1):
+        logits = np.tile(b, (len(batch), 1))
+        np.add.at(logits, rows, weights[:, None] * W[buckets])
+        grad_logits = (softmax(logits) - targets) / len(batch)
+
+        grad_W = l2 * W
+        np.add.at(grad_W, buckets, weights[:, None] * grad_logits[rows])
+        grad_b = grad_logits.sum(axis=0)
+
+        for i, (param, grad) in enumerate(((W, grad_W), (b, grad_b))):
+            m[i] = 0.9 * m[i] + 0.1 * grad
+            v[i] = 0.999 * v[i] + 0.001 * grad ** 2
+            param -= lr * (m[i] / (1 - 0.9 ** step)) / (np.sqrt(v[i] / (1 - 0.999 ** step)) + 1e-8)
+
+    return DistilledIntentModel(W, b, labels)
+
+
+def evaluate(predict, eval_texts, gold, repeats=20):
+    """
+    Accuracy against the gold labels and mean single-text latency in ms (None with repeats=0)
+    """
+    predicted = [predict([t])[0]['label'] for t in eval_texts]
+    accuracy = sum(p == g for p, g in zip(predicted, gold)) / len(gold)
+    if not repeats:
+        return accuracy, None, predicted
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for text in eval_texts:
+            predict([text])
+    latency_ms = (time.perf_counter() - start) / (repeats * len(eval_texts)) * 1000
+    return accuracy, latency_ms, predicted
+
+
+def holdout_split(label_ids, fraction, rng):
+    """
+    Indices of the training and held-out sentences: `fraction` of each intent is held out
+    (at least one per intent), so the report measures sentences the student never saw
+    """
+    by_label = {}
+    for i, label_id in enumerate(label_ids):
+        by_label.setdefault(label_id, []).append(i)
+    train, held_out = [], []
+    for indices in by_label.values():
+        rng.shuffle(indices)
+        n = max(1, round(len(indices) * fraction))
+        held_out.extend(indices[:n])
+        train.extend(indices[n:])
+    return sorted(train), sorted(held_out)
+
+
+def distill(args):
+    rng = random.Random(args.seed)
+    train_idx, held_out_idx = holdout_split(encoded_labels, args.holdout, rng)
+    train_texts = [texts[i] for i in train_idx]
+    held_out_texts = [texts[i] for i in held_out_idx]
+    transfer = [variant for text in train_texts for variant in augment(text, rng, args.augment)]
+    gold = [item["label"] for item in data]
+    train_gold = [gold[i] for i in train_idx]
+    held_out_gold = [gold[i] for i in held_out_idx]
+
+    teacher = None
+    if args.teacher != 'none':
+        teacher = IntentClassifier(backend=args.teacher)
+        teacher.load()
+        if [teacher.id2label[i] for i in range(len(labels))] != labels:
+            sys.exit("Teacher labels don't match intents.json, retrain the BERT model first")
+        logits = np.concatenate([
+            teacher.predict_logits(transfer[i:i + 32]) for i in range(0, len(transfer), 32)
+        ])
+        soft = softmax(logits, args.temperature)
+    else:
+        print("No teacher: training the student on the gold labels only")
+        soft = None
+
+    # Hard targets: the gold label of the sentence each variant came from
+    hard = np.zeros((len(transfer), len(labels)), dtype=np.float32)
+    per_text = args.augment + 1
+    for i, text_idx in enumerate(train_idx):
+        hard[i * per_text:(i + 1) * per_text, encoded_labels[text_idx]] = 1.0
+    targets = hard if soft is None else args.alpha * soft + (1 - args.alpha) * hard
+
+    student = train_student(transfer, targets.astype(np.float32), args.epochs, args.lr, args.l2)
+    student_classifier = IntentClassifier(backend='distilled')
+    student_classifier.student = student
+    student_classifier.id2label = dict(enumerate(labels))
+    student_classifier._loaded = True
+
+    # Accuracy vs latency report. The held-out sentences are not in the student's training set;
+    # the teacher is fine-tuned on all of intents.json (train_bert), so its held-out accuracy is
+    # optimistic and the accuracy-drop check errs on the side of rejecting the student.
+    print(f"{len(train_texts)} training sentences, {len(held_out_texts)} held out")
+    print(f"{'model':<22}{'train acc':>11}{'held-out acc':>14}{'latency (ms/text)':>20}")
+    student_train_acc, _, _ = evaluate(student_classifier.predict_batch, train_texts, train_gold, repeats=0)
+    student_acc, student_ms, student_pred = evaluate(student_classifier.predict_batch, held_out_texts, held_out_gold)
+    if teacher:
+        teacher_train_acc, _, _ = evaluate(teacher.predict_batch, train_texts, train_gold, repeats=0)
+        teacher_acc, teacher_ms, teacher_pred = evaluate(teacher.predict_batch, held_out_texts, held_out_gold,
+                                                         repeats=2)
+        agreement = sum(s == t for s, t in zip(student_pred, teacher_pred)) / len(held_out_texts)
+        print(f"{'teacher (' + args.teacher + ')':<22}{teacher_train_acc:>11.1%}{teacher_acc:>14.1%}"
+              f"{teacher_ms:>20.3f}")
+    print(f"{'student (distilled)':<22}{student_train_acc:>11.1%}{student_acc:>14.1%}{student_ms:>20.3f}")
+    if teacher:
+        print(f"held-out student/teacher agreement: {agreement:.1%}, speedup: {teacher_ms / student_ms:.0f}x")
+        if teacher_acc - student_acc > args.max_accuracy_drop:
+            sys.exit(f"Student is {teacher_acc - student_acc:.1%} less accurate than the teacher on held-out "
+                     f"sentences (allowed {args.max_accuracy_drop:.1%}), not saving it")
+    # A saved student becomes the default backend, so it has to clear the bar on its own too
+    if student_acc < args.min_accuracy:
+        sys.exit(f"Student held-out accuracy {student_acc:.1%} is below {args.min_accuracy:.1%}, not saving it")
+
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    path = MODEL_DIR / STUDENT_FILE
+    student.save(path)
+    print(f"Saved {path} ({path.stat().st_size / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['bert', 'distill'], default='bert')
+    parser.add_argument('--teacher', choices=['torch', 'quantized', 'onnx', 'none'], default='torch',
+                        help="Backend used to run the BERT teacher ('none' trains on gold labels only)")
+    parser.add_argument('--temperature', type=float, default=2.0, help='Softens the teacher distribution')
+    parser.add_argument('--alpha', type=float, default=0.7, help='Weight of teacher targets vs gold labels')
+    parser.add_argument('--augment', type=int, default=20, help='Extra variants per training sentence')
+    parser.add_argument('--epochs', type=int, default=300)
+    parser.add_argument('--lr', type=float, default=0.05)
+    parser.add_argument('--l2', type=float, default=1e-4)
+    parser.add_argument('--holdout', type=float, default=0.2,
+                        help='Share of each intent held out of distillation to measure accuracy on')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.05,
+                        help='Refuse to save a student this much less accurate than the teacher (held out)')
+    parser.add_argument('--min-accuracy', type=float, default=0.9,
+                        help='Refuse to save a student below this held-out accuracy')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if not 0 < args.holdout < 1:
+        parser.error('--holdout must be between 0 and 1')
 
-trainer.train()
-model.save_pretrained("nlp_engine/model")
-tokenizer.save_pretrained("nlp_engine/model")
\ No newline at end of file
+    if args.mode == 'bert':
+        train_bert()
+    else:
+        distill(args)
@@ -0,0 +1,155 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+from django.db import connection
+
+# NLPEngine stages in pipeline order ('classify_batch' only runs in process_workout_inputs)
+STAGES = ['classify_batch', 'classify', 'parse', 'match', 'name', 'confidence', 'total']
+
+# Histogram bucket upper bounds in milliseconds (roughly log-spaced, 10 us to 10 s)
+BUCKETS_MS = [
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000,
+]
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram with count/sum/min/max, cheap enough to update on every request
+    """
+
+    def __init__(self, bounds: List[float] = BUCKETS_MS):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """
+        Upper bound of the bucket holding the p-th percentile (capped at the largest value seen)
+        """
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                bound = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': round(self.total / self.count, 4) if self.count else None,
+            'min': round(self.min, 4) if self.min is not None else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': round(self.max, 4) if self.max is not None else None,
+            'buckets': {
+                (str(bound) if i < len(self.bounds) else '+Inf'): n
+                for i, (bound, n) in enumerate(zip(self.bounds + [None], self.counts)) if n
+            },
+        }
+
+
+class StageMetrics:
+    """
+    In-process aggregate of stage timings: one latency histogram and a query counter per stage
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency: Dict[str, Histogram] = {}
+            self.queries: Dict[str, int] = {}
+
+    def record(self, stage: str, ms: float, queries: int):
+        with self._lock:
+            histogram = self.latency.get(stage)
+            if histogram is None:
+                histogram = self.latency[stage] = Histogram()
+            histogram.observe(ms)
+            self.queries[stage] = self.queries.get(stage, 0) + queries
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Per-stage latency summary (ms) and total/mean DB queries, pipeline stages first
+        """
+        with self._lock:
+            order = [s for s in STAGES if s in self.latency] + sorted(set(self.latency) - set(STAGES))
+            snapshot = {}
+            for stage in order:
+                summary = self.latency[stage].summary()
+                summary['queries'] = self.queries[stage]
+                summary['queries_per_call'] = round(self.queries[stage] / summary['count'], 3)
+                snapshot[stage] = summary
+            return snapshot
+
+
+# Shared by every NLPEngine in this process
+stage_metrics = StageMetrics()
+
+
+class StageTimer:
+    """
+    Times the stages of one NLP call and counts the DB queries each one runs.
+    Every finished stage is also recorded into `metrics`.
+    """
+
+    enabled = True
+
+    def __init__(self, metrics: StageMetrics = stage_metrics):
+        self.metrics = metrics
+        self.timings: Dict[str, Dict] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_queries):
+                yield
+        finally:
+            ms = (time.perf_counter() - start) * 1000
+            timing = self.timings.setdefault(name, {'ms': 0.0, 'queries': 0})
+            timing['ms'] = round(timing['ms'] + ms, 4)
+            timing['queries'] += queries
+            self.metrics.record(name, ms, queries)
+
+
+class NullTimer:
+    """
+    Stand-in when instrumentation is off: every stage is the same no-op context manager
+    """
+
+    enabled = False
+    timings: Dict[str, Dict] = {}
+    _noop = nullcontext()
+
+    def stage(self, name: str):
+        return self._noop
+
+
+NULL_TIMER = NullTimer()
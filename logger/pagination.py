@@ -0,0 +1,54 @@
+import base64
+import json
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(workout) -> str:
+    """Opaque cursor pointing just past `workout` in (date, created_at, id) order"""
+    position = [workout.date.isoformat(), workout.created_at.isoformat(), workout.id]
+    return base64.urlsafe_b64encode(json.dumps(position, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[date, datetime, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        day, created_at, workout_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        workout_id = int(workout_id)
+        if not 0 < workout_id < 2 ** 63:
+            # Out of range for the id column: the database would raise instead of matching nothing
+            raise ValueError(workout_id)
+        return date.fromisoformat(day), datetime.fromisoformat(created_at), workout_id
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_page(queryset: QuerySet, cursor: Optional[str] = None, limit: int = 20) -> Tuple[List, Optional[str]]:
+    """
+    One page of workouts newest first, ordered by (date, created_at, id) descending.
+
+    Instead of OFFSET, the page starts strictly after the cursor's (date, created_at, id),
+    so the database seeks straight to it on the (user, date, created_at, id) index and
+    page 500 costs the same as page 1. Returns (workouts, next_cursor or None).
+    """
+    queryset = queryset.order_by('-date', '-created_at', '-id')
+    if cursor:
+        day, created_at, workout_id = decode_cursor(cursor)
+        # date <= d leads so the index range scan starts at the cursor; the rest breaks ties
+        queryset = queryset.filter(
+            Q(date__lte=day) & (
+                Q(date__lt=day)
+                | Q(created_at__lt=created_at)
+                | Q(created_at=created_at, id__lt=workout_id)
+            )
+        )
+    rows = list(queryset[:limit + 1])
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
@@ -0,0 +1,327 @@
+"""
+Per user/exercise/day progress (ExerciseProgress): volume, best weight and estimated 1RM.
+
+Each row is recomputed from that day's WorkoutExercise rows whenever one of them is saved or
+deleted (signals.py, plus the bulk_create call sites), so charts and PR lookups read the
+(user, exercise, date) index instead of scanning every set a user has logged.
+
+New workouts are also checked for personal records against PersonalBest, a best-so-far row per
+user and exercise, so detection costs one read and one upsert however long the history is.
+Deleting or editing sets can lower a best, so those recompute the affected bests from the
+remaining history (recompute_personal_bests). PersonalRecord rows go with their workout when it
+is deleted; an edited workout keeps the PRs it was logged with.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, ROUND_HALF_UP
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import ExerciseProgress, PersonalBest, PersonalRecord, Workout, WorkoutExercise
+
+# (user_id, exercise_id, date)
+ProgressKey = Tuple[int, int, date]
+
+CENT = Decimal('0.01')
+
+
+def one_rep_max_formula() -> str:
+    return getattr(settings, 'PROGRESS_1RM_FORMULA', 'epley')
+
+
+def estimate_1rm(weight: float, reps: int, formula: Optional[str] = None) -> Optional[float]:
+    """
+    Estimated one-rep max from a set of `reps` at `weight`: Epley w(1 + r/30) or Brzycki 36w/(37 - r).
+    A single rep is its own 1RM; Brzycki has no estimate past 36 reps.
+    """
+    formula = formula or one_rep_max_formula()
+    if reps <= 1:
+        return weight
+    if formula == 'brzycki':
+        return weight * 36 / (37 - reps) if reps < 37 else None
+    return weight * (1 + reps / 30)
+
+
+def to_cents(value) -> Optional[Decimal]:
+    """Float -> Decimal rounded half up to the cent, the same way for incremental and backfilled rows"""
+    if value is None or value != value:  # None or NaN
+        return None
+    return Decimal(repr(float(value))).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def progress_keys(workout_exercises: Iterable[WorkoutExercise]) -> Set[ProgressKey]:
+    """Keys touched by WorkoutExercise instances whose workout is loaded (e.g. just bulk-created)"""
+    return {(item.user_id, item.exercise_id, item.workout.date) for item in workout_exercises}
+
+
+def refresh_exercise_progress(keys: Iterable[ProgressKey]):
+    """
+    Recompute the progress rows for `keys` from their WorkoutExercise rows: one SELECT,
+    one upsert, and one DELETE for days that no longer have any sets
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    formula = one_rep_max_formula()
+    totals: Dict[ProgressKey, Dict] = defaultdict(lambda: {
+        'total_sets': 0, 'total_reps': 0, 'volume': Decimal(0), 'best_weight': None, 'estimated_1rm': None,
+    })
+    rows = WorkoutExercise.objects.filter(
+        user_id__in={key[0] for key in keys},
+        exercise_id__in={key[1] for key in keys},
+        workout__date__in={key[2] for key in keys},
+    ).values_list('user_id', 'exercise_id', 'workout__date', 'sets', 'reps', 'weight')
+    for user_id, exercise_id, day, sets, reps, weight in rows:
+        key = (user_id, exercise_id, day)
+        if key not in keys:
+            continue
+        row = totals[key]
+        row['total_sets'] += sets
+        row['total_reps'] += sets * reps
+        if weight is not None:
+            weight = Decimal(weight)
+            row['volume'] += sets * reps * weight
+            if row['best_weight'] is None or weight > row['best_weight']:
+                row['best_weight'] = weight
+            estimate = to_cents(estimate_1rm(float(weight), reps, formula))
+            if estimate is not None and (row['estimated_1rm'] is None or estimate > row['estimated_1rm']):
+                row['estimated_1rm'] = estimate
+
+    if totals:
+        ExerciseProgress.objects.bulk_create(
+            [
+                ExerciseProgress(user_id=user_id, exercise_id=exercise_id, date=day, **row)
+                for (user_id, exercise_id, day), row in totals.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'exercise', 'date'],
+            update_fields=['total_sets', 'total_reps', 'volume', 'best_weight', 'estimated_1rm', 'updated_at'],
+        )
+    emptied = keys - totals.keys()
+    if emptied:
+        ExerciseProgress.objects.filter(reduce(or_, (
+            Q(user_id=user_id, exercise_id=exercise_id, date=day) for user_id, exercise_id, day in emptied
+        ))).delete()
+
+
+class ProgressRefresh:
+    """
+    Deleted WorkoutExercise rows whose days to recompute when the transaction commits, in one
+    refresh_exercise_progress call however many rows a cascade deletes. Rows are kept as
+    (user_id, exercise_id, workout_id) so no workout is read per row; the dates come from the
+    workouts deleted alongside them, else from one query at commit.
+    """
+
+    def __init__(self):
+        self.rows: Set[Tuple[int, int, int]] = set()
+        self.workout_dates: Dict[int, date] = {}
+        self.done = False  # already run, e.g. by a test's captureOnCommitCallbacks, but still listed
+
+    def __call__(self):
+        self.done = True
+        missing = {workout_id for _, _, workout_id in self.rows} - self.workout_dates.keys()
+        dates = {**dict(Workout.objects.filter(pk__in=missing).values_list('id', 'date')), **self.workout_dates}
+        refresh_exercise_progress(
+            (user_id, exercise_id, dates[workout_id])
+            for user_id, exercise_id, workout_id in self.rows if workout_id in dates
+        )
+        recompute_personal_bests((user_id, exercise_id) for user_id, exercise_id, _ in self.rows)
+
+
+def pending_progress_refresh() -> ProgressRefresh:
+    """
+    The current transaction's ProgressRefresh, registered with transaction.on_commit on first use.
+    Call it inside a transaction (deletes always run in one).
+    """
+    connection = transaction.get_connection()
+    # A rolled back savepoint drops its callbacks, and with them the rows it queued
+    for _, func, _ in connection.run_on_commit:
+        if isinstance(func, ProgressRefresh) and not func.done:
+            return func
+    pending = ProgressRefresh()
+    transaction.on_commit(pending)
+    return pending
+
+
+def reps_key(weight: Optional[Decimal]) -> str:
+    """PersonalBest.reps_at_weight key for a weight (unweighted sets count as bodyweight)"""
+    return 'bodyweight' if weight is None else str(Decimal(weight).quantize(CENT))
+
+
+def detect_personal_records(workout_exercises: Iterable[WorkoutExercise]) -> List[PersonalRecord]:
+    """
+    Compare freshly created WorkoutExercise rows (with their workout loaded) to the users'
+    best-so-far marks, save the PRs they set and raise the marks. Two queries for the bests
+    plus one INSERT for any PRs, O(exercises) in Python. The first time an exercise is logged
+    only sets the marks: there is nothing to beat yet.
+    """
+    workout_exercises = list(workout_exercises)
+    if not workout_exercises:
+        return []
+    formula = one_rep_max_formula()
+    pairs = {(item.user_id, item.exercise_id) for item in workout_exercises}
+    bests = {
+        (best.user_id, best.exercise_id): best
+        for best in PersonalBest.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in pairs}, exercise_id__in={exercise_id for _, exercise_id in pairs}
+        )
+        if (best.user_id, best.exercise_id) in pairs
+    }
+
+    # Each workout's sets of each exercise, in the order they were logged
+    groups: Dict[Tuple[int, int], List[WorkoutExercise]] = defaultdict(list)
+    for item in workout_exercises:
+        groups[(item.workout.id, item.exercise_id)].append(item)
+
+    records = []
+    for items in groups.values():
+        first = items[0]
+        workout, user_id, exercise_id = first.workout, first.user_id, first.exercise_id
+        best = bests.get((user_id, exercise_id))
+        new_exercise = best is None
+        if new_exercise:
+            best = bests[(user_id, exercise_id)] = PersonalBest(user_id=user_id, exercise_id=exercise_id,
+                                                                 reps_at_weight={})
+
+        def record(kind, value, previous, weight=None):
+            if not new_exercise:
+                records.append(PersonalRecord(
+                    user_id=user_id, exercise=first.exercise, workout=workout, kind=kind,
+                    value=value, previous=previous or 0, weight=weight, date=workout.date,
+                ))
+
+        top_weight = top_estimate = None
+        volume = Decimal(0)
+        top_reps: Dict[str, Tuple[int, Optional[Decimal]]] = {}
+        for item in items:
+            weight = None if item.weight is None else Decimal(item.weight).quantize(CENT)
+            key = reps_key(weight)
+            if key not in top_reps or item.reps > top_reps[key][0]:
+                top_reps[key] = (item.reps, weight)
+            if weight is None:
+                continue
+            volume += item.sets * item.reps * weight
+            top_weight = weight if top_weight is None else max(top_weight, weight)
+            estimate = to_cents(estimate_1rm(float(weight), item.reps, formula))
+            if estimate is not None and (top_estimate is None or estimate > top_estimate):
+                top_estimate = estimate
+
+        if top_weight is not None and (best.weight is None or top_weight > best.weight):
+            record(PersonalRecord.WEIGHT, top_weight, best.weight)
+            best.weight = top_weight
+        if top_estimate is not None and (best.estimated_1rm is None or top_estimate > best.estimated_1rm):
+            record(PersonalRecord.ESTIMATED_1RM, top_estimate, best.estimated_1rm)
+            best.estimated_1rm = top_estimate
+        if volume > best.volume:
+            record(PersonalRecord.VOLUME, volume, best.volume)
+            best.volume = volume
+        for key, (reps, weight) in top_reps.items():
+            previous = best.reps_at_weight.get(key)
+            if previous is None or reps > previous:
+                # A first set at a new weight isn't a reps PR unless it beats a known count
+                if previous is not None:
+                    record(PersonalRecord.REPS, reps, previous, weight)
+                best.reps_at_weight[key] = reps
+
+    PersonalBest.objects.bulk_create(
+        list(bests.values()),
+        update_conflicts=True,
+        unique_fields=['user', 'exercise'],
+        update_fields=['weight', 'estimated_1rm', 'volume', 'reps_at_weight', 'updated_at'],
+    )
+    PersonalRecord.objects.bulk_create(records)
+    return records
+
+
+@transaction.atomic
+def recompute_personal_bests(pairs: Iterable[Tuple[int, int]]):
+    """
+    Rebuild the PersonalBest rows for (user_id, exercise_id) pairs from their remaining
+    WorkoutExercise rows, after sets were deleted or edited: one locking read, one SELECT over
+    the pairs' history, one upsert, and one DELETE for exercises no longer logged at all
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return
+    formula = one_rep_max_formula()
+    user_ids = {user_id for user_id, _ in pairs}
+    exercise_ids = {exercise_id for _, exercise_id in pairs}
+    # Lock the rows detect_personal_records compares against while they are rebuilt
+    stored = {
+        (user_id, exercise_id)
+        for user_id, exercise_id in PersonalBest.objects.select_for_update().filter(
+            user_id__in=user_ids, exercise_id__in=exercise_ids
+        ).values_list('user_id', 'exercise_id')
+    } & pairs
+
+    bests: Dict[Tuple[int, int], PersonalBest] = {}
+    volumes: Dict[Tuple[int, int, int], Decimal] = defaultdict(Decimal)
+    rows = WorkoutExercise.objects.filter(user_id__in=user_ids, exercise_id__in=exercise_ids).values_list(
+        'user_id', 'exercise_id', 'workout_id', 'sets', 'reps', 'weight'
+    )
+    for user_id, exercise_id, workout_id, sets, reps, weight in rows:
+        pair = (user_id, exercise_id)
+        if pair not in pairs:
+            continue
+        best = bests.get(pair)
+        if best is None:
+            best = bests[pair] = PersonalBest(user_id=user_id, exercise_id=exercise_id, reps_at_weight={})
+        weight = None if weight is None else Decimal(weight).quantize(CENT)
+        key = reps_key(weight)
+        best.reps_at_weight[key] = max(best.reps_at_weight.get(key, 0), reps)
+        if weight is None:
+            continue
+        volumes[(user_id, exercise_id, workout_id)] += sets * reps * weight
+        if best.weight is None or weight > best.weight:
+            best.weight = weight
+        estimate = to_cents(estimate_1rm(float(weight), reps, formula))
+        if estimate is not None and (best.estimated_1rm is None or estimate > best.estimated_1rm):
+            best.estimated_1rm = estimate
+    for (user_id, exercise_id, _), volume in volumes.items():
+        best = bests[(user_id, exercise_id)]
+        best.volume = max(best.volume, volume)
+
+    if bests:
+        PersonalBest.objects.bulk_create(
+            list(bests.values()),
+            update_conflicts=True,
+            unique_fields=['user', 'exercise'],
+            update_fields=['weight', 'estimated_1rm', 'volume', 'reps_at_weight', 'updated_at'],
+        )
+    emptied = stored - bests.keys()
+    if emptied:
+        PersonalBest.objects.filter(reduce(or_, (
+            Q(user_id=user_id, exercise_id=exercise_id) for user_id, exercise_id in emptied
+        ))).delete()
+
+
+@transaction.atomic
+def track_workout_exercises(workout_exercises: List[WorkoutExercise]) -> List[PersonalRecord]:
+    """
+    Bookkeeping for bulk-created WorkoutExercise rows (bulk_create sends no signals):
+    refresh their days' progress and return the PRs they set. Atomic, since the personal
+    bests are locked while they are compared.
+    """
+    refresh_exercise_progress(progress_keys(workout_exercises))
+    return detect_personal_records(workout_exercises)
+
+
+def personal_record_data(records: Iterable[PersonalRecord]) -> List[Dict]:
+    """JSON-friendly PRs for API responses"""
+    return [
+        {
+            'exercise': record.exercise_id,
+            'exercise_name': record.exercise.name,
+            'kind': record.kind,
+            'value': str(record.value),
+            'previous': str(record.previous),
+            'weight': None if record.weight is None else str(record.weight),
+            'date': record.date.isoformat(),
+        }
+        for record in records
+    ]
@@ -1,9 +1,49 @@
+from django.db import transaction
+from django.db.models import Manager, Model, Prefetch, QuerySet, prefetch_related_objects
 from rest_framework import serializers
 from .models import (
-    MuscleGroup, Equipment, Exercise, Workout, WorkoutExercise,
+    MuscleGroup, Equipment, BaseExercise, Exercise, Workout, WorkoutExercise,
     MealEntry, DailyLog
 )
 
+# --- Query planning ---
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the related rows it reads, so serializing many objects costs a
+    fixed number of queries instead of a few per object. Serializers with
+    `list_serializer_class = EagerListSerializer` apply this automatically with many=True.
+    """
+    select_related = ()
+    prefetch_related = ()
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Add the declared select_related/prefetch_related to a queryset"""
+        if cls.select_related:
+            queryset = queryset.select_related(*cls.select_related)
+        if cls.prefetch_related:
+            queryset = queryset.prefetch_related(*cls.prefetch_related)
+        return queryset
+    
+    @classmethod
+    def prefetch_for(cls, instances):
+        """Load the declared relations onto instances that are already fetched (lists, single objects)"""
+        prefetch_related_objects(list(instances), *cls.select_related, *cls.prefetch_related)
+
+class EagerListSerializer(serializers.ListSerializer):
+    """ListSerializer that eager-loads what its child serializer declares before serializing"""
+    def to_representation(self, data):
+        if isinstance(data, Manager):
+            data = data.all()
+        if isinstance(data, QuerySet):
+            # Already evaluated means it was prefetched by a parent serializer
+            if data._result_cache is None:
+                data = self.child.setup_eager_loading(data)
+        elif isinstance(data, (list, tuple)) and data and isinstance(data[0], Model):
+            self.child.prefetch_for(data)
+        return super().to_representation(data)
+
 class MuscleGroupSerializer(serializers.ModelSerializer):
     """Convert MuscleGroup objects to/from JSON"""
     class Meta:
@@ -34,37 +74,54 @@ class ExerciseSerializer(serializers.ModelSerializer):
         """Get list of secondary muscle group names"""
         return [mg.name for mg in obj.secondary_muscle_groups.all()]
 
-class WorkoutExerciseSerializer(serializers.ModelSerializer):
+class WorkoutExerciseSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Convert WorkoutExercise junction table to/from JSON"""
     exercise_name = serializers.CharField(source='exercise.name', read_only=True)
     primary_muscle_group = serializers.CharField(source='exercise.primary_muscle_group.name', read_only=True)
     equipment = serializers.CharField(source='exercise.equipment.name', read_only=True)
     
+    # exercise.primary_muscle_group goes through the base exercise
+    select_related = ('exercise__base_exercise__primary_muscle_group', 'exercise__equipment')
+    
     class Meta:
         model = WorkoutExercise
         fields = [
             'id', 'exercise', 'exercise_name', 'primary_muscle_group', 'equipment',
-            'sets', 'reps', 'weight', 'rest_seconds', 'notes', 'order'
+            'sets', 'reps', 'weight', 'notes', 'order'
         ]
+        list_serializer_class = EagerListSerializer
 
-class WorkoutSerializer(serializers.ModelSerializer):
+class WorkoutSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Convert Workout objects to/from JSON with all exercises included"""
     workout_exercises = WorkoutExerciseSerializer(source='workoutexercise_set', many=True, read_only=True)
     exercise_count = serializers.SerializerMethodField()
     
+    prefetch_related = (
+        Prefetch(
+            'workoutexercise_set',
+            queryset=WorkoutExerciseSerializer.setup_eager_loading(WorkoutExercise.objects.order_by('order', 'id'))
+        ),
+    )
+    
     class Meta:
         model = Workout
         fields = [
             'id', 'name', 'date', 'notes', 'created_at',
             'workout_exercises', 'exercise_count'
         ]
+        list_serializer_class = EagerListSerializer
     
     def get_exercise_count(self, obj):
         """Count how many exercises are in this workout"""
-        return obj.workoutexercise_set.count()
+        return obj.workoutexercise_set.count()  # no query once prefetched
 
 # --- AI Workout Creation Serializer ---
 
+class AIWorkoutListSerializer(serializers.ListSerializer):
+    """Create a whole batch of AI workouts with bulk inserts instead of one create() per item"""
+    def create(self, validated_data):
+        return self.child.create_many(validated_data)
+
 class AIWorkoutCreateSerializer(serializers.Serializer):
     """
     Special serializer for AI-generated workouts
@@ -74,6 +131,8 @@ class AIWorkoutCreateSerializer(serializers.Serializer):
     workout_name = serializers.CharField(max_length=200)
     workout_date = serializers.DateField(required=False)
     notes = serializers.CharField(required=False, allow_blank=True)
+    # Retried callbacks carry the same key, so they don't create the workout twice
+    idempotency_key = serializers.CharField(max_length=100, required=False)
     
     # List of exercises with their details
     exercises = serializers.ListField(
@@ -82,82 +141,170 @@ class AIWorkoutCreateSerializer(serializers.Serializer):
         )
     )
     
+    class Meta:
+        list_serializer_class = AIWorkoutListSerializer
+    
     def validate_exercises(self, value):
-        """Make sure each exercise has required fields"""
+        """
+        Make sure each exercise has required fields, and convert sets, reps and rest_seconds
+        to ints and weight to a Decimal (None when missing), so bad numbers are a 400
+        """
+        from decimal import Decimal, InvalidOperation
+        
         for exercise in value:
             if 'name' not in exercise:
                 raise serializers.ValidationError("Each exercise must have a 'name' field")
-            if 'sets' not in exercise:
-                exercise['sets'] = 3  # Default
-            if 'reps' not in exercise:
-                exercise['reps'] = 10  # Default
+            for field, default in (('sets', 3), ('reps', 10), ('rest_seconds', None)):
+                raw = exercise.get(field)
+                if raw in (None, ''):
+                    exercise[field] = default
+                    continue
+                if not raw.isdecimal():
+                    raise serializers.ValidationError(
+                        f"{exercise['name']}: '{field}' must be a whole number, not {raw!r}")
+                exercise[field] = int(raw)
+            raw = exercise.get('weight')
+            if raw in (None, ''):
+                exercise['weight'] = None
+                continue
+            try:
+                weight = Decimal(raw)
+            except InvalidOperation:
+                weight = None
+            weight = weight.quantize(Decimal('0.01')) if weight is not None and weight.is_finite() else None
+            # WorkoutExercise.weight holds up to 9999.99
+            if weight is None or not 0 <= weight < 10000:
+                raise serializers.ValidationError(f"{exercise['name']}: 'weight' must be a number, not {raw!r}")
+            exercise['weight'] = weight
         return value
     
     def create(self, validated_data):
         """Create a workout from AI-processed data"""
-        from datetime import date
+        return self.create_many([validated_data])[0]
+    
+    @staticmethod
+    def resolve_users(items):
+        """Map each item's user_id to its User, falling back to the first user for unknown ids"""
         from django.contrib.auth.models import User
         
-        # Extract data
-        user_id = validated_data.get('user_id', 1)
-        workout_name = validated_data['workout_name']
-        workout_date = validated_data.get('workout_date', date.today())
-        notes = validated_data.get('notes', 'Generated by AI assistant')
-        exercises_data = validated_data['exercises']
-        
-        # Get user
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            user = User.objects.first()  # Fallback to first user
+        user_ids = {item.get('user_id', 1) for item in items}
+        users = User.objects.in_bulk(user_ids)
+        fallback_user = None
+        if len(users) < len(user_ids):
+            fallback_user = User.objects.order_by('id').first()  # Fallback to first user
+        return {user_id: users.get(user_id, fallback_user) for user_id in user_ids}
+    
+    @transaction.atomic
+    def create_many(self, items, users=None):
+        """
+        Create workouts from a batch of AI-processed data (validated, so numbers are already
+        converted): one INSERT for the workouts and one for all their exercises.
+        `users` is resolve_users(items) if the caller already has it.
+        All or nothing (a savepoint when the caller already has a transaction open).
+        """
+        from datetime import date
+        from .progress import track_workout_exercises
         
-        # Create the workout
-        workout = Workout.objects.create(
-            user=user,
-            name=workout_name,
-            date=workout_date,
-            notes=notes
-        )
+        users = users or self.resolve_users(items)
         
-        # Add exercises
-        for order, exercise_data in enumerate(exercises_data):
-            # Find or create the exercise
-            exercise, created = Exercise.objects.get_or_create(
-                name=exercise_data['name'],
-                defaults={
-                    'primary_muscle_group': self._get_or_create_muscle_group(exercise_data.get('muscle_group', 'General')),
-                    'equipment': self._get_or_create_equipment(exercise_data.get('equipment', 'Bodyweight')),
-                    'notes': f"AI suggested exercise: {exercise_data['name']}"
-                }
-            )
-            
-            # Create workout exercise
-            WorkoutExercise.objects.create(
-                workout=workout,
-                exercise=exercise,
-                sets=int(exercise_data.get('sets', 3)),
-                reps=int(exercise_data.get('reps', 10)),
-                weight=float(exercise_data['weight']) if exercise_data.get('weight') else None,
-                rest_seconds=int(exercise_data['rest_seconds']) if exercise_data.get('rest_seconds') else None,
-                notes=exercise_data.get('notes', ''),
-                order=order
+        # Create the workouts
+        workouts = [
+            Workout(
+                user=users[item.get('user_id', 1)],
+                name=item['workout_name'],
+                date=item.get('workout_date', date.today()),
+                notes=item.get('notes', 'Generated by AI assistant'),
+                idempotency_key=item.get('idempotency_key')
             )
+            for item in items
+        ]
+        Workout.objects.bulk_create(workouts)
         
-        return workout
+        # Add exercises
+        exercises = self._resolve_exercises([ex for item in items for ex in item['exercises']])
+        workout_exercises = []
+        for workout, item in zip(workouts, items):
+            for order, exercise_data in enumerate(item['exercises']):
+                notes = exercise_data.get('notes', '')
+                if exercise_data.get('rest_seconds'):
+                    notes = f"{notes} (rest {exercise_data['rest_seconds']}s)".strip()
+                workout_exercises.append(WorkoutExercise(
+                    user=workout.user,
+                    name=exercise_data['name'],
+                    workout=workout,
+                    exercise=exercises[exercise_data['name']],
+                    sets=exercise_data['sets'],
+                    reps=exercise_data['reps'],
+                    weight=exercise_data['weight'],
+                    notes=notes,
+                    order=order
+                ))
+        WorkoutExercise.objects.bulk_create(workout_exercises)
+        # PRs set by each workout, for the API response
+        personal_records = track_workout_exercises(workout_exercises)
+        for workout in workouts:
+            workout.new_personal_records = [record for record in personal_records if record.workout is workout]
+        return workouts
     
-    def _get_or_create_muscle_group(self, name):
-        """Helper to get or create muscle group"""
-        muscle_group, _ = MuscleGroup.objects.get_or_create(name=name)
-        return muscle_group
+    def _resolve_exercises(self, exercises_data):
+        """
+        Map every exercise name in the batch to an Exercise in a fixed number of queries:
+        one lookup, then (only if some are new) one upsert each for muscle groups,
+        equipment, base exercises and exercises
+        """
+        from .catalog import bump_catalog_version
+        from .signals import forget_catalog_matches
+        
+        names = {exercise_data['name'] for exercise_data in exercises_data}
+        exercises = {exercise.name: exercise for exercise in Exercise.objects.filter(name__in=names)}
+        
+        # First mention of each exercise we don't have decides its muscle group and equipment
+        missing = {}
+        for exercise_data in exercises_data:
+            if exercise_data['name'] not in exercises:
+                missing.setdefault(exercise_data['name'], exercise_data)
+        if not missing:
+            return exercises
+        
+        muscle_groups = self._upsert_by_name(MuscleGroup, {
+            exercise_data.get('muscle_group', 'General') for exercise_data in missing.values()
+        })
+        equipment = self._upsert_by_name(Equipment, {
+            exercise_data.get('equipment', 'Bodyweight') for exercise_data in missing.values()
+        })
+        base_exercises = self._upsert_by_name(BaseExercise, missing, lambda name: BaseExercise(
+            name=name,
+            primary_muscle_group=muscle_groups[missing[name].get('muscle_group', 'General')]
+        ))
+        exercises.update(self._upsert_by_name(Exercise, missing, lambda name: Exercise(
+            name=name,
+            base_exercise=base_exercises[name],
+            equipment=equipment[missing[name].get('equipment', 'Bodyweight')]
+        )))
+        
+        # bulk_create skips post_save, so do what signals.catalog_changed would
+        bump_catalog_version()
+        transaction.on_commit(forget_catalog_matches)
+        return exercises
     
-    def _get_or_create_equipment(self, name):
-        """Helper to get or create equipment"""
-        equipment, _ = Equipment.objects.get_or_create(name=name)
-        return equipment
+    def _upsert_by_name(self, model, names, build=None):
+        """
+        Get or create rows of a model with a unique `name` in one INSERT ... ON CONFLICT query.
+        Returns {name: instance}.
+        """
+        build = build or (lambda name: model(name=name))
+        # The no-op update on conflict makes the database hand back ids of rows that already existed
+        rows = model.objects.bulk_create(
+            [build(name) for name in sorted(names)],
+            update_conflicts=True,
+            unique_fields=['name'],
+            update_fields=['name'],
+        )
+        return {row.name: row for row in rows}
 
 # --- Meal and Daily Log Serializers ---
 
-class MealEntrySerializer(serializers.ModelSerializer):
+class MealEntrySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Convert MealEntry objects to/from JSON"""
     class Meta:
         model = MealEntry
@@ -165,18 +312,25 @@ class MealEntrySerializer(serializers.ModelSerializer):
             'id', 'name', 'calories', 'protein', 'carbs', 'fats',
             'date', 'created_at'
         ]
+        list_serializer_class = EagerListSerializer
 
-class DailyLogSerializer(serializers.ModelSerializer):
+class DailyLogSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     """Convert DailyLog objects to/from JSON with related data"""
     workouts = WorkoutSerializer(many=True, read_only=True)
     meals = MealEntrySerializer(many=True, read_only=True)
     
+    prefetch_related = (
+        Prefetch('workouts', queryset=WorkoutSerializer.setup_eager_loading(Workout.objects.all())),
+        'meals',
+    )
+    
     class Meta:
         model = DailyLog
         fields = [
             'id', 'date', 'workouts', 'meals',
             'total_calories', 'total_protein', 'total_carbs', 'total_fats'
         ]
+        list_serializer_class = EagerListSerializer
 
 # --- Saved Workout Serializers ---
 
@@ -0,0 +1,145 @@
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Exercise, BaseExercise, MuscleGroup, Equipment, DailyLog, MealEntry, Workout, WorkoutExercise
+from .dashboard import invalidate_dashboard
+from .daily_log import MACROS, adjust_daily_log_totals, meal_macros, sum_meal_macros
+from .exercise_index import invalidate_exercise_index
+from .nlp_cache import match_cache
+from .catalog import bump_catalog_version
+from .progress import pending_progress_refresh, recompute_personal_bests, refresh_exercise_progress
+
+
+@receiver([post_save, post_delete], sender=Exercise)
+@receiver([post_save, post_delete], sender=BaseExercise)
+@receiver([post_save, post_delete], sender=MuscleGroup)
+@receiver([post_save, post_delete], sender=Equipment)
+def catalog_changed(sender, **kwargs):
+    """New catalog version (committed together with the change), and drop this process's catalog caches"""
+    bump_catalog_version()
+    forget_catalog_matches()
+
+
+def forget_catalog_matches():
+    """Rebuild the in-memory exercise index next time it is used and forget old matches"""
+    invalidate_exercise_index()
+    match_cache.clear()
+
+
+# DailyLog.total_* is the sum of the log's meals, kept up to date here with atomic increments
+# (see daily_log.adjust_daily_log_totals). `manage.py reconcile_daily_log_totals` repairs drift
+# from writes that bypass signals, such as bulk_create or raw SQL.
+
+@receiver(m2m_changed, sender=DailyLog.meals.through)
+def daily_log_meals_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Add meals' macros to a log when they are linked to it, subtract them when unlinked"""
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        # meal.daily_logs.add/remove/clear(...)
+        logs = instance.daily_logs.all()
+        if action == 'pre_remove':
+            logs = logs.filter(id__in=pk_set)
+        log_ids = pk_set if action == 'post_add' else logs.values_list('id', flat=True)
+        adjust_daily_log_totals(log_ids, meal_macros(instance, sign))
+    else:
+        # daily_log.meals.add/remove/clear(...); post_add's pk_set only holds newly linked meals
+        meals = instance.meals.all()
+        if action != 'pre_clear':
+            meals = meals.filter(id__in=pk_set)
+        totals = sum_meal_macros(meals)
+        adjust_daily_log_totals([instance.id], {macro: sign * amount for macro, amount in totals.items()})
+
+
+@receiver(pre_save, sender=MealEntry)
+def remember_meal_macros(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._stored_macros = MealEntry.objects.filter(pk=instance.pk).values(*MACROS).first()
+
+
+@receiver(post_save, sender=MealEntry)
+def meal_saved(sender, instance, created, raw=False, **kwargs):
+    """Apply an edited meal's change in macros to the logs it belongs to"""
+    stored = getattr(instance, '_stored_macros', None)
+    instance._stored_macros = None
+    if created or raw or not stored:
+        return
+    deltas = {macro: amount - stored[macro] for macro, amount in meal_macros(instance).items()}
+    if any(deltas.values()):
+        adjust_daily_log_totals(instance.daily_logs.values_list('id', flat=True), deltas)
+
+
+@receiver(pre_delete, sender=MealEntry)
+def meal_deleted(sender, instance, **kwargs):
+    """Deleting a meal drops its links without m2m_changed, so subtract it here"""
+    adjust_daily_log_totals(instance.daily_logs.values_list('id', flat=True), meal_macros(instance, -1))
+
+
+@receiver([post_save, post_delete], sender=Workout)
+@receiver([post_save, post_delete], sender=WorkoutExercise)
+@receiver([post_save, post_delete], sender=MealEntry)
+@receiver([post_save, post_delete], sender=DailyLog)
+@receiver(m2m_changed, sender=DailyLog.workouts.through)
+@receiver(m2m_changed, sender=DailyLog.meals.through)
+def user_data_changed(sender, instance, **kwargs):
+    """Drop the owner's cached home dashboard (dashboard.load_dashboard)"""
+    invalidate_dashboard([instance.user_id])
+
+
+# ExerciseProgress rows follow the WorkoutExercise rows they summarize (see progress.py). The
+# bulk_create call sites refresh them directly; `manage.py backfill_exercise_progress` rebuilds them.
+
+def _progress_key(workout_exercise):
+    return (workout_exercise.user_id, workout_exercise.exercise_id, workout_exercise.workout.date)
+
+
+@receiver(pre_save, sender=WorkoutExercise)
+def remember_progress_key(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._stored_progress_key = WorkoutExercise.objects.filter(pk=instance.pk).values_list(
+            'user_id', 'exercise_id', 'workout__date'
+        ).first()
+
+
+@receiver(post_save, sender=WorkoutExercise)
+def workout_exercise_saved(sender, instance, raw=False, **kwargs):
+    """Recompute the day's progress, and the old day's too if the row moved; an edit can lower the bests"""
+    if raw:
+        return
+    stored = getattr(instance, '_stored_progress_key', None)
+    instance._stored_progress_key = None
+    refresh_exercise_progress({_progress_key(instance), stored} - {None})
+    if stored is not None:
+        recompute_personal_bests({(instance.user_id, instance.exercise_id), stored[:2]})
+
+
+@receiver(pre_delete, sender=WorkoutExercise)
+def workout_exercise_deleted(sender, instance, **kwargs):
+    """Recompute the day's progress once the delete commits, with the rest of the cascade"""
+    pending_progress_refresh().rows.add((instance.user_id, instance.exercise_id, instance.workout_id))
+
+
+@receiver(pre_delete, sender=Workout)
+def workout_deleted(sender, instance, **kwargs):
+    # Its exercises go in the same cascade: keep the date their refresh needs
+    pending_progress_refresh().workout_dates[instance.id] = instance.date
+
+
+@receiver(pre_save, sender=Workout)
+def remember_workout_date(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._stored_date = Workout.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+
+
+@receiver(post_save, sender=Workout)
+def workout_saved(sender, instance, raw=False, **kwargs):
+    """Moving a workout to another day moves its exercises' progress with it"""
+    stored = getattr(instance, '_stored_date', None)
+    instance._stored_date = None
+    if raw or stored is None or stored == instance.date:
+        return
+    pairs = set(instance.workoutexercise_set.values_list('user_id', 'exercise_id'))
+    refresh_exercise_progress(
+        (user_id, exercise_id, day) for user_id, exercise_id in pairs for day in (stored, instance.date)
+    )
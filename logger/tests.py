@@ -1,3 +1,1478 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import requests
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .models import (
+    MuscleGroup, Equipment, BaseExercise, Exercise, Workout, WorkoutExercise,
+    MealEntry, DailyLog, CatalogVersion, ExerciseProgress, PersonalBest, PersonalRecord, AgentJob
+)
+from .agent_jobs import (
+    backoff_delay, claim_next_job, enqueue_agent_job, requeue_dead_jobs, requeue_stale_jobs, run_job, work
+)
+from .catalog import catalog_version, get_catalog
+from .http_client import CircuitBreaker, CircuitOpenError, ConcurrencyLimitError, HTTPClient
+from .exercise_index import ExerciseIndex, get_exercise_index, invalidate_exercise_index
+from .progress import estimate_1rm, to_cents
+from .serializers import WorkoutSerializer, DailyLogSerializer, AIWorkoutCreateSerializer
+from .fast_json import FastJSONRenderer, serialize_daily_logs, serialize_workouts
+from .keyword_matcher import KeywordMatcher
+from .workout_scanner import parse_exercises
+from .nlp_engine import NLPEngine
+from .nlp_cache import MISSING, LRUCache, match_cache, parse_cache
+from .nlp_metrics import Histogram, StageMetrics, StageTimer, stage_metrics
+
+
+class SerializerQueryCountTests(TestCase):
+    """Serializing workouts and daily logs must not cost extra queries per row"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        back = MuscleGroup.objects.create(name='Back')
+        barbell = Equipment.objects.create(name='Barbell')
+        cable = Equipment.objects.create(name='Cable')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        row = BaseExercise.objects.create(name='Row', primary_muscle_group=back)
+        cls.exercises = [
+            Exercise.objects.create(name='Barbell Bench Press', base_exercise=bench, equipment=barbell),
+            Exercise.objects.create(name='Cable Row', base_exercise=row, equipment=cable),
+        ]
+
+    def add_workouts(self, count, start=0):
+        for i in range(start, start + count):
+            day = date(2025, 1, 1) + timedelta(days=i)
+            workout = Workout.objects.create(user=self.user, name=f'Workout {i}', date=day)
+            for order, exercise in enumerate(self.exercises):
+                WorkoutExercise.objects.create(
+                    user=self.user, name=exercise.name, workout=workout, exercise=exercise, order=order
+                )
+            meal = MealEntry.objects.create(
+                user=self.user, name='Oats', calories=400, protein=20, carbs=60, fats=8, date=day
+            )
+            daily_log = DailyLog.objects.create(user=self.user, date=day)
+            daily_log.workouts.add(workout)
+            daily_log.meals.add(meal)
+
+    def count_queries(self, serialize):
+        with CaptureQueriesContext(connection) as queries:
+            serialize()
+        return len(queries)
+
+    def test_workout_serializer_query_count_is_constant(self):
+        self.add_workouts(2)
+        few = self.count_queries(lambda: WorkoutSerializer(Workout.objects.all(), many=True).data)
+        self.add_workouts(8, start=2)
+        many = self.count_queries(lambda: WorkoutSerializer(Workout.objects.all(), many=True).data)
+
+        self.assertEqual(few, many)
+        self.assertEqual(many, 2)  # workouts, then their exercises with catalog rows joined
+
+    def test_workout_serializer_output(self):
+        self.add_workouts(1)
+        data = WorkoutSerializer(Workout.objects.all(), many=True).data
+        self.assertEqual(data[0]['exercise_count'], 2)
+        self.assertEqual(
+            [(ex['exercise_name'], ex['primary_muscle_group'], ex['equipment']) for ex in data[0]['workout_exercises']],
+            [('Barbell Bench Press', 'Chest', 'Barbell'), ('Cable Row', 'Back', 'Cable')],
+        )
+
+    def test_workout_list_of_instances_is_prefetched(self):
+        self.add_workouts(2)
+        few = self.count_queries(lambda: WorkoutSerializer(list(Workout.objects.all()), many=True).data)
+        self.add_workouts(8, start=2)
+        many = self.count_queries(lambda: WorkoutSerializer(list(Workout.objects.all()), many=True).data)
+        self.assertEqual(few, many)
+
+    def test_daily_log_serializer_query_count_is_constant(self):
+        self.add_workouts(2)
+        few = self.count_queries(lambda: DailyLogSerializer(DailyLog.objects.all(), many=True).data)
+        self.add_workouts(8, start=2)
+        many = self.count_queries(lambda: DailyLogSerializer(DailyLog.objects.all(), many=True).data)
+        self.assertEqual(few, many)
+
+    def test_recent_workouts_endpoint_query_count_is_constant(self):
+        self.add_workouts(1)
+        few = self.count_queries(lambda: self.client.get('/api/recent-workouts/', {'user_id': self.user.id}))
+        self.add_workouts(4, start=1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/recent-workouts/', {'user_id': self.user.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 5)
+        self.assertEqual(few, len(queries))
+
+
+class FastJSONTests(TestCase):
+    """The fast path must render the same bytes as the serializers + JSONRenderer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        exercise = Exercise.objects.create(name='Barbell Bench Press', base_exercise=bench, equipment=barbell)
+
+        day = date(2025, 1, 1)
+        cls.workouts = [
+            Workout.objects.create(user=cls.user, name='Push', date=day, notes='Felt strong \u2028 "again"'),
+            Workout.objects.create(user=cls.user, name='Empty', date=day + timedelta(days=1)),
+        ]
+        WorkoutExercise.objects.create(user=cls.user, name=exercise.name, workout=cls.workouts[0],
+                                       exercise=exercise, weight=Decimal('102.5'), notes='Paused', order=0)
+        WorkoutExercise.objects.create(user=cls.user, name=exercise.name, workout=cls.workouts[0],
+                                       exercise=exercise, weight=None, order=1)
+
+        meal = MealEntry.objects.create(user=cls.user, name='Oats', calories=400, protein=20, carbs=60, fats=8, date=day)
+        with_rows = DailyLog.objects.create(user=cls.user, date=day, total_calories=400, total_protein=20)
+        with_rows.workouts.add(*cls.workouts)
+        with_rows.meals.add(meal)
+        DailyLog.objects.create(user=cls.user, date=day + timedelta(days=1))
+
+    @staticmethod
+    def render_both(expected, actual):
+        with override_settings(API_FAST_JSON=True):
+            return JSONRenderer().render(expected), FastJSONRenderer().render(actual)
+
+    def test_workouts_are_byte_identical(self):
+        for workouts in (Workout.objects.all(), list(Workout.objects.all())):
+            expected, actual = self.render_both(
+                WorkoutSerializer(workouts, many=True).data, serialize_workouts(workouts)
+            )
+            self.assertEqual(expected, actual)
+
+    def test_daily_logs_are_byte_identical(self):
+        expected, actual = self.render_both(
+            DailyLogSerializer(DailyLog.objects.all(), many=True).data, serialize_daily_logs(DailyLog.objects.all())
+        )
+        self.assertEqual(expected, actual)
+
+    def test_workouts_deleted_after_loading_are_skipped(self):
+        workouts = list(Workout.objects.all())
+        Workout.objects.filter(id=self.workouts[1].id).delete()
+        self.assertEqual([workout['id'] for workout in serialize_workouts(workouts)], [self.workouts[0].id])
+
+
+class IndexUsageTests(TestCase):
+    """
+    The per-user date-range queries must be served by an index on a seeded large dataset,
+    not a sequential scan (EXPLAIN output from PostgreSQL or SQLite)
+    """
+    USERS = 20
+    DAYS = 300
+
+    @classmethod
+    def setUpTestData(cls):
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        cls.exercises = Exercise.objects.bulk_create([
+            Exercise(name=f'Bench Press {i}', base_exercise=bench, equipment=barbell) for i in range(10)
+        ])
+        cls.users = User.objects.bulk_create([User(username=f'lifter{i}') for i in range(cls.USERS)])
+        start = date(2024, 1, 1)
+        days = [start + timedelta(days=i) for i in range(cls.DAYS)]
+        workouts = Workout.objects.bulk_create([
+            Workout(user=user, name='Push', date=day) for user in cls.users for day in days
+        ])
+        WorkoutExercise.objects.bulk_create([
+            WorkoutExercise(user_id=workout.user_id, workout=workout, exercise=cls.exercises[(workout.id + i) % 10],
+                            name='Bench Press', order=i)
+            for workout in workouts for i in range(3)
+        ])
+        MealEntry.objects.bulk_create([
+            MealEntry(user=user, name='Oats', calories=400, protein=20, carbs=60, fats=8, date=day)
+            for user in cls.users for day in days
+        ])
+        DailyLog.objects.bulk_create([DailyLog(user=user, date=day) for user in cls.users for day in days])
+        cls.workout = workouts[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertIndexScan(self, queryset, index=None):
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        sequential = (rf'Seq Scan on {table}\b' if connection.vendor == 'postgresql'
+                      else rf'\bSCAN {table}\b')
+        self.assertNotRegex(plan, sequential)
+        if index:
+            self.assertIn(index, plan)
+
+    def date_range(self, model):
+        return model.objects.filter(
+            user=self.users[3], date__range=(date(2024, 3, 1), date(2024, 3, 31))
+        )
+
+    def test_workouts_by_user_and_date(self):
+        self.assertIndexScan(self.date_range(Workout), 'workout_user_history')
+
+    def test_meals_by_user_and_date(self):
+        self.assertIndexScan(self.date_range(MealEntry), 'mealentry_user_date')
+
+    def test_daily_logs_by_user_and_date(self):
+        self.assertIndexScan(self.date_range(DailyLog).order_by('-date'))
+
+    def test_workout_exercises_in_order(self):
+        self.assertIndexScan(
+            WorkoutExercise.objects.filter(workout=self.workout).order_by('order'), 'workoutexercise_workout_order'
+        )
+
+    def test_workout_exercises_by_user_and_exercise(self):
+        self.assertIndexScan(
+            WorkoutExercise.objects.filter(user=self.users[3], exercise=self.exercises[2]),
+            'workoutexercise_user_exercise'
+        )
+
+
+# A cache shared between processes, like Redis in production
+SHARED_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_cache'}}
+DASHBOARD_TABLES = ('logger_dailylog', 'logger_workout', 'logger_mealentry', 'logger_personalrecord')
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class HomeDashboardTests(TestCase):
+    """The dashboard costs the same few queries however much was logged today, and is cached per user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('createcachetable', verbosity=0)
+        cls.user = User.objects.create_user('lifter', password='squat')
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        cls.exercise = Exercise.objects.create(name='Barbell Bench Press', base_exercise=bench, equipment=barbell)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def log_today(self, count):
+        daily_log, _ = DailyLog.objects.get_or_create(user=self.user, date=date.today())
+        for i in range(count):
+            workout = Workout.objects.create(user=self.user, name=f'Push {i}', date=date.today())
+            for order in range(3):
+                WorkoutExercise.objects.create(
+                    user=self.user, name='Bench Press', workout=workout, exercise=self.exercise, order=order
+                )
+            meal = MealEntry.objects.create(
+                user=self.user, name='Oats', calories=400, protein=20, carbs=60, fats=8, date=date.today()
+            )
+            daily_log.workouts.add(workout)
+            daily_log.meals.add(meal)
+
+    def get_home(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_constant(self):
+        self.log_today(1)
+        _, few = self.get_home()
+        self.log_today(9)
+        response, many = self.get_home()
+
+        self.assertEqual(few, many)
+        self.assertEqual(response.context['workout_count'], 10)
+        self.assertEqual(len(response.context['todays_meals']), 10)
+        self.assertEqual(response.context['todays_workouts'][0]['exercise_count'], 3)
+        self.assertEqual(response.context['total_calories'], 4000)
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/')
+        return [query['sql'] for query in queries if any(table in query['sql'] for table in DASHBOARD_TABLES)]
+
+    def test_cache_hit_skips_dashboard_queries(self):
+        self.log_today(3)
+        self.assertEqual(len(self.dashboard_queries()), 4)
+        self.assertEqual(self.dashboard_queries(), [])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_per_process_cache_is_not_used(self):
+        # Another worker couldn't drop this process's copy, so every request reads the database
+        self.log_today(1)
+        self.assertEqual(len(self.dashboard_queries()), 4)
+        self.assertEqual(len(self.dashboard_queries()), 4)
+
+    def test_logging_a_meal_invalidates_the_cache(self):
+        self.log_today(1)
+        self.client.get('/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/', {'name': 'Rice', 'calories': 600, 'protein': 10, 'carbs': 120, 'fats': 2})
+        response = self.client.get('/')
+        self.assertEqual(response.context['total_calories'], 1000)
+        self.assertEqual(len(response.context['todays_meals']), 2)
+
+
+class AgentWorkoutIdempotencyTests(TestCase):
+    """A retried agent callback returns the workout it already created; keys are scoped per user"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        cls.other = User.objects.create_user('runner')
+
+    def post(self, data):
+        return self.client.post('/api/create-wrkout-from-agent/', data, content_type='application/json')
+
+    def workout(self, user, key, name='Push'):
+        return {'user_id': user.id, 'workout_name': name, 'workout_date': '2025-03-01', 'idempotency_key': key,
+                'exercises': [{'name': 'Bench Press', 'sets': '3', 'reps': '8', 'weight': '100'}]}
+
+    def test_retried_key_returns_the_existing_workout(self):
+        first = self.post(self.workout(self.user, 'callback-1'))
+        retry = self.post(self.workout(self.user, 'callback-1'))
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['duplicate'])
+        self.assertEqual(retry.json()['workout']['id'], first.json()['workout']['id'])
+        self.assertEqual(Workout.objects.filter(user=self.user).count(), 1)
+
+    def test_key_repeated_within_a_batch_is_created_once(self):
+        response = self.post([self.workout(self.user, 'callback-1'), self.workout(self.user, 'callback-1')])
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['duplicates'], 1)
+        self.assertEqual(Workout.objects.count(), 1)
+
+    def test_same_key_from_two_users_creates_both(self):
+        mine = self.post(self.workout(self.user, 'callback-1'))
+        theirs = self.post(self.workout(self.other, 'callback-1', name='Legs'))
+
+        self.assertEqual(theirs.status_code, 201)
+        self.assertFalse(theirs.json()['duplicate'])
+        self.assertNotEqual(theirs.json()['workout']['id'], mine.json()['workout']['id'])
+        self.assertEqual(Workout.objects.get(user=self.other).name, 'Legs')
+
+    def test_same_key_from_two_users_in_one_batch(self):
+        response = self.post([self.workout(self.user, 'callback-1'), self.workout(self.other, 'callback-1')])
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(Workout.objects.filter(idempotency_key='callback-1').count(), 2)
+
+
+class WorkoutHistoryPaginationTests(TestCase):
+    """Keyset pages of /api/workout-history/ cover every workout exactly once, even on sort-key ties"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        days = [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 2), date(2025, 1, 3)]
+        for i in range(12):
+            Workout.objects.create(user=cls.user, name=f'Workout {i}', date=days[i % len(days)])
+        # Same date and created_at for most rows: only the id breaks the tie
+        Workout.objects.filter(date=date(2025, 1, 2)).update(created_at=timezone.now())
+
+    def get(self, **params):
+        return self.client.get('/api/workout-history/', {'user_id': self.user.id, **params})
+
+    def all_pages(self, limit):
+        ids, cursor = [], None
+        while True:
+            params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+            data = self.get(**params).json()
+            ids += [workout['id'] for workout in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                self.assertFalse(data['has_more'])
+                return ids
+
+    def test_pages_cover_ties_once_in_order(self):
+        expected = list(Workout.objects.order_by('-date', '-created_at', '-id').values_list('id', flat=True))
+        for limit in (1, 2, 5, 12):
+            self.assertEqual(self.all_pages(limit), expected)
+
+    def test_last_page(self):
+        first = self.get(limit=10).json()
+        last = self.get(limit=10, cursor=first['next_cursor']).json()
+        self.assertEqual(len(last['results']), 2)
+        self.assertIsNone(last['next_cursor'])
+        self.assertFalse(last['has_more'])
+
+        # A page that ends exactly on the last workout has no next cursor either
+        exact = self.get(limit=12).json()
+        self.assertEqual(len(exact['results']), 12)
+        self.assertIsNone(exact['next_cursor'])
+
+    def test_invalid_cursors_are_rejected(self):
+        def encode(value):
+            return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip('=')
+
+        cursor = self.get(limit=3).json()['next_cursor']
+        for bad in [
+            'not-a-cursor', '!!!', cursor[:-4], cursor + 'AAAA',
+            encode({'date': '2025-01-02'}), encode(['2025-01-02', '2025-01-02T00:00:00']),
+            encode(['2025-13-40', '2025-01-02T00:00:00', 1]), encode(['2025-01-02', 'noon', 1]),
+            encode(['2025-01-02', '2025-01-02T00:00:00', 'x']), encode(['2025-01-02', '2025-01-02T00:00:00', 10 ** 30]),
+            encode([20250102, '2025-01-02T00:00:00', 1]), encode(None),
+        ]:
+            with self.subTest(cursor=bad):
+                response = self.get(cursor=bad)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+class DailyLogTotalsTests(TestCase):
+    """DailyLog.total_* follows its meals through every kind of change, and the reconcile command repairs drift"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+
+    def setUp(self):
+        self.log = DailyLog.objects.create(user=self.user, date=date(2025, 1, 1))
+
+    def meal(self, calories, protein=10, carbs=20, fats=5):
+        return MealEntry.objects.create(user=self.user, name='Meal', calories=calories, protein=protein,
+                                        carbs=carbs, fats=fats, date=self.log.date)
+
+    def assertTotals(self, calories, protein, carbs, fats, log=None):
+        log = log or self.log
+        log.refresh_from_db()
+        self.assertEqual((log.total_calories, log.total_protein, log.total_carbs, log.total_fats),
+                         (calories, protein, carbs, fats))
+
+    def test_add_meals(self):
+        self.log.meals.add(self.meal(400), self.meal(600, 30, 40, 10))
+        self.assertTotals(1000, 40, 60, 15)
+        # From the meal's side, and adding an already linked meal changes nothing
+        breakfast = self.meal(300)
+        breakfast.daily_logs.add(self.log)
+        self.log.meals.add(breakfast)
+        self.assertTotals(1300, 50, 80, 20)
+
+    def test_edit_meal(self):
+        meal = self.meal(400)
+        self.log.meals.add(meal)
+        meal.calories, meal.fats = 550, 12
+        meal.save()
+        self.assertTotals(550, 10, 20, 12)
+
+    def test_delete_meal(self):
+        keep, drop = self.meal(400), self.meal(600)
+        self.log.meals.add(keep, drop)
+        drop.delete()
+        self.assertTotals(400, 10, 20, 5)
+
+    def test_remove_and_clear_meals(self):
+        meals = [self.meal(100), self.meal(200), self.meal(300)]
+        self.log.meals.add(*meals)
+        self.log.meals.remove(meals[0])
+        self.assertTotals(500, 20, 40, 10)
+        meals[1].daily_logs.remove(self.log)
+        self.assertTotals(300, 10, 20, 5)
+        self.log.meals.add(meals[0])
+        self.log.meals.clear()
+        self.assertTotals(0, 0, 0, 0)
+
+    def test_meal_in_two_logs(self):
+        other = DailyLog.objects.create(user=self.user, date=date(2025, 1, 2))
+        meal = self.meal(400)
+        meal.daily_logs.add(self.log, other)
+        meal.calories = 500
+        meal.save()
+        self.assertTotals(500, 10, 20, 5)
+        self.assertTotals(500, 10, 20, 5, log=other)
+        meal.daily_logs.clear()
+        self.assertTotals(0, 0, 0, 0)
+        self.assertTotals(0, 0, 0, 0, log=other)
+
+    def test_reconcile_fixes_drift(self):
+        self.log.meals.add(self.meal(400), self.meal(600))
+        in_sync = DailyLog.objects.create(user=self.user, date=date(2025, 1, 2))
+        in_sync.meals.add(self.meal(250))
+        # A bulk write that bypasses the signals
+        DailyLog.objects.filter(pk=self.log.pk).update(total_calories=7, total_fats=0)
+
+        out = StringIO()
+        call_command('reconcile_daily_log_totals', '--dry-run', stdout=out)
+        self.assertIn('calories 7 -> 1000', out.getvalue())
+        self.assertTotals(7, 20, 40, 0)
+
+        out = StringIO()
+        call_command('reconcile_daily_log_totals', stdout=out)
+        self.assertIn('Reconciled 1 daily logs', out.getvalue())
+        self.assertTotals(1000, 20, 40, 10)
+        self.assertTotals(250, 10, 20, 5, log=in_sync)
+
+        out = StringIO()
+        call_command('reconcile_daily_log_totals', stdout=out)
+        self.assertIn('All daily log totals match their meals', out.getvalue())
+
+
+class CatalogVersionTests(TestCase):
+    """The exercises page follows the catalog version in the database, whichever process changed it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        cls.barbell = Equipment.objects.create(name='Barbell')
+        cls.bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        Exercise.objects.create(name='Barbell Bench Press', base_exercise=cls.bench, equipment=cls.barbell)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_unchanged_catalog_is_not_modified(self):
+        response = self.client.get('/exercises/')
+        self.assertEqual(response.status_code, 200)
+        again = self.client.get('/exercises/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+    def test_change_through_signals_bumps_the_version(self):
+        before = self.client.get('/exercises/')
+        Exercise.objects.create(name='Paused Bench Press', base_exercise=self.bench, equipment=self.barbell)
+        after = self.client.get('/exercises/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertContains(after, 'Paused Bench Press')
+
+    def test_version_bumped_elsewhere_replaces_this_process_snapshot(self):
+        # Another worker's change: no signals run here, only the shared version row moves
+        before = self.client.get('/exercises/')
+        Exercise.objects.bulk_create([
+            Exercise(name='Paused Bench Press', base_exercise=self.bench, equipment=self.barbell)
+        ])
+        CatalogVersion.objects.update(version=F('version') + 1, updated_at=timezone.now())
+
+        after = self.client.get('/exercises/', HTTP_IF_NONE_MATCH=before['ETag'])
+        self.assertEqual(after.status_code, 200)
+        self.assertContains(after, 'Paused Bench Press')
+        self.assertEqual(get_catalog().version, catalog_version().version)
+
+    def test_exercise_index_follows_the_shared_version(self):
+        invalidate_exercise_index()
+        index = get_exercise_index()
+        Exercise.objects.bulk_create([
+            Exercise(name='Paused Bench Press', base_exercise=self.bench, equipment=self.barbell)
+        ])
+        CatalogVersion.objects.update(version=F('version') + 1, updated_at=timezone.now())
+
+        # Between version checks the index is served without queries, however stale
+        with self.assertNumQueries(0):
+            self.assertIs(get_exercise_index(), index)
+            self.assertIsNone(get_exercise_index().exact('paused bench press'))
+
+        later = time.monotonic() + settings.EXERCISE_INDEX_RECHECK_SECONDS
+        with mock.patch('logger.exercise_index.time.monotonic', return_value=later):
+            self.assertEqual(get_exercise_index().exact('paused bench press').name, 'Paused Bench Press')
+            with self.assertNumQueries(0):
+                get_exercise_index()
+
+    def test_exercise_index_is_rebuilt_for_other_aliases(self):
+        invalidate_exercise_index()
+        self.assertIsNone(get_exercise_index().exact('bench'))
+        self.assertEqual(get_exercise_index({'bench': 'barbell bench press'}).exact('bench').name, 'Barbell Bench Press')
+        self.assertIsNone(get_exercise_index().exact('bench'))
+
+    def test_rolled_back_change_keeps_the_version(self):
+        version = catalog_version().version
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Exercise.objects.create(name='Paused Bench Press', base_exercise=self.bench, equipment=self.barbell)
+            Exercise.objects.create(name='Paused Bench Press', base_exercise=self.bench, equipment=self.barbell)
+        self.assertEqual(catalog_version().version, version)
+
+
+class ExerciseProgressTests(TestCase):
+    """Progress rows kept up by the signals match what backfill_exercise_progress rebuilds"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        cls.bench = Exercise.objects.create(name='Barbell Bench Press', base_exercise=bench, equipment=barbell)
+        cls.incline = Exercise.objects.create(name='Incline Bench Press', base_exercise=bench, equipment=barbell)
+
+    def log(self, day, *sets):
+        workout = Workout.objects.create(user=self.user, name='Push', date=day)
+        for order, (exercise, count, reps, weight) in enumerate(sets):
+            WorkoutExercise.objects.create(user=self.user, name=exercise.name, workout=workout, exercise=exercise,
+                                           sets=count, reps=reps, weight=weight, order=order)
+        return workout
+
+    def progress(self):
+        return list(ExerciseProgress.objects.order_by('exercise_id', 'date').values_list(
+            'exercise_id', 'date', 'total_sets', 'total_reps', 'volume', 'best_weight', 'estimated_1rm'
+        ))
+
+    def assertMatchesBackfill(self):
+        incremental = self.progress()
+        call_command('backfill_exercise_progress', stdout=StringIO())
+        self.assertEqual(incremental, self.progress())
+        return incremental
+
+    def log_history(self):
+        day = date(2025, 1, 1)
+        self.log(day, (self.bench, 3, 5, Decimal('100')), (self.bench, 1, 1, Decimal('112.5')),
+                 (self.incline, 3, 10, Decimal('60')))
+        self.log(day, (self.bench, 2, 8, Decimal('90')), (self.incline, 2, 12, None))
+        return self.log(day + timedelta(days=2), (self.bench, 5, 5, Decimal('102.5')))
+
+    def test_incremental_rows_match_backfill(self):
+        self.log_history()
+        rows = self.assertMatchesBackfill()
+        self.assertEqual(rows[0][:5], (self.bench.id, date(2025, 1, 1), 6, 32, Decimal('3052.50')))
+
+    def test_edits_and_deletes_match_backfill(self):
+        last = self.log_history()
+        row = WorkoutExercise.objects.filter(exercise=self.bench, weight=Decimal('90')).get()
+        row.reps, row.weight = 6, Decimal('95')
+        row.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            WorkoutExercise.objects.filter(exercise=self.incline, weight=None).delete()
+        last.date = date(2025, 1, 5)
+        last.save()
+        self.assertMatchesBackfill()
+
+    def test_deleting_a_days_only_workout_empties_the_day(self):
+        last = self.log_history()
+        with self.captureOnCommitCallbacks(execute=True):
+            last.delete()
+        self.assertFalse(ExerciseProgress.objects.filter(date=date(2025, 1, 3)).exists())
+        self.assertMatchesBackfill()
+
+    def test_deleting_a_workout_costs_the_same_however_many_exercises(self):
+        def delete_queries(count):
+            workout = self.log(date(2025, 2, 1), *[(self.bench, 3, 5, Decimal('100'))] * count)
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                workout.delete()
+            return len(queries)
+
+        self.assertEqual(delete_queries(1), delete_queries(8))
+        self.assertFalse(ExerciseProgress.objects.exists())
+
+    @override_settings(PROGRESS_1RM_FORMULA='brzycki')
+    def test_brzycki_has_no_estimate_past_36_reps(self):
+        self.assertIsNone(estimate_1rm(50, 37, 'brzycki'))
+        self.assertEqual(estimate_1rm(100, 1, 'brzycki'), 100)
+        self.log(date(2025, 1, 1), (self.bench, 1, 40, Decimal('20')))
+        self.log(date(2025, 1, 2), (self.bench, 1, 40, Decimal('20')), (self.bench, 1, 10, Decimal('60')))
+        rows = self.assertMatchesBackfill()
+        self.assertEqual([row[6] for row in rows], [None, Decimal('80.00')])
+
+
+class PersonalRecordTests(TestCase):
+    """PRs reported by the agent endpoint: one per beaten mark, none for a first log or a repeated request"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+
+    def post(self, data):
+        return self.client.post('/api/create-wrkout-from-agent/', data, content_type='application/json')
+
+    def workout(self, *sets, key=None, day='2025-03-01'):
+        data = {'user_id': self.user.id, 'workout_name': 'Push', 'workout_date': day,
+                'exercises': [{'name': 'Bench Press', 'sets': str(count), 'reps': str(reps), 'weight': weight}
+                              for count, reps, weight in sets]}
+        return {**data, 'idempotency_key': key} if key else data
+
+    def records(self, *sets, **kwargs):
+        response = self.post(self.workout(*sets, **kwargs))
+        self.assertIn(response.status_code, (200, 201))
+        return {record['kind']: record for record in response.json()['personal_records']}
+
+    def test_first_time_exercise_sets_no_record(self):
+        self.assertEqual(self.records((3, 5, '100')), {})
+        self.assertFalse(PersonalRecord.objects.exists())
+
+    def test_weight_record(self):
+        self.records((3, 5, '100'))
+        records = self.records((1, 2, '110'), day='2025-03-03')
+        self.assertEqual((records['weight']['value'], records['weight']['previous']), ('110.00', '100.00'))
+        self.assertNotIn('volume', records)
+
+    def test_reps_at_weight_record(self):
+        self.records((3, 5, '100'), (1, 3, '120'))
+        records = self.records((1, 8, '100'), day='2025-03-03')
+        self.assertEqual(set(records), {'reps'})  # 100 x 8 doesn't beat 120 x 3's estimated 1RM
+        self.assertEqual((records['reps']['value'], records['reps']['previous'], records['reps']['weight']),
+                         ('8', '5', '100.00'))
+
+    def test_volume_record(self):
+        self.records((3, 5, '100'))
+        records = self.records((5, 5, '100'), day='2025-03-03')
+        self.assertEqual(set(records), {'volume'})
+        self.assertEqual((records['volume']['value'], records['volume']['previous']), ('2500.00', '1500.00'))
+
+    def test_retried_request_reports_no_second_record(self):
+        self.records((3, 5, '100'))
+        first = self.records((3, 5, '110'), key='callback-1', day='2025-03-03')
+        retry = self.records((3, 5, '110'), key='callback-1', day='2025-03-03')
+        self.assertIn('weight', first)
+        self.assertEqual(retry, {})
+        self.assertEqual(PersonalRecord.objects.filter(kind='weight').count(), 1)
+
+    def test_duplicate_in_batch_reports_records_once(self):
+        self.records((3, 5, '100'))
+        response = self.post([self.workout((3, 5, '110'), key='callback-1', day='2025-03-03')] * 2)
+        first, duplicate = response.json()['results']
+        self.assertEqual(duplicate['status'], 'duplicate')
+        self.assertTrue(first['personal_records'])
+        self.assertEqual(duplicate['personal_records'], [])
+
+    def best(self):
+        return PersonalBest.objects.get(user=self.user)
+
+    def test_deleting_the_best_workout_lowers_the_bests(self):
+        self.records((3, 5, '100'))
+        self.records((3, 5, '110'), day='2025-03-03')
+        with self.captureOnCommitCallbacks(execute=True):
+            Workout.objects.get(date='2025-03-03').delete()
+        best = self.best()
+        self.assertEqual((best.weight, best.volume, best.reps_at_weight), (Decimal('100'), Decimal('1500'), {'100.00': 5}))
+
+        records = self.records((3, 5, '105'), day='2025-03-05')
+        self.assertEqual((records['weight']['value'], records['weight']['previous']), ('105.00', '100.00'))
+
+    def test_editing_a_set_lowers_the_bests(self):
+        self.records((3, 5, '100'))
+        self.records((3, 5, '110'), day='2025-03-03')
+        item = WorkoutExercise.objects.get(workout__date='2025-03-03')
+        item.weight = Decimal('90')
+        item.save()
+        self.assertEqual((self.best().weight, self.best().estimated_1rm), (Decimal('100'), to_cents(estimate_1rm(100.0, 5))))
+
+    def test_deleting_every_workout_drops_the_bests(self):
+        self.records((3, 5, '100'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Workout.objects.filter(user=self.user).delete()
+        self.assertFalse(PersonalBest.objects.exists())
+
+
+class AgentJobQueueTests(TestCase):
+    """Claiming, retrying, dead-lettering and requeueing n8n agent jobs (logger/agent_jobs.py)"""
+
+    class Response:
+        def __init__(self, status_code, text='ok'):
+            self.status_code = status_code
+            self.text = text
+
+    def respond(self, *outcomes):
+        """Patch the HTTP client to answer each post with the next status code, or raise it if it's an exception"""
+        outcomes = iter(outcomes)
+
+        def post(url, **kwargs):
+            outcome = next(outcomes)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return self.Response(outcome)
+
+        return mock.patch('logger.agent_jobs.get_http_client', return_value=mock.Mock(post=post))
+
+    def job(self, **fields):
+        job = enqueue_agent_job({'input': 'bench 3x5 at 100'})
+        if fields:
+            AgentJob.objects.filter(pk=job.pk).update(**fields)
+            job.refresh_from_db()
+        return job
+
+    def test_claims_the_oldest_due_job(self):
+        now = timezone.now()
+        later = self.job(run_after=now + timedelta(minutes=5))
+        newer = self.job(run_after=now - timedelta(minutes=1))
+        older = self.job(run_after=now - timedelta(minutes=2))
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.id, older.id)
+        self.assertEqual((claimed.status, claimed.attempts), (AgentJob.RUNNING, 1))
+        self.assertEqual(claim_next_job().id, newer.id)
+        self.assertIsNone(claim_next_job())
+        self.assertEqual(AgentJob.objects.get(pk=later.pk).status, AgentJob.QUEUED)
+
+    @override_settings(AGENT_JOB_BACKOFF_BASE=2, AGENT_JOB_BACKOFF_MAX=300)
+    def test_backoff_doubles_up_to_the_cap(self):
+        for attempts, delay in [(1, 2), (2, 4), (3, 8), (9, 300), (20, 300)]:
+            with self.subTest(attempts=attempts):
+                self.assertGreaterEqual(backoff_delay(attempts), delay)
+                self.assertLessEqual(backoff_delay(attempts), delay * 1.1)
+
+    def test_retryable_failure_is_requeued_with_backoff(self):
+        job = self.job()
+        with self.respond(503):
+            before = timezone.now()
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AgentJob.QUEUED, 1))
+        self.assertIn('503', job.last_error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=2))
+
+    def test_success_after_a_retry(self):
+        job = self.job()
+        with self.respond(requests.exceptions.ConnectTimeout(), 200):
+            run_job(claim_next_job())
+            AgentJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (AgentJob.SUCCEEDED, 2, ''))
+
+    def test_client_error_is_dead_lettered_straight_away(self):
+        job = self.job()
+        with self.respond(400):
+            run_job(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AgentJob.DEAD, 1))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_dead_lettered_after_the_last_attempt(self):
+        job = self.job(max_attempts=2)
+        with self.respond(500, 500):
+            for _ in range(2):
+                run_job(claim_next_job())
+                AgentJob.objects.filter(pk=job.pk, status=AgentJob.QUEUED).update(run_after=timezone.now())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AgentJob.DEAD, 2))
+        self.assertIsNone(claim_next_job())
+
+    def test_crashing_job_counts_as_a_failed_attempt(self):
+        job = self.job(max_attempts=2)
+        with self.respond(TypeError('Object of type Decimal is not JSON serializable')):
+            self.assertEqual(work(poll_interval=0, max_jobs=1), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AgentJob.QUEUED, 1))
+        self.assertIn('not JSON serializable', job.last_error)
+
+    @override_settings(AGENT_JOB_STALE_AFTER=60)
+    def test_stale_running_jobs_are_requeued_until_out_of_attempts(self):
+        long_ago = timezone.now() - timedelta(minutes=5)
+        retry = self.job(status=AgentJob.RUNNING, attempts=1, max_attempts=3, updated_at=long_ago)
+        poison = self.job(status=AgentJob.RUNNING, attempts=3, max_attempts=3, updated_at=long_ago)
+        busy = self.job(status=AgentJob.RUNNING, attempts=3, max_attempts=3)
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        statuses = dict(AgentJob.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[retry.id], AgentJob.QUEUED)
+        self.assertEqual(statuses[poison.id], AgentJob.DEAD)
+        self.assertEqual(statuses[busy.id], AgentJob.RUNNING)
+
+    def test_job_out_of_attempts_is_dead_lettered_instead_of_claimed(self):
+        exhausted = self.job(attempts=5, max_attempts=5, run_after=timezone.now() - timedelta(minutes=1))
+        fresh = self.job()
+        self.assertEqual(claim_next_job().id, fresh.id)
+        self.assertEqual(AgentJob.objects.get(pk=exhausted.pk).status, AgentJob.DEAD)
+
+    def test_requeue_dead_jobs_resets_attempts(self):
+        dead = self.job(status=AgentJob.DEAD, attempts=5, finished_at=timezone.now())
+        self.job(status=AgentJob.SUCCEEDED, attempts=1)
+        self.assertEqual(requeue_dead_jobs(), 1)
+        dead.refresh_from_db()
+        self.assertEqual((dead.status, dead.attempts, dead.finished_at), (AgentJob.QUEUED, 0, None))
+        self.assertEqual(claim_next_job().id, dead.id)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """Breaker state changes and per-host limits in the outbound HTTP client (logger/http_client.py)"""
+
+    class Response:
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    def breaker(self):
+        return CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = self.breaker()
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+    def test_half_open_lets_one_trial_through(self):
+        breaker = self.breaker()
+        with mock.patch('logger.http_client.time.monotonic', return_value=1000):
+            breaker.record_failure()
+            breaker.record_failure()
+        with mock.patch('logger.http_client.time.monotonic', return_value=1030):
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertFalse(breaker.allow())  # the trial is still in flight
+
+            breaker.record_failure()
+            self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+            self.assertFalse(breaker.allow())
+        with mock.patch('logger.http_client.time.monotonic', return_value=1060):
+            self.assertTrue(breaker.allow())
+            breaker.record_success()
+        self.assertEqual((breaker.state, breaker.failures), (CircuitBreaker.CLOSED, 0))
+        self.assertTrue(breaker.allow())
+
+    def http_client(self, outcome, **kwargs):
+        """HTTPClient whose session answers every request with `outcome` (a status code, exception or callable)"""
+        client = HTTPClient(failure_threshold=2, reset_timeout=30, **kwargs)
+
+        def request(method, url, **kw):
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome() if callable(outcome) else self.Response(outcome)
+
+        client.session.request = request
+        return client
+
+    def test_5xx_responses_open_the_circuit(self):
+        client = self.http_client(503)
+        client.get('http://n8n.test/a')
+        client.get('http://n8n.test/a')
+        with self.assertRaises(CircuitOpenError):
+            client.get('http://n8n.test/a')
+        # Other hosts have their own breaker
+        self.assertEqual(client.breakers['n8n.test'].state, CircuitBreaker.OPEN)
+        self.assertNotIn('other.test', client.breakers)
+
+    def test_unexpected_exception_in_half_open_trial_reopens_the_circuit(self):
+        client = self.http_client(TypeError('payload is not JSON serializable'))
+        breaker = client._host('n8n.test')[1]
+        breaker.state, breaker.opened_at = CircuitBreaker.OPEN, 0.0
+        with self.assertRaises(TypeError):
+            client.post('http://n8n.test/hook', json={})
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        # Not stuck half-open: the next trial is allowed once the reset timeout has passed again
+        breaker.opened_at = 0.0
+        client.session.request = lambda method, url, **kw: self.Response(200)
+        self.assertEqual(client.post('http://n8n.test/hook', json={}).status_code, 200)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_concurrency_limit_per_host(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return self.Response(200)
+
+        client = self.http_client(slow, max_concurrency=1, acquire_timeout=0.05)
+        thread = threading.Thread(target=client.get, args=('http://n8n.test/slow',))
+        thread.start()
+        try:
+            started.wait(5)
+            with self.assertRaises(ConcurrencyLimitError):
+                client.get('http://n8n.test/fast')
+        finally:
+            release.set()
+            thread.join()
+        # The slot is free again once the first request is done
+        self.assertEqual(client.get('http://n8n.test/fast').status_code, 200)
+
+
+class WorkoutScannerTests(SimpleTestCase):
+    """Exercises, and which number is which, from free text (logger/workout_scanner.py)"""
+
+    def parse(self, text):
+        return [
+            {key: value for key, value in exercise.items() if value is not None}
+            for exercise in parse_exercises(text)
+        ]
+
+    def test_sets_reps_and_weight(self):
+        self.assertEqual(self.parse('bench press 3x10 135'),
+                         [{'name': 'bench press', 'sets': 3, 'reps': 10, 'weight': 135}])
+        self.assertEqual(self.parse('squat 5 sets of 5 at 225 lbs'),
+                         [{'name': 'squat', 'sets': 5, 'reps': 5, 'weight': 225}])
+        self.assertEqual(self.parse('20 pushups 30 situps'),
+                         [{'name': 'pushups', 'sets': 1, 'reps': 20}, {'name': 'situps', 'sets': 1, 'reps': 30}])
+
+    def test_decimal_durations(self):
+        self.assertEqual(self.parse('1.5 hours of cycling'), [{'name': 'cycling', 'sets': 1, 'duration': 90}])
+        self.assertEqual(self.parse('rowing 12.5 minutes'), [{'name': 'rowing', 'sets': 1, 'duration': 12.5}])
+        self.assertEqual(self.parse('ran for 30 mins'), [{'name': 'ran', 'sets': 1, 'duration': 30}])
+
+    def test_non_integer_count_is_never_reps(self):
+        self.assertEqual(self.parse('bench press 135 lbs 2.5'), [{'name': 'bench press', 'sets': 1, 'weight': 135}])
+        self.assertEqual(self.parse('curls 12.5'), [{'name': 'curls', 'sets': 1, 'weight': 12.5}])
+
+    def test_large_number_after_sets_is_a_weight(self):
+        self.assertEqual(self.parse('bench 3 sets 185'), [{'name': 'bench', 'sets': 3, 'weight': 185}])
+        self.assertEqual(self.parse('bench 3x185'), [{'name': 'bench', 'sets': 3, 'weight': 185}])
+        # Unless it is spelled out as reps
+        self.assertEqual(self.parse('3 sets of 200 reps jumping jacks'),
+                         [{'name': 'jumping jacks', 'sets': 3, 'reps': 200}])
+
+    def test_reps_are_always_whole_numbers(self):
+        for text in ['1.5 hours of cycling', 'bench press 135 lbs 2.5', 'bench 3 sets 185', 'curls 12.5',
+                     'deadlift 2.5 plates 3 reps', 'leg press 4x12 at 202.5']:
+            with self.subTest(text=text):
+                for exercise in parse_exercises(text):
+                    self.assertIn(type(exercise['reps']), (int, type(None)))
+
+
+class AIWorkoutSerializerTests(TestCase):
+    """Agent workouts: numbers validated up front, exercises resolved in a fixed number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        for i in range(20):
+            base = BaseExercise.objects.create(name=f'Press {i}', primary_muscle_group=chest)
+            Exercise.objects.create(name=f'Barbell Press {i}', base_exercise=base, equipment=barbell)
+
+    def item(self, *exercises):
+        return {'user_id': self.user.id, 'workout_name': 'Push', 'workout_date': '2025-03-01',
+                'exercises': list(exercises)}
+
+    def exercise(self, name, **fields):
+        return {'name': name, 'sets': '3', 'reps': '8', 'weight': '100', **fields}
+
+    def create_queries(self, names):
+        serializer = AIWorkoutCreateSerializer(data=self.item(*[self.exercise(name) for name in names]))
+        serializer.is_valid(raise_exception=True)
+        with CaptureQueriesContext(connection) as queries:
+            serializer.create_many([serializer.validated_data])
+        return len(queries)
+
+    def test_numbers_are_converted(self):
+        serializer = AIWorkoutCreateSerializer(data=self.item(
+            self.exercise('Barbell Press 0', weight='102.5', rest_seconds='90'),
+            {'name': 'Barbell Press 1'},
+        ))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        first, second = serializer.validated_data['exercises']
+        self.assertEqual((first['sets'], first['reps'], first['weight'], first['rest_seconds']),
+                         (3, 8, Decimal('102.50'), 90))
+        self.assertEqual((second['sets'], second['reps'], second['weight']), (3, 10, None))
+
+    def test_bad_numbers_are_a_400(self):
+        for fields in [{'weight': 'heavy'}, {'weight': 'NaN'}, {'weight': '-5'}, {'weight': '1e9'},
+                       {'sets': '3x'}, {'reps': '2.5'}, {'reps': '-1'}, {'rest_seconds': 'long'}]:
+            with self.subTest(**fields):
+                response = self.client.post('/api/create-wrkout-from-agent/',
+                                            self.item(self.exercise('Barbell Press 0', **fields)),
+                                            content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('exercises', response.json()['details'])
+        self.assertFalse(Workout.objects.exists())
+
+    # Each measurement logs exercises for the first time, so both start without personal bests
+
+    def test_query_count_is_fixed_for_existing_exercises(self):
+        few = self.create_queries([f'Barbell Press {i}' for i in range(2)])
+        many = self.create_queries([f'Barbell Press {i}' for i in range(2, 20)])
+        self.assertEqual(few, many)
+
+    def test_query_count_is_fixed_for_new_exercises(self):
+        few = self.create_queries(['Barbell Press 0', 'New Lift A', 'New Lift B'])
+        many = self.create_queries([f'Barbell Press {i}' for i in range(10, 20)] + [f'Other Lift {i}' for i in range(10)])
+        self.assertEqual(few, many)
+        self.assertEqual(Exercise.objects.filter(name__startswith='Other Lift').count(), 10)
+
+    def test_agent_workouts_are_added_to_the_daily_log(self):
+        response = self.client.post('/api/create-wrkout-from-agent/', [
+            self.item(self.exercise('Barbell Press 0')), self.item(self.exercise('Barbell Press 1')),
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        log = DailyLog.objects.get(user=self.user, date=date(2025, 3, 1))
+        self.assertEqual(log.workouts.count(), 2)
+
+
+class ExerciseIndexTests(SimpleTestCase):
+    """In-memory catalog lookups, built from unsaved instances"""
+
+    def build_index(self, names, bases=('Press',), aliases=None):
+        base_exercises = [BaseExercise(id=i, name=name) for i, name in enumerate(bases, start=1)]
+        exercises = [Exercise(id=i, name=name, base_exercise_id=1) for i, name in enumerate(names, start=1)]
+        return ExerciseIndex(exercises, base_exercises, aliases)
+
+    def test_lookup_follows_the_old_query_chain(self):
+        index = self.build_index(['Incline Bench Press', 'Bench Press Machine', 'Cable Fly'])
+        self.assertEqual(index.lookup('cable fly'), (index.exercises[2], 'exact'))
+        # Lowest id containing the name, as name__icontains(...).first() did; not the prefix match
+        self.assertEqual(index.lookup('bench press'), (index.exercises[0], 'substring'))
+        self.assertEqual(index.lookup('squat'), (None, None))
+
+    def test_similar_ranks_best_first(self):
+        index = self.build_index(['Barbell Bench Press', 'Incline Bench Press', 'Cable Fly', 'Dumbbell Bench Press'])
+        ranked = index.similar('incline bench pres', limit=5)
+        self.assertEqual([exercise.name for exercise, _ in ranked],
+                         ['Incline Bench Press', 'Barbell Bench Press', 'Dumbbell Bench Press'])  # Cable Fly < min_score
+        scores = [score for _, score in ranked]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(len(index.similar('incline bench pres', limit=1)), 1)
+        self.assertEqual(index.similar('zzz'), [])
+
+    def test_similar_breaks_ties_by_id_and_lists_an_exercise_once(self):
+        # Same trigrams either way round; the alias points at the first one
+        index = self.build_index(['Press Bench', 'Bench Press'], aliases={'bench press': 'press bench'})
+        (first, first_score), (second, second_score) = index.similar('bench press')
+        self.assertEqual((first.id, second.id), (1, 2))
+        self.assertEqual(first_score, second_score)
+
+    def test_match_confidence(self):
+        index = self.build_index(['Barbell Bench Press', 'Incline Bench Press', 'Cable Fly'])
+        with mock.patch('logger.nlp_engine.get_exercise_index', return_value=index):
+            matches = NLPEngine()._resolve_exercise_names(['barbell bench press', 'incline bench pres', 'bench',
+                                                           'cable flyes', 'zzz'])
+        summary = {name: (getattr(match['db_match'], 'name', None), match['match_type'], match['match_confidence'])
+                   for name, match in matches.items()}
+        self.assertEqual(summary, {
+            'barbell bench press': ('Barbell Bench Press', 'exact', 1.0),
+            # Looser lookups score by how alike the names are, never under 0.5
+            'incline bench pres': ('Incline Bench Press', 'substring', 0.857),
+            'bench': ('Barbell Bench Press', 'substring', 0.5),
+            # No lookup match, but the top suggestion clears similar_match_threshold
+            'cable flyes': ('Cable Fly', 'similar', 0.692),
+            'zzz': (None, None, 0.0),
+        })
+
+
+class ProcessWorkoutInputsTests(TestCase):
+    """Batch NLP endpoint: order, duplicates, the parse cache and the batch size limit"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        Exercise.objects.create(name='Barbell Bench Press', base_exercise=bench, equipment=barbell)
+
+    def setUp(self):
+        invalidate_exercise_index()
+        parse_cache.clear()
+        match_cache.clear()
+
+    def post(self, texts):
+        return self.client.post('/api/process-workout-inputs/', {'texts': texts, 'user_id': self.user.id},
+                                content_type='application/json')
+
+    def test_results_in_input_order(self):
+        response = self.post(['bench press 3x5 185', 'what should I eat today', 'bench press 3x5 185'])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        first, other, again = data['results']
+        self.assertEqual(first, again)
+        self.assertFalse(other['success'])
+        self.assertEqual(first['exercises'][0]['db_match']['name'], 'Barbell Bench Press')
+        self.assertEqual((first['exercises'][0]['sets'], first['exercises'][0]['reps']), (3, 5))
+
+    def test_parsed_exercises_are_not_the_matched_ones(self):
+        result, = NLPEngine().process_workout_inputs(['bench press 3x5 185'], self.user)
+        self.assertIn('db_match', result['exercises'][0])
+        self.assertNotIn('db_match', result['parsed_exercises'][0])
+
+    @override_settings(NLP_MAX_BATCH_SIZE=2)
+    def test_batch_size_limit(self):
+        response = self.post(['bench 3x5', 'squat 3x5', 'row 3x5'])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post(['bench 3x5', 'squat 3x5']).status_code, 200)
+
+    @override_settings(NLP_INTENT_CLASSIFIER=True)
+    def test_intent_model_only_runs_on_cache_misses(self):
+        engine = NLPEngine()
+        workout = {'label': 'create_workout', 'score': 0.99}
+        with mock.patch.object(engine, '_classify_intents', side_effect=lambda texts: [workout] * len(texts)) as classify:
+            engine.process_workout_inputs(['bench press 3x5 185', 'squat 5x5 225'], self.user)
+            engine.process_workout_inputs(['Bench press 3x5 185', 'deadlift 1x5 315', 'squat 5x5 225'], self.user)
+        self.assertEqual([call.args[0] for call in classify.call_args_list],
+                         [['bench press 3x5 185', 'squat 5x5 225'], ['deadlift 1x5 315']])
+
+
+class NLPCacheTests(TestCase):
+    """Parse and match caches: hits, eviction, engine settings and catalog changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        cls.barbell = Equipment.objects.create(name='Barbell')
+        cls.squat = BaseExercise.objects.create(name='Squat', primary_muscle_group=chest)
+        Exercise.objects.create(name='Barbell Back Squat', base_exercise=cls.squat, equipment=cls.barbell)
+
+    def setUp(self):
+        invalidate_exercise_index()
+        parse_cache.clear()
+        match_cache.clear()
+
+    def test_repeated_message_hits_the_parse_cache(self):
+        engine = NLPEngine()
+        before = parse_cache.stats()
+        first = engine.process_workout_input('Zercher squat 3x5 135', self.user)
+        again = engine.process_workout_input('  zercher   SQUAT 3x5 135', self.user)
+        after = parse_cache.stats()
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 1))
+        self.assertEqual(first['parsed_exercises'], again['parsed_exercises'])
+
+    def test_lru_eviction(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)  # 'b' is now the least recently used
+        lru.set('c', 3)
+        self.assertIs(lru.get('b'), MISSING)
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+        self.assertEqual(lru.stats()['evictions'], 1)
+
+    def test_intent_settings_are_part_of_the_key(self):
+        NLPEngine().process_workout_input('squat 5x5 225', self.user)
+        with override_settings(NLP_INTENT_CLASSIFIER=True):
+            engine = NLPEngine()
+            meal = {'label': 'create_meal', 'score': 0.99}
+            with mock.patch.object(engine, '_classify_intents', return_value=[meal]) as classify:
+                result = engine.process_workout_input('squat 5x5 225', self.user)
+        classify.assert_called_once()
+        self.assertFalse(result['success'])
+        self.assertTrue(NLPEngine().process_workout_input('squat 5x5 225', self.user)['success'])
+
+    def test_catalog_change_drops_cached_matches(self):
+        engine = NLPEngine()
+        result = engine.process_workout_input('zercher squat 3x5 135', self.user)
+        self.assertNotEqual(getattr(result['exercises'][0]['db_match'], 'name', None), 'Zercher Squat')
+
+        Exercise.objects.create(name='Zercher Squat', base_exercise=self.squat, equipment=self.barbell)
+        self.assertEqual(len(match_cache), 0)
+        result = engine.process_workout_input('zercher squat 3x5 135', self.user)
+        self.assertEqual(result['exercises'][0]['db_match'].name, 'Zercher Squat')
+        self.assertEqual(result['exercises'][0]['match_type'], 'exact')
+
+
+class CreateWorkoutFromNLPTests(TestCase):
+    """Saving a parsed message: rows in order, today's daily log, and nothing on failure"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        legs = MuscleGroup.objects.create(name='Legs')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        squat = BaseExercise.objects.create(name='Squat', primary_muscle_group=legs)
+        cls.bench = Exercise.objects.create(name='Barbell Bench Press', base_exercise=bench, equipment=barbell)
+        cls.squat = Exercise.objects.create(name='Barbell Back Squat', base_exercise=squat, equipment=barbell)
+
+    def setUp(self):
+        invalidate_exercise_index()
+        parse_cache.clear()
+        match_cache.clear()
+        self.engine = NLPEngine()
+
+    def result(self, text):
+        result = self.engine.process_workout_input(text, self.user)
+        self.assertTrue(result['success'])
+        return result
+
+    def test_saves_matched_rows_in_order_and_links_the_daily_log(self):
+        result = self.result('squat 5x5 225, bench press 3x8 185, zercher carry 2x1')
+        created = self.engine.create_workout_from_nlp(result, self.user)
+
+        self.assertTrue(created['success'])
+        workout = created['workout']
+        rows = list(workout.workoutexercise_set.order_by('order').values_list('exercise_id', 'sets', 'reps', 'weight', 'order'))
+        self.assertEqual(rows, [(self.squat.id, 5, 5, Decimal('225'), 0), (self.bench.id, 3, 8, Decimal('185'), 1)])
+        daily_log = DailyLog.objects.get(user=self.user, date=date.today())
+        self.assertEqual(list(daily_log.workouts.all()), [workout])
+
+    def test_query_count_does_not_grow_with_exercises(self):
+        few = self.result('squat 5x5 225')
+        many = self.result('squat 5x5 225, bench press 3x8 185, squat 3x3 245, bench press 1x5 205')
+        # The daily log and both personal bests exist for both measurements from here on
+        self.engine.create_workout_from_nlp(many, self.user)
+        with CaptureQueriesContext(connection) as one:
+            self.engine.create_workout_from_nlp(few, self.user)
+        with CaptureQueriesContext(connection) as four:
+            self.engine.create_workout_from_nlp(many, self.user)
+        self.assertEqual(len(one), len(four))
+
+    def test_unsuccessful_parse_saves_nothing(self):
+        created = self.engine.create_workout_from_nlp({'success': False}, self.user)
+        self.assertEqual(created, {'success': False, 'message': 'Invalid NLP result'})
+        self.assertFalse(Workout.objects.exists())
+
+    def test_error_rolls_back_the_workout(self):
+        result = self.result('squat 5x5 225')
+        with mock.patch('logger.nlp_engine.add_workouts_to_daily_log', side_effect=IntegrityError('boom')):
+            created = self.engine.create_workout_from_nlp(result, self.user)
+        self.assertFalse(created['success'])
+        self.assertIn('boom', created['message'])
+        self.assertFalse(Workout.objects.exists())
+        self.assertFalse(WorkoutExercise.objects.exists())
+        self.assertFalse(DailyLog.objects.exists())
+
+
+@override_settings(NLP_INSTRUMENTATION=True)
+class NLPMetricsTests(TestCase):
+    """Per-stage timings and query counts, per result and aggregated per process"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter', is_staff=True)
+        legs = MuscleGroup.objects.create(name='Legs')
+        barbell = Equipment.objects.create(name='Barbell')
+        squat = BaseExercise.objects.create(name='Squat', primary_muscle_group=legs)
+        Exercise.objects.create(name='Barbell Back Squat', base_exercise=squat, equipment=barbell)
+
+    def setUp(self):
+        invalidate_exercise_index()
+        parse_cache.clear()
+        match_cache.clear()
+        stage_metrics.reset()
+
+    def test_stage_counts_queries_and_accumulates(self):
+        metrics = StageMetrics()
+        timer = StageTimer(metrics)
+        with timer.stage('match'):
+            User.objects.count()
+            User.objects.exists()
+        with timer.stage('match'):
+            pass
+        with timer.stage('name'):
+            pass
+        self.assertEqual(timer.timings['match']['queries'], 2)
+        self.assertEqual(timer.timings['name']['queries'], 0)
+        snapshot = metrics.snapshot()
+        self.assertEqual(list(snapshot), ['match', 'name'])  # pipeline order
+        self.assertEqual((snapshot['match']['count'], snapshot['match']['queries']), (2, 2))
+        self.assertEqual(snapshot['match']['queries_per_call'], 1.0)
+
+    def test_histogram_percentiles(self):
+        histogram = Histogram([1, 10, 100])
+        for value in (0.5, 0.7, 5, 50, 500):
+            histogram.observe(value)
+        summary = histogram.summary()
+        self.assertEqual((summary['count'], summary['min'], summary['max']), (5, 0.5, 500))
+        self.assertEqual((summary['p50'], summary['p90'], summary['p99']), (10, 500, 500))
+        self.assertEqual(summary['buckets'], {'1': 2, '10': 1, '100': 1, '+Inf': 1})
+
+    def test_engine_results_carry_stage_timings(self):
+        engine = NLPEngine()
+        cold = engine.process_workout_input('squat 5x5 225', self.user)
+        self.assertEqual(set(cold['timings']), {'classify', 'parse', 'match', 'name', 'confidence', 'total'})
+        self.assertGreater(cold['timings']['match']['queries'], 0)  # builds the exercise index
+        self.assertEqual(cold['timings']['parse']['queries'], 0)
+
+        warm = engine.process_workout_input('squat 3x3 245', self.user)
+        self.assertEqual(warm['timings']['match']['queries'], 0)
+        self.assertGreaterEqual(warm['timings']['total']['ms'], warm['timings']['match']['ms'])
+
+        stages = engine.stage_stats()
+        self.assertEqual(stages['total']['count'], 2)
+        self.assertEqual(stages['match']['queries'], cold['timings']['match']['queries'])
+
+    def test_batch_shares_one_classify_and_match_stage(self):
+        first, second = NLPEngine().process_workout_inputs(['squat 5x5 225', 'squat 3x3 245'], self.user)
+        self.assertIn('classify_batch', first['timings'])
+        self.assertEqual(first['timings']['match'], second['timings']['match'])
+        self.assertEqual(stage_metrics.snapshot()['match']['count'], 1)
+
+    def test_debug_endpoint(self):
+        NLPEngine().process_workout_input('squat 5x5 225', self.user)
+        self.assertEqual(self.client.get('/api/debug/nlp-stage-timings/').status_code, 404)
+        self.client.force_login(self.user)
+        data = self.client.get('/api/debug/nlp-stage-timings/').json()
+        self.assertTrue(data['instrumentation'])
+        self.assertEqual(data['stages']['total']['count'], 1)
+        self.assertEqual(self.client.delete('/api/debug/nlp-stage-timings/').status_code, 204)
+        self.assertEqual(stage_metrics.snapshot(), {})
+
+
+class CreateWorkoutViewTests(TestCase):
+    """Saving the manual create_workout session: bulk insert in the order exercises were added"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('lifter')
+        chest = MuscleGroup.objects.create(name='Chest')
+        barbell = Equipment.objects.create(name='Barbell')
+        bench = BaseExercise.objects.create(name='Bench Press', primary_muscle_group=chest)
+        cls.exercises = [
+            Exercise.objects.create(name=f'Press {i}', base_exercise=bench, equipment=barbell) for i in range(7)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def save(self, picked):
+        session = self.client.session
+        session['workout_exercises'] = {str(exercise.id): {'sets': sets, 'reps': reps} for exercise, sets, reps in picked}
+        session['workout_name'] = 'Push'
+        session.save()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/create-workout/', {'save_workout': '1'})
+        self.assertEqual(response.status_code, 302)
+        return len(queries)
+
+    def test_rows_saved_in_the_order_added(self):
+        picked = [(self.exercises[3], 5, 5), (self.exercises[0], 3, 8), (self.exercises[5], 4, 12)]
+        self.save(picked)
+        workout = Workout.objects.get(user=self.user)
+        rows = list(workout.workoutexercise_set.order_by('order').values_list('exercise_id', 'sets', 'reps', 'order'))
+        self.assertEqual(rows, [(exercise.id, sets, reps, i) for i, (exercise, sets, reps) in enumerate(picked)])
+        self.assertEqual(list(DailyLog.objects.get(user=self.user).workouts.all()), [workout])
+        self.assertNotIn('workout_exercises', self.client.session)
+
+    def test_query_count_does_not_grow_with_exercises(self):
+        # Disjoint exercises, so neither save finds existing personal bests
+        two = self.save([(exercise, 3, 8) for exercise in self.exercises[:2]])
+        five = self.save([(exercise, 3, 8) for exercise in self.exercises[2:]])
+        self.assertEqual(two, five)
+
+    def test_exercises_gone_from_the_catalog_are_skipped(self):
+        self.save([(self.exercises[0], 3, 8), (Exercise(id=999), 3, 8)])
+        self.assertEqual(list(WorkoutExercise.objects.values_list('exercise_id', flat=True)), [self.exercises[0].id])
+
+
+class KeywordMatcherTests(SimpleTestCase):
+    """The word-boundary keyword pass must accept what the old substring check accepted"""
+
+    # Workout messages the original `keyword in text` check classified as workouts
+    BASELINE_ACCEPTED = [
+        'squatted 225 for 5',
+        'squatting today',
+        'deadlifted 315 x 3',
+        'benched 185 for 8',
+        'bench press 3x8 at 185',
+        'did 4 sets of curls',
+        'curled 30s',
+        'went running for 30 minutes',
+        'lifted heavy',
+        'hit legs today',
+        'upper body day',
+        'rowed 2k',
+        'pressed 135 overhead',
+        'pushups 3x20',
+        'pulled a new deadlift pr',
+        'core workout',
+        'leg extensions 3 sets of 12',
+    ]
+
+    def setUp(self):
+        self.matcher = KeywordMatcher(NLPEngine().workout_keywords)
+
+    def test_baseline_inputs_still_match(self):
+        keywords = [keyword for words in NLPEngine().workout_keywords.values() for keyword in words]
+        for text in self.BASELINE_ACCEPTED:
+            with self.subTest(text=text):
+                self.assertTrue(any(keyword in text for keyword in keywords))  # the old check
+                self.assertTrue(self.matcher.matches(text))
+
+    def test_irregular_forms(self):
+        self.assertTrue(self.matcher.matches('ran 3 miles'))
+        self.assertEqual(self.matcher.counts('ran 3 miles')['movement'], 1)
+
+    def test_keywords_inside_other_words_do_not_match(self):
+        self.assertFalse(self.matcher.matches('brunch tomorrow'))
@@ -11,6 +11,10 @@ urlpatterns = [
     
     # API endpoints for n8n integration
     path('api/trigger-workout-agent/', views.trigger_workout_agent, name='trigger_workout_agent'),
+    path('api/agent-jobs/<int:job_id>/', views.agent_job_status, name='agent_job_status'),
     path('api/create-wrkout-from-agent/', views.create_workout_from_agent, name='create_workout_from_agent'),
     path('api/recent-workouts/', views.get_recent_workouts, name='get_recent_workouts'),
+    path('api/workout-history/', views.workout_history, name='workout_history'),
+    path('api/process-workout-inputs/', views.process_workout_inputs, name='process_workout_inputs'),
+    path('api/debug/nlp-stage-timings/', views.nlp_stage_timings, name='nlp_stage_timings'),
 ]
\ No newline at end of file
@@ -2,23 +2,40 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils.dateparse import parse_date
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.urls import reverse
 from datetime import date
 import json
-import requests
 import logging
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework import status
 from django.contrib.auth.models import User
 
 from .models import (
-    MuscleGroup, Equipment, Exercise, Workout, WorkoutExercise, 
-    MealEntry, DailyLog, BaseExercise
+    Exercise, Workout, WorkoutExercise,
+    MealEntry, BaseExercise, AgentJob
 )
 from .forms import MealEntryForm
 from .serializers import WorkoutSerializer, AIWorkoutCreateSerializer
+from .nlp_engine import NLPEngine
+from .nlp_metrics import stage_metrics
+from .agent_jobs import enqueue_agent_job
+from .fast_json import FastJSONRenderer, fast_json_enabled, serialize_workouts
+from .pagination import InvalidCursor, keyset_page
+from .dashboard import load_dashboard
+from .catalog import get_catalog
+from .progress import personal_record_data, track_workout_exercises
+from .daily_log import upsert_daily_log, add_workouts_to_daily_log, add_workouts_to_daily_logs
 
 
 @login_required
@@ -26,9 +43,6 @@ def home(request):
     """Dashboard showing today's activities and meal logging"""
     today = date.today()
 
-    # Get or create today's log
-    daily_log, created = DailyLog.objects.get_or_create(user=request.user, date=today)
-
     # Handle meal form submission
     if request.method == 'POST':
         form = MealEntryForm(request.POST)
@@ -36,13 +50,10 @@ def home(request):
             meal = form.save(commit=False)
             meal.user = request.user
             meal.date = today
-            meal.save()
-
-            daily_log.meals.add(meal)
-            daily_log.total_calories += meal.calories
-            daily_log.total_carbs += meal.carbs
-            daily_log.total_fats += meal.fats
-            daily_log.total_protein += meal.protein
+            with transaction.atomic():
+                meal.save()
+                # Adds the meal's macros to the log's totals (signals.daily_log_meals_changed)
+                upsert_daily_log(request.user, today).meals.add(meal)
 
             messages.success(request, f"Meal '{meal.name}' logged successfully!")
             return redirect('home')
@@ -50,23 +61,42 @@ def home(request):
         form = MealEntryForm()
 
     # Data for dashboard
-    todays_workouts = daily_log.workouts.all()
-    todays_meals = daily_log.meals.all().order_by('-created_at')
+    dashboard = load_dashboard(request.user, today)
 
     context = {
         'form': form,
-        'todays_workouts': todays_workouts,
-        'workout_count': todays_workouts.count(),
-        'todays_meals': todays_meals,
-        'total_calories': daily_log.total_calories,
-        'total_protein': daily_log.total_protein,
-        'total_carbs': daily_log.total_carbs,
-        'total_fats': daily_log.total_fats,
+        'todays_workouts': dashboard['workouts'],
+        'workout_count': len(dashboard['workouts']),
+        'todays_meals': dashboard['meals'],
+        'personal_records': dashboard['personal_records'],
+        'total_calories': dashboard['total_calories'],
+        'total_protein': dashboard['total_protein'],
+        'total_carbs': dashboard['total_carbs'],
+        'total_fats': dashboard['total_fats'],
         'date': today,
     }
     return render(request, 'logger/home.html', context)
 
 
+def _session_exercises(exercises_in_session):
+    """
+    The exercises picked in the create_workout session, in the order they were added,
+    with their `sets` and `reps` set. One query; ids no longer in the catalog are skipped.
+    """
+    picked = [(int(ex_id), data) for ex_id, data in exercises_in_session.items() if str(ex_id).isdigit()]
+    catalog = Exercise.objects.in_bulk([ex_id for ex_id, _ in picked])
+
+    selected = []
+    for ex_id, data in picked:
+        ex = catalog.get(ex_id)
+        if ex is None:
+            continue
+        ex.sets = data.get("sets", 3)
+        ex.reps = data.get("reps", 8)
+        selected.append(ex)
+    return selected
+
+
 def create_workout(request):
     """For manually creating a workout without the help of n8n"""
     exercises_in_session = request.session.get("workout_exercises", {})
@@ -122,35 +152,36 @@ def create_workout(request):
             if exercises_in_session:
                 try:
                     name = workout_name or f"Workout on {date.today()}"
-                    workout = Workout.objects.create(
-                        user=request.user,
-                        name = name,
-                        date = date.today()
-                    )
-                    for order, (ex_id, exercise_data) in enumerate(exercises_in_session.items()):
-                        try:
-                            exercise = Exercise.objects.get(id=int(ex_id))
-                            WorkoutExercise.objects.create(
+                    with transaction.atomic():
+                        workout = Workout.objects.create(
+                            user=request.user,
+                            name = name,
+                            date = date.today()
+                        )
+                        workout_exercises = WorkoutExercise.objects.bulk_create([
+                            WorkoutExercise(
                                 workout = workout,
                                 user=request.user,
                                 exercise = exercise,
-                                sets = exercise_data["sets"],
-                                reps = exercise_data["reps"],
+                                name = exercise.name,
+                                sets = exercise.sets,
+                                reps = exercise.reps,
                                 order = order
                             )
-                        except Exercise.DoesNotExist:
-                            continue
-                    daily_log, _ = DailyLog.objects.get_or_create(
-                        user=request.user,
-                        date = date.today()
-                    )
-                    daily_log.workouts.add(workout)
-                    
+                            for order, exercise in enumerate(_session_exercises(exercises_in_session))
+                        ])
+                        personal_records = track_workout_exercises(workout_exercises)
+                        daily_log = upsert_daily_log(request.user, date.today())
+                        add_workouts_to_daily_log(daily_log, [workout])
+
                     request.session.pop("workout_exercises", None)
                     request.session.pop("workout_name", None)
                     request.session.modified = True
 
                     messages.success(request, f"Workout '{workout.name}' saved successfully!")
+                    for record in personal_records:
+                        messages.success(request, f"New PR: {record.exercise.name} {record.get_kind_display().lower()} "
+                                                  f"{record.value} (was {record.previous})")
                     return redirect('home')
                 
                 except Exception as e:
@@ -158,50 +189,27 @@ def create_workout(request):
             else:
                 messages.warning(request, "No exercises selected.")
     
-    muscle_filter = request.GET.getlist("muscle_group")
-    equipment_filter = request.GET.getlist("equipment")
-
-    exercise_qs = Exercise.objects.all()
-
-    if muscle_filter:
-        exercise_qs = exercise_qs.filter(base_exercise__primary_muscle_group_id__in=muscle_filter)
-    if equipment_filter:
-        exercise_qs = exercise_qs.filter(equipment_id__in=equipment_filter)
-
-    exercise_qs = exercise_qs.exclude(id__in = exercises_in_session)
-    
-    available_exercises = {}
-    for ex in exercise_qs.select_related("base_exercise"):
-        base_ex = ex.base_exercise
-        if base_ex not in available_exercises:
-            available_exercises[base_ex] = []
-        available_exercises[base_ex].append(ex)
+    muscle_filter = [int(m) for m in request.GET.getlist("muscle_group") if m.isdigit()]
+    equipment_filter = [int(e) for e in request.GET.getlist("equipment") if e.isdigit()]
 
+    # Filtered in memory from the cached catalog snapshot (logger/catalog.py)
+    catalog = get_catalog()
+    available_exercises = catalog.group_by_base_exercise(catalog.filter_exercises(
+        muscle_group_ids=muscle_filter,
+        equipment_ids=equipment_filter,
+        exclude_ids=[int(ex_id) for ex_id in exercises_in_session if str(ex_id).isdigit()],
+    ))
 
-
-    # Changed "selected_exercises" into a list, not a queryset or something. Keep it like this but know you need to 
-    # update the rest of the view according to the new changes
-
-    # selected_exercises = Exercise.objects.filter(id__in=exercises_in_session)
-    selected_exercises = []
-    for ex_id, data in exercises_in_session.items():
-        try:
-            ex = Exercise.objects.get(id=int(ex_id))
-            ex.sets = data.get("sets", 3)
-            ex.reps = data.get("reps", 8)
-            selected_exercises.append(ex)
-        except Exercise.DoesNotExist:
-            continue
-
+    selected_exercises = _session_exercises(exercises_in_session)
 
     context = {
         "workout_name": workout_name,
         "available_exercises": available_exercises,
         "selected_exercises": selected_exercises,
-        "muscle_groups": MuscleGroup.objects.all(),
-        "equipment": Equipment.objects.all(),
-        "selected_muscle_groups": [int(m) for m in muscle_filter],
-        "selected_equipment": [int(e) for e in equipment_filter],
+        "muscle_groups": catalog.muscle_groups,
+        "equipment": catalog.equipment,
+        "selected_muscle_groups": muscle_filter,
+        "selected_equipment": equipment_filter,
     }
     return render(request, 'logger/create_workout.html', context)
 
@@ -211,11 +219,7 @@ def delete_meal_log(request, meal_id):
     meal = get_object_or_404(MealEntry, id=meal_id, user=request.user)
 
     if request.method == "POST":
-        # Remove from daily log if it exists
-        daily_log = DailyLog.objects.filter(user=request.user, date=date.today()).first()
-        if daily_log and meal in daily_log.meals.all():
-            daily_log.meals.remove(meal)
-
+        # Unlinks the meal from its daily logs and subtracts it from their totals (signals.meal_deleted)
         meal.delete()
         messages.success(request, f"Meal '{meal.name}' deleted successfully!")
 
@@ -227,35 +231,54 @@ def ai_create_workout(request):
 
     return render(request, "logger/ai_create_workout.html")
 
+def _request_catalog(request):
+    """get_catalog() once per request, shared by the ETag and Last-Modified checks and the view"""
+    if not hasattr(request, '_catalog'):
+        request._catalog = get_catalog()
+    return request._catalog
+
+
+def _catalog_etag(request):
+    return f"catalog-{_request_catalog(request).version}"
+
+
+def _catalog_last_modified(request):
+    return _request_catalog(request).updated_at
+
+
 @login_required
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
 def exercises(request):
     """
     Display all exercises grouped by primary muscle group, then by base exercise.
+
+    The page is the same for every user, so the rendered HTML is cached per catalog version
+    and browsers revalidate with ETag/Last-Modified (304 when the catalog hasn't changed).
     """
-    exercises_by_muscle = {}
-    muscle_groups = MuscleGroup.objects.prefetch_related("primary_exercises__exercises") # fetches base_exercises related to each MG
+    catalog = _request_catalog(request)
+    key = f"exercises_page:{catalog.version}"
+    html = cache.get(key)
+    if html is None:
+        context = {
+            "exercises_by_muscle": catalog.by_muscle_group()
+        }
+        html = render_to_string("logger/exercises.html", context, request)
+        cache.set(key, html, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 24 * 60 * 60))
 
-    for muscle in muscle_groups:
-        base_exercises_dict = {}
-        for base_ex in muscle.primary_exercises.all(): # actually grabs base_exercises for MG, not primary MG
-            exercises_list = list(base_ex.exercises.all())
-            if exercises_list:
-                base_exercises_dict[base_ex] = exercises_list
-        exercises_by_muscle[muscle] = base_exercises_dict
-
-    context = {
-        "exercises_by_muscle": exercises_by_muscle
-    }
-    return render(request, "logger/exercises.html", context)
+    response = HttpResponse(html)
+    # Behind login, so only the user's browser may store it, and it must check back each time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 #  Simple API endpoints for n8n calls
 
-# n8n webhook URL
-N8N_WEBHOOK_URL = 'http://143.198.113.171:5678/webhook/workout-agent'
-
 @api_view(['POST'])
 def trigger_workout_agent(request):
+    """
+    Queue the message for the n8n workout agent and return right away with a job id.
+    `manage.py run_agent_workers` posts it to n8n; poll api/agent-jobs/<job_id>/ for the outcome.
+    """
     try:
         user_input = request.data.get('input', '')
         user_id = request.data.get('user_id', 1)
@@ -272,51 +295,155 @@ def trigger_workout_agent(request):
             'callback_url': callback_url
         }
         
-        # Test 3: Try the network request with detailed error info
-        try:
-            response = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=10)  # Shorter timeout for testing
-            
-            return Response({
-                'message': 'Network request test',
-                'n8n_status': response.status_code,
-                'n8n_response': response.text[:500],  # First 500 chars only
-                'payload_sent': payload
-            })
-            
-        except requests.exceptions.ConnectTimeout:
-            return Response({'error': 'Connection timeout to n8n'}, status=500)
-        except requests.exceptions.ConnectionError as e:
-            return Response({'error': f'Connection error to n8n: {str(e)}'}, status=500)
-        except requests.exceptions.RequestException as e:
-            return Response({'error': f'Request error: {str(e)}'}, status=500)
+        job = enqueue_agent_job(payload, user=User.objects.filter(id=user_id).first())
+        return Response({
+            'message': 'Workout agent job queued',
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': reverse('agent_job_status', args=[job.id]),
+            'payload_sent': payload
+        }, status=status.HTTP_202_ACCEPTED)
             
     except Exception as e:
         return Response({'error': f'Unexpected error: {str(e)}'}, status=500)
 
+@api_view(['GET'])
+def agent_job_status(request, job_id):
+    """
+    Poll a workout agent job queued by trigger_workout_agent
+    """
+    try:
+        job = AgentJob.objects.get(id=job_id)
+    except AgentJob.DoesNotExist:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'next_attempt_at': job.run_after if job.status == AgentJob.QUEUED else None,
+        'result': job.result,
+        'error': job.last_error or None,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    })
+
+def _save_agent_workouts(items):
+    """
+    Create the workouts in `items` (validated AIWorkoutCreateSerializer data) in one transaction,
+    skipping any whose idempotency key that user already used. Returns [(workout, created)] in input order.
+    """
+    users = AIWorkoutCreateSerializer.resolve_users(items)
+
+    def scoped_key(item):
+        # Keys are per user: two users may send the same one
+        key = item.get('idempotency_key')
+        user = users[item.get('user_id', 1)]
+        return (user.id if user else None, key) if key else None
+
+    keys = {scoped_key(item) for item in items} - {None}
+    for attempt in range(2):
+        try:
+            with transaction.atomic():
+                existing = {
+                    (workout.user_id, workout.idempotency_key): workout
+                    for workout in Workout.objects.filter(
+                        user_id__in={user_id for user_id, _ in keys}, idempotency_key__in={key for _, key in keys}
+                    )
+                    if (workout.user_id, workout.idempotency_key) in keys
+                }
+                new_items = []
+                for item in items:
+                    key = scoped_key(item)
+                    if key and key in existing:
+                        continue
+                    if key:
+                        existing[key] = None  # repeated within this batch: create it once
+                    new_items.append(item)
+                created = AIWorkoutCreateSerializer().create_many(new_items, users) if new_items else []
+                # Each on its user's log for the day, as the single-workout endpoint always did
+                add_workouts_to_daily_logs(created)
+            break
+        except IntegrityError:
+            # A concurrent retry of the same callback committed first; its workouts are visible now
+            if attempt:
+                raise
+
+    created = iter(created)
+    results = []
+    for item in items:
+        key = scoped_key(item)
+        if key and existing.get(key) is not None:
+            results.append((existing[key], False))
+        else:
+            workout = next(created)
+            if key:
+                existing[key] = workout
+            results.append((workout, True))
+    return results
+
+def _workouts_data(workouts):
+    """WorkoutSerializer output for a queryset or list of workouts, from the compiled fast path when API_FAST_JSON is on"""
+    if fast_json_enabled():
+        return serialize_workouts(workouts)
+    return WorkoutSerializer(workouts, many=True).data
+
+def _new_personal_records(workout, created):
+    """PRs set by a workout created in this request (none for duplicates, even of a workout created earlier in the batch)"""
+    if not created:
+        return []
+    return personal_record_data(workout.new_personal_records)
+
 @csrf_exempt
 @api_view(['POST'])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 def create_workout_from_agent(request):
     """
-    This endpoint receives the processed workout data back from n8n and creates the actual workout in the database
+    This endpoint receives the processed workout data back from n8n and creates the actual workout in the database.
+    Takes one workout or a list of them; a list is written in one transaction with bulk inserts.
+    A workout sent again with an `idempotency_key` (or Idempotency-Key header, for a single
+    workout) that was already used returns the existing workout instead of a duplicate.
     """
     try:
-        workout_data = request.data
-        serializer = AIWorkoutCreateSerializer(data=workout_data)
-        if serializer.is_valid():
-            workout = serializer.save()
-            daily_log, created = DailyLog.objects.get_or_create(
-                user=workout.user, 
-                date=workout.date
-            )
-            daily_log.workouts.add(workout)
-            workout_serialized = WorkoutSerializer(workout)
-            return Response({'message': 'Workout created successfully', 'workout': workout_serialized.data}, status=status.HTTP_201_CREATED)
-        else:
-            return Response({'error': 'Invalid data', 'details': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        many = isinstance(request.data, list)
+        items = request.data if many else [dict(request.data.items())]
+        header_key = request.headers.get('Idempotency-Key')
+        if header_key and not many:
+            items[0].setdefault('idempotency_key', header_key)
+
+        serializer = AIWorkoutCreateSerializer(data=items, many=True)
+        if not serializer.is_valid():
+            errors = serializer.errors if many else serializer.errors[0]
+            return Response({'error': 'Invalid data', 'details': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = _save_agent_workouts(serializer.validated_data)
+        any_created = any(created for _, created in results)
+        response_status = status.HTTP_201_CREATED if any_created else status.HTTP_200_OK
+
+        if not many:
+            workout, created = results[0]
+            message = 'Workout created successfully' if created else 'Workout already created'
+            return Response({'message': message, 'duplicate': not created, 'workout': _workouts_data([workout])[0],
+                             'personal_records': _new_personal_records(workout, created)},
+                            status=response_status)
+
+        workouts_serialized = _workouts_data([workout for workout, _ in results])
+        return Response({
+            'message': f'{sum(created for _, created in results)} workouts created',
+            'created': sum(created for _, created in results),
+            'duplicates': sum(not created for _, created in results),
+            'results': [
+                {'status': 'created' if created else 'duplicate', 'workout': data,
+                 'personal_records': _new_personal_records(workout, created)}
+                for (workout, created), data in zip(results, workouts_serialized)
+            ],
+        }, status=response_status)
     except Exception as e:
         return Response({'error': 'Failed to create workout', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 @api_view(['GET'])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
 def get_recent_workouts(request):
     """
     Helper endpoint to get recent workouts (for your chatbot to show)
@@ -325,8 +452,110 @@ def get_recent_workouts(request):
     try:
         user = User.objects.get(id=user_id)
         workouts = user.workout_set.all()[:5]  # Last 5 workouts
-        serializer = WorkoutSerializer(workouts, many=True)
-        return Response(serializer.data)
+        return Response(_workouts_data(workouts))
     except User.DoesNotExist:
         return Response({'error': 'User not found'}, 
-                      status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+                      status=status.HTTP_404_NOT_FOUND)
+
+@api_view(['GET'])
+@renderer_classes([FastJSONRenderer, BrowsableAPIRenderer])
+def workout_history(request):
+    """
+    A user's workouts newest first, one page at a time. Pass `next_cursor` from the previous
+    page as `cursor` to get the next one. Optional filters: date_from, date_to (YYYY-MM-DD)
+    and muscle_group (name of a primary muscle group worked).
+    """
+    user_id = request.GET.get('user_id', 1)
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = min(max(int(request.GET.get('limit', 20)), 1), 100)
+    except ValueError:
+        return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+
+    workouts = Workout.objects.filter(user=user)
+    for param, lookup in (('date_from', 'date__gte'), ('date_to', 'date__lte')):
+        if request.GET.get(param):
+            day = parse_date(request.GET[param])
+            if day is None:
+                return Response({'error': f'{param} must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+            workouts = workouts.filter(**{lookup: day})
+    if request.GET.get('muscle_group'):
+        workouts = workouts.filter(Exists(WorkoutExercise.objects.filter(
+            workout=OuterRef('pk'),
+            exercise__base_exercise__primary_muscle_group__name__iexact=request.GET['muscle_group']
+        )))
+
+    try:
+        page, next_cursor = keyset_page(workouts, request.GET.get('cursor'), limit)
+    except InvalidCursor as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        'results': _workouts_data(page),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    })
+
+def _exercise_ref(exercise):
+    return {'id': exercise.id, 'name': exercise.name} if exercise else None
+
+def _nlp_result_data(result):
+    """Swap the Exercise instances in an NLP result for JSON-friendly {id, name} dicts"""
+    data = {key: value for key, value in result.items() if key != 'parsed_exercises'}
+    if 'exercises' in result:
+        data['exercises'] = [
+            {
+                **exercise,
+                'db_match': _exercise_ref(exercise.get('db_match')),
+                'suggested_exercises': [_exercise_ref(ex) for ex in exercise.get('suggested_exercises', [])],
+            }
+            for exercise in result['exercises']
+        ]
+    return data
+
+@api_view(['POST'])
+def process_workout_inputs(request):
+    """
+    Batch endpoint: run the NLP engine over a list of messages (chat backfills, n8n log replays).
+    Results come back in the same order as `texts`; at most NLP_MAX_BATCH_SIZE texts per request.
+    """
+    texts = request.data.get('texts')
+    user_id = request.data.get('user_id', 1)
+    max_batch_size = getattr(settings, 'NLP_MAX_BATCH_SIZE', 500)
+
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return Response({"error": "texts must be a list of strings"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(texts) > max_batch_size:
+        return Response({"error": f"At most {max_batch_size} texts per request"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        user = User.objects.get(id=user_id)
+    except User.DoesNotExist:
+        return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    results = NLPEngine().process_workout_inputs(texts, user)
+    return Response({'count': len(results), 'results': [_nlp_result_data(result) for result in results]})
+
+@api_view(['GET', 'DELETE'])
+def nlp_stage_timings(request):
+    """
+    Debug endpoint: per-stage latency histograms and query counts aggregated by this worker
+    (needs NLP_INSTRUMENTATION on). DELETE resets them. Only served with DEBUG or to staff.
+    """
+    if not (settings.DEBUG or request.user.is_staff):
+        return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'DELETE':
+        stage_metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    return Response({
+        'instrumentation': getattr(settings, 'NLP_INSTRUMENTATION', False),
+        'stages': stage_metrics.snapshot(),
+        'caches': NLPEngine().cache_stats(),
+    })
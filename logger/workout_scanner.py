@@ -0,0 +1,245 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# One compiled pattern, scanned once. Alternatives are tried left to right at each
+# position, so the more specific numeric forms have to come before the bare number.
+TOKEN_PATTERN = re.compile(r"""
+    (?P<sets_reps>(?P<sr_sets>\d+)\s*(?:x|sets?\s*(?:of\s+)?)\s*(?P<sr_reps>\d+)(?P<sr_unit>\s*(?:reps?|times?)\b)?)
+  | (?P<duration>(?P<dur_value>\d+(?:\.\d+)?)\s*(?P<dur_unit>minutes?|mins?|hours?|hrs?)\b)
+  | (?P<weight>(?:(?:at|with|@)\s*)?(?P<w_value>\d+(?:\.\d+)?)\s*(?:lbs?|kg|pounds?)\b(?:\s*max\b)?)
+  | (?P<plates>(?P<p_value>\d+)\s*plates?\b(?:\s*max\b)?)
+  | (?P<reps>(?P<r_value>\d+)\s*(?:reps?|times?)\b(?:\s*max\b)?)
+  | (?P<sets>(?P<s_value>\d+)\s*(?:workings?\s+)?sets?\b)
+  | (?P<max_weight>(?P<mw_value>\d+(?:\.\d+)?)\s*max\b)
+  | (?P<count>\d+(?:\.\d+)?)
+  | (?P<hard_sep>[.!?\n])
+  | (?P<sep>[,:;]|\b(?:and|then|plus|followed\s+by|with|for)\b)
+  | (?P<word>[a-z][a-z0-9'\-]*)
+""", re.VERBOSE)
+
+PLATE_WEIGHT = 45
+
+# A bare number after the sets is taken as reps only up to this; "bench 3 sets 185" is a weight
+MAX_BARE_REPS = 100
+
+VERBS = {'did', 'performed', 'completed'}
+
+# Words that describe the workout as a whole rather than an exercise in it
+HEADERS = {'workout', 'workouts', 'training', 'session', 'day', 'routine'}
+
+FILLER = {
+    'i', 'a', 'an', 'the', 'some', 'of', 'my', 'me', 'to', 'in', 'on', 'at', 'also', 'just',
+    'today', 'tonight', 'yesterday', 'morning', 'evening', 'this', 'each', 'per', 'side',
+    'working', 'workings', 'set', 'sets', 'rep', 'reps', 'times', 'max', 'lb', 'lbs', 'kg',
+    'x', 'got', 'hit', 'went', 'trained', 'worked', 'out',
+}
+
+# Grip/position/setup words. A segment made only of these ("seated, single arm")
+# describes the previous exercise instead of naming a new one.
+MODIFIERS = {
+    'seated', 'standing', 'single', 'arm', 'alternating', 'incline', 'decline', 'flat',
+    'bar', 'wide', 'close', 'neutral', 'grip', 'unilateral', 'bilateral', 'lying', 'kneeling',
+}
+
+
+class Span(NamedTuple):
+    kind: str   # 'sets_reps', 'sets', 'reps', 'weight', 'duration', 'count', 'name', 'verb', 'header', 'sep', 'hard_sep'
+    value: object
+    start: int
+    end: int
+
+
+def _number(text: str):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def scan(text: str) -> List[Span]:
+    """
+    Tokenize workout text in a single pass into typed spans.
+    Adjacent exercise words are merged into one 'name' span; filler words are dropped.
+    """
+    spans = []
+    name_words = []
+    name_start = name_end = 0
+
+    def close_name():
+        if name_words:
+            spans.append(Span('name', ' '.join(name_words), name_start, name_end))
+            name_words.clear()
+
+    for match in TOKEN_PATTERN.finditer(text.lower()):
+        kind = match.lastgroup
+        start, end = match.span()
+
+        if kind == 'word':
+            word = match.group('word')
+            if word in FILLER:
+                continue
+            if word in VERBS or word in HEADERS:
+                close_name()
+                spans.append(Span('verb' if word in VERBS else 'header', word, start, end))
+                continue
+            if not name_words:
+                name_start = start
+            name_words.append(word)
+            name_end = end
+            continue
+
+        close_name()
+        if kind == 'sets_reps':
+            value = (int(match.group('sr_sets')), int(match.group('sr_reps')))
+            if value[1] > MAX_BARE_REPS and not match.group('sr_unit'):
+                # "bench 3 sets 185": the sets, then a weight
+                spans.append(Span('sets', value[0], start, match.start('sr_reps')))
+                spans.append(Span('weight', value[1], match.start('sr_reps'), end))
+                continue
+        elif kind == 'duration':
+            # In minutes ("1.5 hours" -> 90)
+            value = float(match.group('dur_value'))
+            if match.group('dur_unit').startswith('h'):
+                value *= 60
+            value = _number(str(value))
+        elif kind == 'weight':
+            value = _number(match.group('w_value'))
+        elif kind == 'plates':
+            kind, value = 'weight', int(match.group('p_value')) * PLATE_WEIGHT
+        elif kind == 'max_weight':
+            kind, value = 'weight', _number(match.group('mw_value'))
+        elif kind == 'reps':
+            value = int(match.group('r_value'))
+        elif kind == 'sets':
+            value = int(match.group('s_value'))
+        elif kind == 'count':
+            value = _number(match.group('count'))
+        else:
+            value = match.group(kind)
+        spans.append(Span(kind, value, start, end))
+
+    close_name()
+    return spans
+
+
+class _Segment:
+    """Exercise being assembled between two separators"""
+
+    def __init__(self):
+        self.name: Optional[str] = None
+        self.attrs: Dict[str, object] = {}
+        self.after_name = False
+
+    def add(self, kind: str, value) -> bool:
+        """
+        Record a numeric span. Returns False when the slot is already taken after the
+        name, meaning the number belongs to the next exercise ("20 pushups 30 situps").
+        """
+        if kind == 'count':
+            # Bare number: reps, or the weight when sets and reps are already known ("bench 3x10 135"),
+            # it isn't a whole number ("curls 12.5") or is too many reps to follow the sets
+            is_weight = (
+                ('sets' in self.attrs and ('reps' in self.attrs or value > MAX_BARE_REPS))
+                or not isinstance(value, int)
+            )
+            kind = 'weight' if is_weight else 'reps'
+        if kind == 'sets_reps':
+            if self.after_name and ('sets' in self.attrs or 'reps' in self.attrs):
+                return False
+            self.attrs['sets'], self.attrs['reps'] = value
+            return True
+        if self.after_name and kind in self.attrs:
+            return False
+        self.attrs[kind] = value
+        return True
+
+
+def _exercise(name: str, attrs: Dict) -> Dict:
+    return {
+        'name': name,
+        'sets': attrs.get('sets', 1),
+        'reps': attrs.get('reps'),
+        'weight': attrs.get('weight'),
+        'duration': attrs.get('duration'),
+    }
+
+
+def group_exercises(spans: List[Span]) -> List[Dict]:
+    """
+    Turn scanned spans into exercise dicts (name, sets, reps, weight, duration).
+
+    Numbers attach to the name in the same segment, whichever side they are on.
+    A name with no numbers is only kept when it follows "did/performed/completed",
+    follows another exercise, or is followed by a details-only segment
+    ("T bar row: 2 working sets, 3 plates max"). Names before a header word
+    ("chest and tricep workout") describe the workout and are dropped.
+    """
+    found: List[Tuple[str, Dict]] = []
+    # Names with no numbers yet, flagged with whether they stand on their own
+    pending: List[Tuple[str, bool]] = []
+    verb_active = False
+    segment = _Segment()
+
+    def commit_pending():
+        found.extend((name, {}) for name, keep in pending if keep)
+        pending.clear()
+
+    def flush():
+        nonlocal segment
+        current, segment = segment, _Segment()
+        name = current.name
+        if name and not current.attrs and all(word in MODIFIERS for word in name.split()):
+            name = None
+
+        if name and current.attrs:
+            commit_pending()
+            found.append((name, current.attrs))
+        elif name:
+            pending.append((name, verb_active or bool(found)))
+        elif current.attrs:
+            if pending:
+                # "bench press and squat: 3 sets each"
+                found.extend((pending_name, dict(current.attrs)) for pending_name, _ in pending)
+                pending.clear()
+            elif found:
+                # Extra details for the previous exercise, never overwriting it
+                for key, value in current.attrs.items():
+                    found[-1][1].setdefault(key, value)
+
+    for span in spans:
+        kind = span.kind
+        if kind == 'name':
+            if segment.after_name:
+                flush()
+            segment.name = span.value
+        elif kind in ('sets_reps', 'sets', 'reps', 'weight', 'duration', 'count'):
+            if segment.name:
+                segment.after_name = True
+            if not segment.add(kind, span.value):
+                flush()
+                segment.add(kind, span.value)
+        elif kind == 'verb':
+            flush()
+            verb_active = True
+        elif kind == 'header':
+            if segment.attrs:
+                flush()
+            else:
+                # Everything so far in this clause named the workout, not an exercise
+                segment = _Segment()
+                pending.clear()
+        elif kind == 'sep':
+            flush()
+        elif kind == 'hard_sep':
+            flush()
+            commit_pending()
+            verb_active = False
+
+    flush()
+    commit_pending()
+    return [_exercise(name, attrs) for name, attrs in found]
+
+
+def parse_exercises(text: str) -> List[Dict]:
+    """
+    Scan `text` once and return the exercises it mentions
+    """
+    return group_exercises(scan(text))